@@ -0,0 +1,424 @@
+import asyncio
+import logging
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import compress
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from repository import Repository
+
+HOUR = 3600
+DAY = 86400
+GRANULARITIES = {"hour": HOUR, "day": DAY}
+DIMENSIONS = ("page", "referrer", "funnel")
+METRICS = ("visits", "leaves", "dwell_seconds", "dwell_count", "sessions", "engaged", "bookings")
+
+VISIT, LEAVE, BOOKING = 0, 1, 2
+KINDS = {"visit": VISIT, "leave": LEAVE, "booking": BOOKING}
+DIRECT = "(direct)"
+ALL = "all"
+
+EVENT_COLUMNS = "id,session_id,event_type,page,referrer,timestamp"
+EVENT_ORDER = [('timestamp', False), ('id', False)]
+
+# (bucket start in epoch seconds, dimension, value) -> metric totals
+Rollup = Dict[Tuple[int, str, str], Counter]
+
+
+def epoch(value: str) -> float:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        # TIMESTAMP columns come back without an offset; they are written in UTC.
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def isoformat(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+def floor_to(seconds: float, step: int) -> int:
+    return int(seconds // step) * step
+
+
+def referrer_host(referrer: Optional[str]) -> str:
+    if not referrer:
+        return DIRECT
+    return urlsplit(referrer).netloc.lower() or DIRECT
+
+
+class Dictionary:
+    """Maps repeated strings to dense integer codes and back."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class EventColumns:
+    """A batch of visitor events held as parallel typed arrays.
+
+    Sessions, pages and referrer hosts are dictionary-encoded, so grouping and
+    sorting compare small integers instead of strings, and a month of events
+    costs a few bytes per event per column.
+    """
+
+    def __init__(self):
+        self.sessions = Dictionary()
+        self.pages = Dictionary()
+        self.referrers = Dictionary()
+        self.session = array('l')
+        self.kind = array('b')
+        self.page = array('l')
+        self.referrer = array('l')
+        self.ts = array('d')
+        self.hour = array('q')
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> None:
+        rows = list(rows)
+        self.session.extend(map(self.sessions.encode, (row["session_id"] for row in rows)))
+        self.kind.extend(KINDS.get(row["event_type"], -1) for row in rows)
+        self.page.extend(map(self.pages.encode, (row.get("page") or "/" for row in rows)))
+        self.referrer.extend(map(self.referrers.encode, (referrer_host(row.get("referrer")) for row in rows)))
+        start = len(self.ts)
+        self.ts.extend(map(epoch, (row["timestamp"] for row in rows)))
+        self.hour.extend(int(t // HOUR) * HOUR for t in self.ts[start:])
+
+    def since(self, cutoff: float) -> 'EventColumns':
+        """Copy holding only events at or after cutoff; dictionaries are shared."""
+        keep = [t >= cutoff for t in self.ts]
+        out = EventColumns()
+        out.sessions, out.pages, out.referrers = self.sessions, self.pages, self.referrers
+        for name in ("session", "kind", "page", "referrer", "ts", "hour"):
+            column = getattr(self, name)
+            setattr(out, name, array(column.typecode, compress(column, keep)))
+        return out
+
+
+def merge(into: Rollup, other: Rollup) -> Rollup:
+    for key, metrics in other.items():
+        into.setdefault(key, Counter()).update(metrics)
+    return into
+
+
+def regroup(rollup: Rollup, step: int) -> Rollup:
+    """Re-buckets an hourly rollup; every metric is additive across hours."""
+    out: Rollup = {}
+    for (bucket, dimension, value), metrics in rollup.items():
+        out.setdefault((floor_to(bucket, step), dimension, value), Counter()).update(metrics)
+    return out
+
+
+def _take(column, index) -> list:
+    return list(map(column.__getitem__, index))
+
+
+def _group(rollup: Rollup, metric: str, events: EventColumns, index: List[int],
+           weights: Optional[Iterable[float]] = None, referrer: bool = True) -> None:
+    """Adds metric for the events at index (counted, or summed from weights) to every dimension."""
+    hours = _take(events.hour, index)
+    dimensions = [("page", _take(events.page, index), events.pages.values),
+                  ("funnel", [0] * len(index), [ALL])]
+    if referrer:
+        dimensions.append(("referrer", _take(events.referrer, index), events.referrers.values))
+    weights = list(weights) if weights is not None else None
+    for dimension, codes, values in dimensions:
+        if weights is None:
+            totals = Counter(zip(hours, codes))
+        else:
+            totals = Counter()
+            for key, weight in zip(zip(hours, codes), weights):
+                totals[key] += weight
+        for (hour, code), total in totals.items():
+            rollup.setdefault((hour, dimension, values[code]), Counter())[metric] += total
+
+
+def compute_rollup(events: EventColumns, start: float, end: float, session_timeout: float = 1800,
+                   engaged_seconds: float = 30) -> Rollup:
+    """Hourly page, referrer and funnel metrics for events in [start, end).
+
+    events should also hold the session_timeout before start and after end,
+    so sessions and visit/leave pairs crossing the edges resolve the same way
+    whichever window is computed. A session is a run of events with the same
+    session_id and no gap longer than session_timeout, and it is counted in
+    the hour it started, under its landing page and referrer. Dwell time
+    belongs to the visit's hour, page and referrer.
+    """
+    rollup: Rollup = {}
+    ts, kind, page, session = events.ts, events.kind, events.page, events.session
+    n = len(ts)
+    in_range = [start <= t < end for t in ts]
+
+    for kind_code, metric in ((VISIT, "visits"), (LEAVE, "leaves")):
+        index = list(compress(range(n), [inside and k == kind_code for inside, k in zip(in_range, kind)]))
+        # Leave beacons carry no referrer, so leaves are only counted per page.
+        _group(rollup, metric, events, index, referrer=kind_code == VISIT)
+
+    # One walk in (session, time) order finds session starts and visit/leave pairs;
+    # two stable sorts on integer keys are cheaper than sorting tuples.
+    order = sorted(sorted(range(n), key=ts.__getitem__), key=session.__getitem__)
+    firsts, dwells, booked = [], [], []
+    pair_visits, pair_seconds = [], []
+    current, last_ts = -1, 0.0
+    open_visits: Dict[int, int] = {}
+    for i in order:
+        t = ts[i]
+        if session[i] != current or t - last_ts > session_timeout:
+            current = session[i]
+            firsts.append(i)
+            dwells.append(0.0)
+            booked.append(0)
+            open_visits.clear()
+        last_ts = t
+        k = kind[i]
+        if k == VISIT:
+            open_visits[page[i]] = i
+        elif k == LEAVE:
+            # Pair with the open visit of the same page, else the latest open one.
+            visit = open_visits.pop(page[i], None)
+            if visit is None and open_visits:
+                visit = open_visits.pop(max(open_visits, key=open_visits.get))
+            if visit is not None:
+                seconds = min(t - ts[visit], session_timeout)
+                dwells[-1] += seconds
+                pair_visits.append(visit)
+                pair_seconds.append(seconds)
+        elif k == BOOKING:
+            booked[-1] = 1
+
+    kept = [in_range[i] for i in pair_visits]
+    pairs = list(compress(pair_visits, kept))
+    _group(rollup, "dwell_seconds", events, pairs, compress(pair_seconds, kept))
+    _group(rollup, "dwell_count", events, pairs)
+
+    kept = [in_range[i] for i in firsts]
+    sessions = list(compress(firsts, kept))
+    _group(rollup, "sessions", events, sessions)
+    engaged = [d >= engaged_seconds for d in compress(dwells, kept)]
+    _group(rollup, "engaged", events, list(compress(sessions, engaged)))
+    _group(rollup, "bookings", events, list(compress(sessions, compress(booked, kept))))
+    return rollup
+
+
+def rollup_rows(rollup: Rollup, granularity: str) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for (bucket, dimension, value), metrics in rollup.items():
+        bucket_iso = isoformat(bucket)
+        row = {"id": f"{granularity}:{bucket_iso}:{dimension}:{value}", "granularity": granularity,
+               "bucket": bucket_iso, "dimension": dimension, "value": value, "updated_at": now}
+        row.update((metric, metrics.get(metric, 0)) for metric in METRICS)
+        rows.append(row)
+    return rows
+
+
+def present(rollup: Rollup) -> List[Dict[str, Any]]:
+    out = []
+    for (bucket, _, value), metrics in sorted(rollup.items(), key=lambda kv: (kv[0][0], -kv[1]["visits"], kv[0][2])):
+        item = {"bucket": isoformat(bucket), "value": value}
+        item.update((metric, metrics.get(metric, 0)) for metric in METRICS)
+        item["dwell_seconds"] = round(item["dwell_seconds"], 1)
+        item["avg_dwell_seconds"] = round(metrics["dwell_seconds"] / metrics["dwell_count"], 1) \
+            if metrics.get("dwell_count") else None
+        item["conversion_rate"] = round(metrics["bookings"] / metrics["sessions"], 4) \
+            if metrics.get("sessions") else None
+        out.append(item)
+    return out
+
+
+class AnalyticsEngine:
+    """Hourly and daily rollups of visitor_events.
+
+    Hours older than session_timeout are final: every roll_up() computes the
+    newly final hours from the raw table, upserts their hourly rows, and
+    rebuilds the daily rows they belong to from the stored hours, so each hour
+    is computed once and recomputing is idempotent across workers. Newer hours
+    are answered from the events this process has flushed, held in columnar
+    form until they become final.
+    """
+
+    def __init__(self, repo: Repository, events_table: str = 'visitor_events',
+                 rollup_table: str = 'visitor_rollups', session_timeout: float = 1800,
+                 engaged_seconds: float = 30, interval: float = 60.0, chunk_size: int = 5000):
+        self.repo = repo
+        self.events_table = events_table
+        self.rollup_table = rollup_table
+        self.session_timeout = session_timeout
+        self.engaged_seconds = engaged_seconds
+        self.interval = interval
+        self.chunk_size = chunk_size
+        # Start of the first hour not yet stored as a rollup.
+        self.watermark: Optional[int] = None
+        self.live = EventColumns()
+        self._live_rollup: Optional[Rollup] = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.last_roll_seconds: Optional[float] = None
+        self.rolled_events = 0
+        # ArchiveReader holding events moved out of the table (see archive.py), if any.
+        self.archive = None
+
+    def events_flushed(self, events: Iterable[Dict[str, Any]]) -> None:
+        self.live.extend(events)
+        self._live_rollup = None
+
+    def _closed_until(self, now: float) -> int:
+        return floor_to(now - self.session_timeout, HOUR)
+
+    async def _iter_events(self, start: float, end: float) -> AsyncIterator[List[Dict[str, Any]]]:
+        horizon = self.archive.horizon if self.archive is not None else None
+        if horizon is not None and start < horizon:
+            async for rows in self.archive.iter_rows(start, min(end, horizon), EVENT_COLUMNS.split(",")):
+                yield rows
+            start = horizon
+            if start >= end:
+                return
+        where = [('timestamp', 'gte', isoformat(start)), ('timestamp', 'lt', isoformat(end))]
+        after = None
+        while True:
+            rows = await self.repo.select(self.events_table, EVENT_COLUMNS, where=where, order=EVENT_ORDER,
+                                          limit=self.chunk_size, after=after)
+            if rows:
+                yield rows
+            if len(rows) < self.chunk_size:
+                return
+            after = [rows[-1][column] for column, _ in EVENT_ORDER]
+
+    async def _load(self, start: float, end: float) -> EventColumns:
+        events = EventColumns()
+        async for rows in self._iter_events(start - self.session_timeout, end + self.session_timeout):
+            events.extend(rows)
+        return events
+
+    async def _initial_watermark(self, closed: int) -> int:
+        rows = await self.repo.select(self.rollup_table, "bucket", where=[('granularity', 'eq', 'hour')],
+                                      order=[('bucket', True)], limit=1)
+        if rows:
+            return floor_to(epoch(rows[0]["bucket"]), HOUR) + HOUR
+        rows = await self.repo.select(self.events_table, "timestamp", order=[('timestamp', False)], limit=1)
+        return floor_to(epoch(rows[0]["timestamp"]), HOUR) if rows else closed
+
+    async def recompute(self, start: float, end: float) -> int:
+        """Rebuilds hourly and daily rows for [start, end) from the raw events, one day at a time."""
+        start, end = floor_to(start, HOUR), floor_to(end, HOUR)
+        processed = 0
+        while start < end:
+            stop = min(end, floor_to(start, DAY) + DAY)
+            events = await self._load(start, stop)
+            processed += len(events)
+            rollup = compute_rollup(events, start, stop, self.session_timeout, self.engaged_seconds)
+            if rollup:
+                await self.repo.upsert(self.rollup_table, rollup_rows(rollup, "hour"))
+            await self._rebuild_day(floor_to(start, DAY))
+            start = stop
+        return processed
+
+    async def _rebuild_day(self, day: int) -> None:
+        rows = await self.repo.select(self.rollup_table, where=[
+            ('granularity', 'eq', 'hour'), ('bucket', 'gte', isoformat(day)), ('bucket', 'lt', isoformat(day + DAY)),
+        ])
+        if rows:
+            await self.repo.upsert(self.rollup_table, rollup_rows(regroup(self._from_rows(rows), DAY), "day"))
+
+    async def roll_up(self, now: Optional[float] = None) -> int:
+        async with self._lock:
+            closed = self._closed_until(time.time() if now is None else now)
+            if self.watermark is None:
+                self.watermark = await self._initial_watermark(closed)
+            if self.watermark >= closed:
+                return 0
+            started = time.perf_counter()
+            processed = await self.recompute(self.watermark, closed)
+            self.watermark = closed
+            # Live events are only needed for hours not stored yet, plus one session of lookback.
+            self.live = self.live.since(closed - self.session_timeout)
+            self._live_rollup = None
+            self.last_roll_seconds = time.perf_counter() - started
+            self.rolled_events += processed
+            return processed
+
+    @staticmethod
+    def _from_rows(rows: List[Dict[str, Any]]) -> Rollup:
+        rollup: Rollup = {}
+        for row in rows:
+            key = (floor_to(epoch(row["bucket"]), HOUR), row["dimension"], row["value"])
+            rollup.setdefault(key, Counter()).update({m: row[m] or 0 for m in METRICS})
+        return rollup
+
+    async def query(self, dimension: str, granularity: str, start: float, end: float) -> List[Dict[str, Any]]:
+        step = GRANULARITIES[granularity]
+        start = floor_to(start, step)
+        stored_end = min(end, self.watermark) if self.watermark is not None else end
+        rows = await self.repo.select(self.rollup_table, where=[
+            ('granularity', 'eq', granularity), ('dimension', 'eq', dimension),
+            ('bucket', 'gte', isoformat(start)), ('bucket', 'lt', isoformat(stored_end)),
+        ], order=[('bucket', False)]) if start < stored_end else []
+        rollup = regroup(self._from_rows(rows), step)
+        if self.watermark is not None and end > self.watermark:
+            if self._live_rollup is None:
+                self._live_rollup = compute_rollup(self.live, self.watermark, float("inf"),
+                                                   self.session_timeout, self.engaged_seconds)
+            live = {key: metrics for key, metrics in self._live_rollup.items()
+                    if key[1] == dimension and max(start, self.watermark) <= key[0] < end}
+            merge(rollup, regroup(live, step))
+        return present(rollup)
+
+    async def funnel(self, granularity: str, start: float, end: float) -> Dict[str, Any]:
+        buckets = await self.query("funnel", granularity, start, end)
+        totals = Counter()
+        for bucket in buckets:
+            totals.update({m: bucket[m] for m in ("sessions", "engaged", "bookings", "visits")})
+        sessions = totals["sessions"]
+        return {
+            "stages": [
+                {"stage": "visited", "sessions": sessions},
+                {"stage": "engaged", "sessions": totals["engaged"],
+                 "rate": round(totals["engaged"] / sessions, 4) if sessions else None},
+                {"stage": "booked", "sessions": totals["bookings"],
+                 "rate": round(totals["bookings"] / sessions, 4) if sessions else None},
+            ],
+            "engaged_seconds": self.engaged_seconds,
+            "buckets": buckets,
+        }
+
+    async def start(self) -> None:
+        # The first roll-up may have a backlog to catch up on, so it runs in the background.
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.roll_up()
+            except Exception as e:
+                logging.error(f"Error rolling up visitor analytics: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watermark": isoformat(self.watermark) if self.watermark is not None else None,
+            "live_events": len(self.live),
+            "rolled_events": self.rolled_events,
+            "last_roll_seconds": round(self.last_roll_seconds, 3) if self.last_roll_seconds is not None else None,
+        }
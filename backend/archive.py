@@ -0,0 +1,365 @@
+import asyncio
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from analytics import DAY, epoch, floor_to, isoformat
+from repository import Repository
+
+MAGIC = b"TVSEG\x01"
+SUFFIX = ".seg"
+# Columns stored as-is rather than dictionary-encoded: every value is unique.
+UNIQUE_COLUMNS = ("id",)
+TIME_COLUMN = "timestamp"
+
+
+def _pack(data: bytes) -> bytes:
+    return zlib.compress(data, 6)
+
+
+def _code_type(size: int) -> str:
+    return 'B' if size <= 0xFF else 'H' if size <= 0xFFFF else 'I'
+
+
+def write_segment(path: Path, rows: Sequence[Dict[str, Any]], start: float, end: float) -> Dict[str, Any]:
+    """Writes rows (any order) as one segment file covering [start, end); returns its header.
+
+    Rows are sorted by time. Timestamps become microsecond deltas, ids a
+    newline-joined block, and every other column a dictionary of its distinct
+    values plus one small integer code per row. Each block is zlib-compressed
+    on its own, so a reader inflates only the columns it asks for. The file is
+    written next to path and renamed over it, so readers never see half of it.
+    """
+    rows = sorted(rows, key=lambda row: (epoch(row[TIME_COLUMN]), row["id"]))
+    columns = sorted({name for row in rows for name in row})
+    micros = [round(epoch(row[TIME_COLUMN]) * 1_000_000) for row in rows]
+    blocks: List[bytes] = []
+    layout: Dict[str, Any] = {}
+    offset = 0
+
+    def add(data: bytes) -> List[int]:
+        nonlocal offset
+        packed = _pack(data)
+        blocks.append(packed)
+        span = [offset, len(packed)]
+        offset += len(packed)
+        return span
+
+    deltas = array('q', (b - a for a, b in zip([micros[0]] + micros, micros)) if micros else ())
+    layout[TIME_COLUMN] = {"encoding": "delta", "first": micros[0] if micros else 0, "block": add(deltas.tobytes())}
+    for name in columns:
+        if name == TIME_COLUMN:
+            continue
+        values = [row.get(name) for row in rows]
+        if name in UNIQUE_COLUMNS:
+            layout[name] = {"encoding": "lines", "block": add("\n".join(map(str, values)).encode())}
+            continue
+        dictionary: Dict[Any, int] = {}
+        codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+        typecode = _code_type(len(dictionary))
+        layout[name] = {"encoding": "dict", "typecode": typecode, "distinct": len(dictionary),
+                        "values": add(json.dumps(list(dictionary), separators=(",", ":")).encode()),
+                        "block": add(array(typecode, codes).tobytes())}
+
+    header = {
+        "rows": len(rows),
+        "start": start,
+        "end": end,
+        "min_ts": micros[0] / 1_000_000 if micros else None,
+        "max_ts": micros[-1] / 1_000_000 if micros else None,
+        "counts": dict(Counter(row.get("event_type") for row in rows)),
+        "raw_bytes": sum(len(json.dumps(row, separators=(",", ":"))) for row in rows),
+        "columns": layout,
+    }
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+    return header
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Segment:
+    """One segment file, read through mmap. Only the header is parsed up front."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.size = path.stat().st_size
+        with open(path, "rb") as f:
+            prefix = f.read(len(MAGIC) + 4)
+            if prefix[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not an event segment")
+            (length,) = struct.unpack("<I", prefix[len(MAGIC):])
+            self.header = json.loads(f.read(length))
+        self.data_offset = len(MAGIC) + 4 + length
+
+    @property
+    def rows(self) -> int:
+        return self.header["rows"]
+
+    def overlaps(self, start: float, end: float) -> bool:
+        return self.header["start"] < end and start < self.header["end"]
+
+    def read(self, start: float, end: float, columns: Optional[Sequence[str]] = None) -> Dict[str, list]:
+        """Columns for the rows with start <= timestamp < end, as parallel lists.
+
+        Timestamps are sorted, so the time column alone decides which slice of
+        the other columns to decode; columns not asked for are never inflated.
+        """
+        layout = self.header["columns"]
+        wanted = [name for name in (columns or layout) if name in layout]
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                def block(span) -> bytes:
+                    begin = self.data_offset + span[0]
+                    return zlib.decompress(view[begin:begin + span[1]])
+
+                time_layout = layout[TIME_COLUMN]
+                micros = array('q', block(time_layout["block"]))
+                total = time_layout["first"] - (micros[0] if micros else 0)
+                stamps = []
+                for delta in micros:
+                    total += delta
+                    stamps.append(total)
+                lo = bisect_left(stamps, round(start * 1_000_000))
+                hi = bisect_left(stamps, round(end * 1_000_000))
+                out: Dict[str, list] = {}
+                for name in wanted:
+                    spec = layout[name]
+                    if name == TIME_COLUMN:
+                        out[name] = [isoformat(m / 1_000_000) for m in stamps[lo:hi]]
+                    elif spec["encoding"] == "lines":
+                        out[name] = block(spec["block"]).decode().split("\n")[lo:hi] if hi > lo else []
+                    else:
+                        values = json.loads(block(spec["values"]))
+                        codes = array(spec["typecode"], block(spec["block"]))[lo:hi]
+                        out[name] = [values[code] for code in codes]
+                return out
+            finally:
+                view.release()
+
+
+class ArchiveReader:
+    """Scans the segment files in directory.
+
+    Segment headers are cached and re-read only when a file changes, so
+    asking for the horizon or the archived counts costs a directory listing.
+    """
+
+    def __init__(self, directory: str, table: str = 'visitor_events'):
+        self.directory = Path(directory)
+        self.table = table
+        self._segments: Dict[Path, Tuple[float, Segment]] = {}
+
+    def path_for(self, day: int) -> Path:
+        return self.directory / f"{self.table}-{datetime.fromtimestamp(day, timezone.utc):%Y-%m-%d}{SUFFIX}"
+
+    def segments(self) -> List[Segment]:
+        if not self.directory.is_dir():
+            return []
+        current = {}
+        for path in sorted(self.directory.glob(f"{self.table}-*{SUFFIX}")):
+            mtime = path.stat().st_mtime
+            cached = self._segments.get(path)
+            current[path] = cached if cached and cached[0] == mtime else (mtime, Segment(path))
+        self._segments = current
+        return [segment for _, segment in current.values()]
+
+    @property
+    def horizon(self) -> Optional[float]:
+        """End of the newest archived day; older events are read from here, not the table."""
+        segments = self.segments()
+        return max(segment.header["end"] for segment in segments) if segments else None
+
+    def event_counts(self) -> Dict[str, int]:
+        counts: Counter = Counter()
+        for segment in self.segments():
+            counts.update(segment.header["counts"])
+        return dict(counts)
+
+    def scan(self, start: float, end: float, columns: Optional[Sequence[str]] = None):
+        """Yields one dict of column lists per segment overlapping [start, end), oldest first."""
+        for segment in self.segments():
+            if segment.overlaps(start, end):
+                yield segment.read(start, end, columns)
+
+    async def iter_rows(self, start: float, end: float, columns: Sequence[str]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Rows in [start, end) as dicts, one list per segment; decoding runs off the event loop."""
+        for segment in self.segments():
+            if not segment.overlaps(start, end):
+                continue
+            data = await asyncio.to_thread(segment.read, start, end, columns)
+            names = [name for name in columns if name in data]
+            rows = [dict(zip(names, values)) for values in zip(*(data[name] for name in names))]
+            if rows:
+                yield rows
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self.segments()
+        horizon = self.horizon
+        return {
+            "segments": len(segments),
+            "rows": sum(segment.rows for segment in segments),
+            "bytes": sum(segment.size for segment in segments),
+            "raw_bytes": sum(segment.header.get("raw_bytes", 0) for segment in segments),
+            "horizon": isoformat(horizon) if horizon is not None else None,
+        }
+
+
+class EventArchiver:
+    """Moves visitor events older than retain_days out of the table into daily segments.
+
+    A day is archived only once it is older than the retention window and,
+    if holdback is given, older than the time it returns (the analytics
+    watermark, so rollups are computed before their raw events leave the
+    table). The day's rows are read in keyset chunks, merged with any
+    segment already written for that day, written out, and only then deleted
+    from the table; a crash in between leaves the rows in place and the next
+    run rewrites the same segment. Workers sharing the directory take turns
+    through a lock file.
+    """
+
+    def __init__(self, repo: Repository, reader: ArchiveReader, retain_days: float = 90,
+                 interval: float = 3600.0, chunk_size: int = 5000,
+                 holdback: Optional[Callable[[], Optional[float]]] = None):
+        self.repo = repo
+        self.reader = reader
+        self.retain_days = retain_days
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.holdback = holdback
+        self._task = None
+        self._lock = asyncio.Lock()
+        self.archived_rows = 0
+        self.archived_days = 0
+        self.last_run: Optional[str] = None
+        self.last_run_seconds: Optional[float] = None
+
+    @property
+    def table(self) -> str:
+        return self.reader.table
+
+    def cutoff(self, now: float) -> Optional[int]:
+        cutoff = floor_to(now - self.retain_days * DAY, DAY)
+        if self.holdback is not None:
+            limit = self.holdback()
+            if limit is None:
+                return None
+            cutoff = min(cutoff, floor_to(limit, DAY))
+        return cutoff
+
+    async def _day_rows(self, day: int) -> List[Dict[str, Any]]:
+        where = [(TIME_COLUMN, 'gte', isoformat(day)), (TIME_COLUMN, 'lt', isoformat(day + DAY))]
+        order = [(TIME_COLUMN, False), ('id', False)]
+        rows, after = [], None
+        while True:
+            chunk = await self.repo.select(self.table, "*", where=where, order=order, limit=self.chunk_size,
+                                           after=after)
+            rows.extend(chunk)
+            if len(chunk) < self.chunk_size:
+                return rows
+            after = [chunk[-1][TIME_COLUMN], chunk[-1]["id"]]
+
+    def _write(self, day: int, rows: List[Dict[str, Any]]) -> None:
+        path = self.reader.path_for(day)
+        if path.exists():
+            existing = Segment(path).read(day, day + DAY)
+            names = list(existing)
+            seen = {row["id"] for row in rows}
+            rows = rows + [row for row in (dict(zip(names, values)) for values in zip(*existing.values()))
+                           if row["id"] not in seen]
+        write_segment(path, rows, day, day + DAY)
+
+    async def run_once(self, now: Optional[float] = None) -> int:
+        async with self._lock:
+            cutoff = self.cutoff(time.time() if now is None else now)
+            if cutoff is None:
+                return 0
+            self.reader.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.reader.directory / ".lock", "w") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return 0
+                return await self._archive_until(cutoff)
+
+    async def _archive_until(self, cutoff: int) -> int:
+        first = await self.repo.select(self.table, TIME_COLUMN, order=[(TIME_COLUMN, False)], limit=1)
+        if not first or epoch(first[0][TIME_COLUMN]) >= cutoff:
+            return 0
+        started = time.perf_counter()
+        archived = 0
+        day = floor_to(epoch(first[0][TIME_COLUMN]), DAY)
+        while day < cutoff:
+            rows = await self._day_rows(day)
+            if rows:
+                await asyncio.to_thread(self._write, day, rows)
+                # By id, not by time range: a row that landed in this day after it was
+                # read is not in the segment and must stay in the table.
+                ids = [row["id"] for row in rows]
+                for i in range(0, len(ids), self.chunk_size):
+                    await self.repo.delete(self.table, [('id', 'in', ids[i:i + self.chunk_size])])
+                archived += len(rows)
+                self.archived_days += 1
+                logging.info(f"Archived {len(rows)} {self.table} rows for {isoformat(day)[:10]}")
+            day += DAY
+        self.archived_rows += archived
+        self.last_run = datetime.now(timezone.utc).isoformat()
+        self.last_run_seconds = time.perf_counter() - started
+        return archived
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Error archiving {self.table}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.reader.stats(),
+            "retain_days": self.retain_days,
+            "archived_rows": self.archived_rows,
+            "archived_days": self.archived_days,
+            "last_run": self.last_run,
+            "last_run_seconds": round(self.last_run_seconds, 3) if self.last_run_seconds is not None else None,
+        }
@@ -0,0 +1,93 @@
+"""Recomputes a month of synthetic visitor traffic into hourly and daily rollups.
+
+Sessions follow the landing page's visit/leave beacons, a share of them book
+a demo. The raw events live in an embedded SQLite database, so the timing
+covers reading them back in keyset chunks as well as the rollup itself.
+
+    python backend/benchmarks/bench_analytics.py --days 30 --sessions-per-day 10000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import DAY, AnalyticsEngine, EventColumns, compute_rollup, isoformat  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+PAGES = ["/", "/", "/", "/pricing", "/subjects/maths", "/subjects/physics", "/about"]
+REFERRERS = ["", "", "https://www.google.com/", "https://www.instagram.com/", "https://wa.me/", "https://t.co/x"]
+
+
+def synthetic_events(days: int, sessions_per_day: int, seed: int = 7):
+    rng = random.Random(seed)
+    for day in range(days):
+        rows = []
+        for s in range(sessions_per_day):
+            session = f"s{day}-{s}"
+            t = START + day * DAY + rng.random() * DAY
+            referrer = rng.choice(REFERRERS)
+            for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                page = rng.choice(PAGES)
+                rows.append({"session_id": session, "event_type": "visit", "page": page, "referrer": referrer,
+                             "user_agent": "", "timestamp": isoformat(t)})
+                t += rng.expovariate(1 / 60)
+                rows.append({"session_id": session, "event_type": "leave", "page": page, "referrer": "",
+                             "user_agent": "", "timestamp": isoformat(t)})
+                t += rng.random() * 5
+            if rng.random() < 0.03:
+                rows.append({"session_id": session, "event_type": "booking", "page": "/", "referrer": "",
+                             "user_agent": "", "timestamp": isoformat(t)})
+        for i, row in enumerate(rows):
+            row["id"] = f"{day:03d}-{i:07d}"
+        yield rows
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--sessions-per-day', type=int, default=10000)
+    args = parser.parse_args()
+
+    repo = SQLiteRepository()
+    days = list(synthetic_events(args.days, args.sessions_per_day))
+    total = 0
+    for rows in days:
+        await repo.insert('visitor_events', rows)
+        total += len(rows)
+    end = START + args.days * DAY
+    print(f"{total} events over {args.days} days")
+
+    # Rollup alone, on rows already in memory.
+    columns = EventColumns()
+    started = time.perf_counter()
+    for rows in days:
+        columns.extend(rows)
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    rollup = compute_rollup(columns, START, end)
+    computed = time.perf_counter() - started
+    del days
+    print(f"columnar load {loaded:.2f}s, rollup {computed:.2f}s ({total / computed:.0f} events/s), "
+          f"{len(rollup)} hourly rows")
+
+    # The full path: read back from the database day by day, roll up, upsert hourly and daily rows.
+    engine = AnalyticsEngine(repo)
+    started = time.perf_counter()
+    processed = await engine.recompute(START, end)
+    elapsed = time.perf_counter() - started
+    stored = await repo.count('visitor_rollups')
+    funnel = await engine.funnel('day', START, end)
+    print(f"recompute {elapsed:.2f}s for {processed} events read ({total / elapsed:.0f} events/s), "
+          f"{stored} rollup rows stored")
+    print("funnel: " + ", ".join(f"{s['stage']} {s['sessions']}" for s in funnel["stages"]))
+    await repo.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
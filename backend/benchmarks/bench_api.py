@@ -0,0 +1,419 @@
+"""Load-tests every API route in-process and compares the results with a saved baseline.
+
+The app runs with its real lifespan (ingestor, outbox, analytics, ...) against
+an in-memory SQLite database seeded with --seed rows per table. --rtt adds a
+simulated network round trip to every database call, with at most --pool-size
+calls in flight, to stand in for a remote Supabase.
+
+Each route is driven with --requests requests at --concurrency. The campaign
+scenarios then run for --duration seconds each: many visitors sending
+/visitors/track beacons, bookings arriving in bursts, and admins polling the
+dashboard, all at once.
+
+    python backend/benchmarks/bench_api.py --output baseline.json
+    python backend/benchmarks/bench_api.py --compare baseline.json --threshold 0.2
+
+With --compare the run exits with status 1 if any scenario's p95 latency got
+worse, or its throughput dropped, by more than --threshold. p95 changes under
+--min-delta-ms are not counted, since sub-millisecond routes jitter by more
+than any sensible threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Shed requests would measure the limiter, not the routes; emails would go nowhere.
+os.environ['RATE_LIMIT_STORE'] = 'off'
+os.environ['RESEND_API_KEY'] = ''
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from repository import Repository  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+SUBJECTS = ("Mathematics", "Physics", "Chemistry", "English", "Biology", "Computer Science")
+PAGES = ("/", "/subjects", "/teachers", "/how-it-works", "/contact", "/pricing")
+REFERRERS = ("https://google.com/search", "https://instagram.com/", "", "https://facebook.com/")
+QUESTIONS = ("How much does it cost?", "Do you teach physics", "Can I reschedule?", "who are your tutors",
+             "what is the capital of france")
+
+Op = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+class RoundTripRepository(Repository):
+    """Adds a fixed delay to every call of the wrapped repository, with a bounded pool like the real client."""
+
+    def __init__(self, inner: Repository, rtt: float, pool_size: int):
+        self.inner = inner
+        self.rtt = rtt
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def _call(self, call):
+        async with self._slots:
+            await asyncio.sleep(self.rtt)
+            return await call
+
+    async def insert(self, table, rows):
+        return await self._call(self.inner.insert(table, rows))
+
+    async def upsert(self, table, rows, on_conflict="id"):
+        return await self._call(self.inner.upsert(table, rows, on_conflict))
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        return await self._call(self.inner.select(table, columns, where, order, limit, after))
+
+    async def update(self, table, values, where):
+        return await self._call(self.inner.update(table, values, where))
+
+    async def delete(self, table, where):
+        return await self._call(self.inner.delete(table, where))
+
+    async def count(self, table, where=()):
+        return await self._call(self.inner.count(table, where))
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+# --- Requests ---
+
+def person(rng: random.Random) -> dict:
+    n = uuid.uuid4().hex[:10]
+    return {"name": f"Student {n}", "email": f"student{n}@example.com", "phone": f"+91{rng.randrange(7 * 10**9, 10**10)}"}
+
+
+def booking(rng: random.Random) -> dict:
+    return {**person(rng), "grade_level": f"Grade {rng.randrange(6, 13)}", "subject_interest": rng.choice(SUBJECTS),
+            "preferred_date": "2026-11-01", "message": "Weekend evenings work best."}
+
+
+def visitor_event(rng: random.Random, session_id: Optional[str] = None, event_type: str = "visit") -> dict:
+    return {"session_id": session_id or uuid.uuid4().hex, "event_type": event_type, "page": rng.choice(PAGES),
+            "user_agent": "Mozilla/5.0 (bench)", "referrer": rng.choice(REFERRERS) if event_type == "visit" else ""}
+
+
+class Seed:
+    """Rows written before the run, so list pages, updates and deletes have something to work on."""
+
+    def __init__(self, rows: int, deletable: int):
+        self.rows = rows
+        self.booking_ids: List[str] = []
+        self.deletable: List[str] = []
+        self.deletable_count = deletable
+
+    async def load(self, repo: Repository, rng: random.Random) -> None:
+        now = datetime.now(timezone.utc)
+        bookings, queries, contacts, events = [], [], [], []
+        for i in range(self.rows + self.deletable_count):
+            created = (now - timedelta(minutes=i)).isoformat()
+            doc = {"id": str(uuid.uuid4()), **booking(rng), "status": rng.choice(("pending", "confirmed")),
+                   "created_at": created}
+            bookings.append(doc)
+            (self.booking_ids if i < self.rows else self.deletable).append(doc["id"])
+        for i in range(self.rows):
+            created = (now - timedelta(minutes=i)).isoformat()
+            queries.append({"id": str(uuid.uuid4()), **person(rng), "subject": rng.choice(SUBJECTS),
+                            "query_type": "general", "message": "", "created_at": created})
+            contacts.append({"id": str(uuid.uuid4()), **person(rng), "message": "Please call me back.",
+                             "created_at": created})
+            for event_type in ("visit", "leave"):
+                events.append({"id": str(uuid.uuid4()), **visitor_event(rng, f"seed{i}", event_type),
+                               "timestamp": created})
+        await repo.insert('demo_bookings', bookings)
+        await repo.insert('subject_queries', queries)
+        await repo.insert('contact_messages', contacts)
+        await repo.insert('visitor_events', events)
+
+
+def route_ops(seed: Seed) -> Dict[str, Op]:
+    """One request generator per route. The SSE stream is left out: it never completes."""
+
+    def get(path: str, **params) -> Op:
+        return lambda client, rng: client.get(path, params=params or None)
+
+    def delete(client, rng):
+        return client.delete(f"/api/demo-bookings/{seed.deletable.pop()}")
+
+    return {
+        "GET /": get("/api/"),
+        "GET /whatsapp-config": get("/api/whatsapp-config"),
+        "POST /demo-bookings": lambda client, rng: client.post("/api/demo-bookings", json=booking(rng)),
+        "GET /demo-bookings": get("/api/demo-bookings"),
+        "GET /demo-bookings?status": get("/api/demo-bookings", status="pending", limit=50),
+        "PATCH /demo-bookings/{id}/status": lambda client, rng: client.patch(
+            f"/api/demo-bookings/{rng.choice(seed.booking_ids)}/status",
+            params={"status": rng.choice(("pending", "confirmed", "completed"))}),
+        "DELETE /demo-bookings/{id}": delete,
+        "POST /subject-queries": lambda client, rng: client.post(
+            "/api/subject-queries", json={**person(rng), "subject": rng.choice(SUBJECTS), "message": "Hi"}),
+        "GET /subject-queries": get("/api/subject-queries"),
+        "POST /contact-messages": lambda client, rng: client.post(
+            "/api/contact-messages", json={**person(rng), "message": "Please call me back."}),
+        "GET /contact-messages": get("/api/contact-messages"),
+        "POST /visitors/track": lambda client, rng: client.post("/api/visitors/track", json=visitor_event(rng)),
+        "POST /chat": lambda client, rng: client.post(
+            "/api/chat", json={"message": rng.choice(QUESTIONS), "session_id": uuid.uuid4().hex}),
+        "GET /tutors": get("/api/tutors"),
+        "GET /slots": lambda client, rng: client.get(
+            "/api/slots", params={"subject": rng.choice(("Mathematics", "Physics", "Chemistry")), "limit": 10}),
+        "GET /admin/stats": get("/api/admin/stats"),
+        "GET /admin/analytics/pages": get("/api/admin/analytics/pages"),
+        "GET /admin/analytics/referrers": get("/api/admin/analytics/referrers"),
+        "GET /admin/analytics/funnel": get("/api/admin/analytics/funnel"),
+        "GET /admin/analytics/status": get("/api/admin/analytics/status"),
+        "GET /admin/export/demo_bookings": get("/api/admin/export/demo_bookings", format="csv"),
+        "GET /admin/outbox": get("/api/admin/outbox"),
+        "GET /admin/dedup": get("/api/admin/dedup"),
+        "GET /admin/cache": get("/api/admin/cache"),
+        "GET /admin/chat": get("/api/admin/chat"),
+        "GET /admin/search": lambda client, rng: client.get(
+            "/api/admin/search", params={"q": rng.choice(("student", "physics", "example.com", "call me"))}),
+        "GET /admin/events/stats": get("/api/admin/events/stats"),
+        "GET /admin/ratelimit": get("/api/admin/ratelimit"),
+        "GET /metrics": get("/api/metrics"),
+    }
+
+
+# --- Measurement ---
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, name: str, op: Op, client: httpx.AsyncClient, rng: random.Random) -> None:
+        started = time.perf_counter()
+        try:
+            response = await op(client, rng)
+            # Several routes answer 200 with {"error": ...}.
+            failed = response.status_code >= 400 or response.content.startswith(b'{"error"')
+        except Exception:
+            failed = True
+        self.latencies[name].append(time.perf_counter() - started)
+        if failed:
+            self.errors[name] += 1
+
+    def summary(self, name: str, elapsed: float, peak_rss: float) -> dict:
+        ordered = sorted(self.latencies[name])
+        return {
+            "requests": len(ordered),
+            "errors": self.errors[name],
+            "throughput": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "peak_rss_mb": round(peak_rss, 1),
+        }
+
+
+class PeakRSS:
+    """Samples resident memory in the background while a scenario runs."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0.0
+        self._task = None
+
+    async def __aenter__(self):
+        self.peak = rss_mb()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        self.peak = max(self.peak, rss_mb())
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, rss_mb())
+            await asyncio.sleep(self.interval)
+
+
+async def run_route(client: httpx.AsyncClient, name: str, op: Op, requests: int, concurrency: int,
+                    rng: random.Random, warmup: int) -> dict:
+    for _ in range(warmup):
+        await op(client, rng)
+    recorder = Recorder()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            await recorder.call(name, op, client, rng)
+
+    async with PeakRSS() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    return recorder.summary(name, elapsed, rss.peak)
+
+
+async def run_campaign(client: httpx.AsyncClient, ops: Dict[str, Op], args, rng: random.Random,
+                       visitors: int, burst_size: int) -> Dict[str, dict]:
+    """Visitors browse (visit, then leave a few seconds later), bookings land in bursts, admins poll."""
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    async def visitor():
+        while time.perf_counter() < deadline:
+            session_id = uuid.uuid4().hex
+            await recorder.call("POST /visitors/track", lambda c, r: c.post(
+                "/api/visitors/track", json=visitor_event(r, session_id)), client, rng)
+            await asyncio.sleep(rng.uniform(0, args.think_time))
+            await recorder.call("POST /visitors/track", lambda c, r: c.post(
+                "/api/visitors/track", json=visitor_event(r, session_id, "leave")), client, rng)
+
+    async def bookings():
+        while time.perf_counter() < deadline:
+            await asyncio.gather(*[recorder.call("POST /demo-bookings", ops["POST /demo-bookings"], client, rng)
+                                   for _ in range(burst_size)])
+            await asyncio.sleep(args.burst_every)
+
+    async def admin():
+        polled = ("GET /admin/stats", "GET /demo-bookings", "GET /admin/analytics/pages", "GET /admin/analytics/funnel")
+        while time.perf_counter() < deadline:
+            for name in polled:
+                await recorder.call(name, ops[name], client, rng)
+            await asyncio.sleep(args.poll_interval)
+
+    async with PeakRSS() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*[visitor() for _ in range(visitors)], bookings(),
+                             *[admin() for _ in range(args.admins)])
+        elapsed = time.perf_counter() - started
+    results = {name: recorder.summary(name, elapsed, rss.peak) for name in recorder.latencies}
+    everything = Recorder()
+    for name, latencies in recorder.latencies.items():
+        everything.latencies["all"].extend(latencies)
+        everything.errors["all"] += recorder.errors[name]
+    results["all"] = everything.summary("all", elapsed, rss.peak)
+    return results
+
+
+# --- Baselines ---
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float, min_delta_ms: float) -> List[str]:
+    print(f"\n{'scenario':<56} {'p95 ms':>17} {'req/s':>19}")
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_change = result["throughput"] / base["throughput"] - 1 if base["throughput"] else 0.0
+        flag = ""
+        slower = p95_change > threshold and result["p95_ms"] - base["p95_ms"] > min_delta_ms
+        if slower or rps_change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<56} {base['p95_ms']:>8.2f} {p95_change:>+7.0%}  {base['throughput']:>9.0f} "
+              f"{rps_change:>+7.0%}{flag}")
+    return regressions
+
+
+def report(name: str, result: dict) -> None:
+    print(f"{name:<56} {result['requests']:>7} {result['errors']:>5} {result['throughput']:>9.0f} "
+          f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['peak_rss_mb']:>8.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500, help="requests per route")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=20, help="unrecorded requests per route before measuring")
+    parser.add_argument('--seed', type=int, default=2000, help="rows per table before the run")
+    parser.add_argument('--rtt', type=float, default=0.0, help="simulated database round trip in seconds")
+    parser.add_argument('--pool-size', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per campaign scenario")
+    parser.add_argument('--visitors', type=int, default=200, help="concurrent visitors in the campaign")
+    parser.add_argument('--think-time', type=float, default=0.5, help="max seconds between a visit and its leave")
+    parser.add_argument('--burst-size', type=int, default=20)
+    parser.add_argument('--burst-every', type=float, default=2.0)
+    parser.add_argument('--admins', type=int, default=3)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--routes', nargs='*', help="only these routes, e.g. 'GET /demo-bookings'")
+    parser.add_argument('--skip-campaign', action='store_true')
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help="p95 changes smaller than this are noise, whatever the ratio")
+    parser.add_argument('--random-seed', type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(args.random_seed)
+    database = SQLiteRepository(':memory:')
+    seed = Seed(args.seed, deletable=args.requests + args.warmup)
+    await seed.load(database, rng)
+    server.use_repository(RoundTripRepository(database, args.rtt, args.pool_size) if args.rtt else database)
+    ops = route_ops(seed)
+    selected = [name for name in ops if not args.routes or name in args.routes]
+
+    results: Dict[str, dict] = {}
+    print(f"seed {args.seed} rows/table, rtt {args.rtt * 1000:.0f}ms, concurrency {args.concurrency}, "
+          f"{args.requests} requests/route")
+    print(f"{'scenario':<56} {'reqs':>7} {'errs':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'rss MB':>8}")
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name in selected:
+                results[f"route {name}"] = await run_route(client, name, ops[name], args.requests,
+                                                           args.concurrency, rng, args.warmup)
+                report(f"route {name}", results[f"route {name}"])
+            if not args.skip_campaign:
+                # Steady campaign traffic, then a spike of twice the visitors and bookings.
+                for label, visitors, burst in (("campaign", args.visitors, args.burst_size),
+                                               ("campaign-spike", args.visitors * 2, args.burst_size * 2)):
+                    for name, result in (await run_campaign(client, ops, args, rng, visitors, burst)).items():
+                        results[f"{label} {name}"] = result
+                        report(f"{label} {name}", result)
+
+    if args.output:
+        import resource
+        Path(args.output).write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": vars(args),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "results": results,
+        }, indent=2))
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,81 @@
+"""Archives synthetic visitor events and compares their size and scan time with the table.
+
+Events are spread over --days days in an SQLite file, archived with a
+one-day retention window, and then read back: the whole range (every column)
+and a single hour (two columns), straight from the segment files.
+
+    python backend/benchmarks/bench_archive.py --days 7 --per-day 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import DAY, HOUR  # noqa: E402
+from archive import ArchiveReader, EventArchiver  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+AGENTS = [f"Mozilla/5.0 ({os_name}) AppleWebKit/537.36 (KHTML, like Gecko) {browser}/{version}.0 Safari/537.36"
+          for os_name in ("Windows NT 10.0; Win64; x64", "Macintosh; Intel Mac OS X 10_15_7", "Linux; Android 14")
+          for browser in ("Chrome", "Edg", "OPR") for version in range(118, 126)]
+PAGES = ["/", "/pricing", "/subjects", "/about", "/contact", "/book-demo"]
+REFERRERS = [None, "https://www.google.com/", "https://www.instagram.com/", "https://t.co/abc", "https://bing.com/"]
+
+
+def synthetic_events(start: float, days: int, per_day: int, rng: random.Random):
+    for i in range(days * per_day):
+        stamp = datetime.fromtimestamp(start + i * DAY / per_day, timezone.utc).isoformat()
+        yield {"id": f"{rng.getrandbits(128):032x}", "session_id": f"s{i // 6:08d}",
+               "event_type": "visit" if i % 2 == 0 else "leave", "page": rng.choice(PAGES),
+               "user_agent": rng.choice(AGENTS), "referrer": rng.choice(REFERRERS), "timestamp": stamp}
+
+
+async def main(args):
+    rng = random.Random(7)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "events.db")
+        repo = SQLiteRepository(db_path)
+        events = list(synthetic_events(start, args.days, args.per_day, rng))
+        for i in range(0, len(events), 5000):
+            await repo.insert('visitor_events', events[i:i + 5000])
+        await repo.aclose()
+        table_bytes = os.path.getsize(db_path)
+
+        repo = SQLiteRepository(db_path)
+        reader = ArchiveReader(os.path.join(tmp, "archive"))
+        archiver = EventArchiver(repo, reader, retain_days=1)
+        started = time.perf_counter()
+        archived = await archiver.run_once(now=start + (args.days + 1) * DAY)
+        archive_seconds = time.perf_counter() - started
+        await repo.aclose()
+
+        stats = reader.stats()
+        print(f"{archived} events in {stats['segments']} segments, archived in {archive_seconds:.2f}s")
+        print(f"  sqlite file       {table_bytes / 1e6:8.1f} MB")
+        print(f"  rows as json      {stats['raw_bytes'] / 1e6:8.1f} MB")
+        print(f"  segments          {stats['bytes'] / 1e6:8.1f} MB  ({stats['raw_bytes'] / stats['bytes']:.1f}x)")
+
+        started = time.perf_counter()
+        rows = sum(len(chunk["id"]) for chunk in reader.scan(start, start + args.days * DAY))
+        full = time.perf_counter() - started
+        started = time.perf_counter()
+        hour = sum(len(chunk["page"]) for chunk in reader.scan(start + 5 * HOUR, start + 6 * HOUR,
+                                                               ["page", "timestamp"]))
+        one_hour = time.perf_counter() - started
+        print(f"  full scan         {full * 1000:8.1f} ms  ({rows / full / 1e6:.2f}M rows/s, all columns)")
+        print(f"  one hour          {one_hour * 1000:8.1f} ms  ({hour} rows, page and timestamp)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--per-day", type=int, default=50000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,77 @@
+"""Compares the old keyword scan with the BM25 inverted index as the FAQ grows.
+
+The scan is what Chatbot.jsx used to do: lowercase the message and check each
+entry's keywords as substrings, first hit wins. The index is looked up with
+the answer cache cleared, so every question pays for a real search.
+
+    python backend/benchmarks/bench_chat.py --sizes 11 1000 10000 --questions 2000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chat import FAQ_PATH, ChatBot, FAQIndex, tokenize  # noqa: E402
+
+WORDS = ("algebra geometry essay grammar exam revision olympiad coding robotics violin chess spanish french "
+         "calculus vocabulary reading writing debate economics statistics").split()
+
+
+def synthetic_entries(base, size: int, rng: random.Random):
+    entries = list(base)
+    for i in range(size - len(base)):
+        keywords = [f"{rng.choice(WORDS)} {rng.choice(WORDS)}{i}", f"topic{i}"]
+        entries.append({"id": f"extra_{i}", "keywords": keywords,
+                        "answer": " ".join(f"word{rng.randrange(20000)}" for _ in range(30))})
+    return entries
+
+
+def scan(entries, message: str):
+    lower = message.lower()
+    for entry in entries:
+        if any(keyword in lower for keyword in entry["keywords"]):
+            return entry["id"]
+    return None
+
+
+def timed(fn, questions):
+    started = time.perf_counter()
+    for question in questions:
+        fn(question)
+    return (time.perf_counter() - started) / len(questions) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[11, 1000, 10000])
+    parser.add_argument('--questions', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    base = json.loads(FAQ_PATH.read_text())["entries"]
+    templates = ["How much does {} cost?", "Do you teach {}", "can my kid learn {} online", "what is {}"]
+    for size in args.sizes:
+        entries = synthetic_entries(base, size, rng)
+        started = time.perf_counter()
+        index = FAQIndex(entries)
+        build = time.perf_counter() - started
+        questions = [rng.choice(templates).format(rng.choice(WORDS)) for _ in range(args.questions)]
+        bot = ChatBot()
+        bot.index = index
+
+        def indexed(question):
+            bot.cache.clear()
+            return bot.match(question)
+
+        print(f"{size:>6} entries  build {build * 1000:8.1f}ms  tokens {len(index.postings):>6}   "
+              f"scan {timed(lambda q: scan(entries, q), questions):8.1f}us/q   "
+              f"index {timed(indexed, questions):6.1f}us/q   "
+              f"tokenize {timed(tokenize, questions):5.1f}us/q")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Streams a large synthetic export and samples resident memory along the way.
+
+The database is a local stand-in that generates demo_bookings rows on demand,
+so the only memory in play is what the export path itself holds.
+
+    python backend/benchmarks/bench_export.py --rows 1000000 --format csv --gzip
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+from repository import Repository  # noqa: E402
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+class SyntheticLeadsRepository(Repository):
+    def __init__(self, rows: int):
+        self.rows = rows
+        self.served = 0
+
+    def row(self, i: int) -> dict:
+        return {
+            "id": f"lead-{i:09d}",
+            "name": f"Student {i}",
+            "email": f"student{i}@example.com",
+            "phone": f"+91{7000000000 + i}",
+            "grade_level": f"Grade {6 + i % 7}",
+            "subject_interest": ("Mathematics", "Physics", "Chemistry", "English")[i % 4],
+            "preferred_date": "2026-11-01",
+            "message": "Looking for weekend sessions, preferably in the evening." if i % 3 else "",
+            "status": "pending" if i % 5 else "confirmed",
+            "created_at": (EPOCH + timedelta(seconds=i)).isoformat(),
+        }
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        start = int(after[1].split("-")[1]) + 1 if after else 0
+        end = min(self.rows, start + (limit or self.rows))
+        self.served = end
+        return [self.row(i) for i in range(start, end)]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--format', choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument('--gzip', action='store_true')
+    args = parser.parse_args()
+
+    db = SyntheticLeadsRepository(args.rows)
+    server.use_repository(db)
+    response = await server.export_table('demo_bookings', format=args.format, gzip=args.gzip)
+
+    baseline = rss_mb()
+    peak = baseline
+    sent = 0
+    checkpoint = args.rows // 10
+    started = time.perf_counter()
+    print(f"exporting {args.rows} rows as {args.format}{' (gzip)' if args.gzip else ''}, rss at start {baseline:.1f} MB")
+    async for block in response.body_iterator:
+        sent += len(block)
+        peak = max(peak, rss_mb())
+        if db.served >= checkpoint:
+            print(f"  {db.served:>9} rows  {sent / 1024 / 1024:8.1f} MB sent  rss {rss_mb():6.1f} MB")
+            checkpoint += args.rows // 10
+    elapsed = time.perf_counter() - started
+    print(f"done in {elapsed:.1f}s ({args.rows / elapsed:.0f} rows/s), {sent / 1024 / 1024:.1f} MB sent, "
+          f"peak rss {peak:.1f} MB (+{peak - baseline:.1f} MB over start)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
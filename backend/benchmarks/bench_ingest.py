@@ -0,0 +1,116 @@
+"""Replays synthetic visit/leave streams against /api/visitors/track.
+
+Compares one insert per hit (the previous handler) with the batched ingestor.
+The database is a local stand-in that charges a fixed round-trip time per call
+and allows DB_POOL_SIZE calls in flight, like the pooled PostgREST client.
+
+    python backend/benchmarks/bench_ingest.py --sessions 5000 --concurrency 100 --rtt 0.01
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from ingest import EventIngestor  # noqa: E402
+from repository import Repository  # noqa: E402
+
+
+class RoundTripRepository(Repository):
+    def __init__(self, rtt: float, pool_size: int):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.rows = 0
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def insert(self, table, rows):
+        async with self._slots:
+            await asyncio.sleep(self.rtt)
+        self.round_trips += 1
+        self.rows += len(rows) if isinstance(rows, list) else 1
+
+
+def synthetic_stream(sessions: int):
+    for i in range(sessions):
+        session_id = f"bench_{i}_{uuid.uuid4().hex[:8]}"
+        for event_type in ("visit", "leave"):
+            yield {
+                "session_id": session_id,
+                "event_type": event_type,
+                "page": "/",
+                "user_agent": "Mozilla/5.0 (bench)",
+                "referrer": "https://google.com" if event_type == "visit" else "",
+            }
+
+
+async def replay(client: httpx.AsyncClient, sessions: int, concurrency: int) -> float:
+    events = iter(synthetic_stream(sessions))
+
+    async def worker():
+        for event in events:
+            await client.post("/api/visitors/track", json=event)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - started
+
+
+async def run_unbatched(args) -> dict:
+    db = RoundTripRepository(args.rtt, args.pool_size)
+
+    class Direct:
+        async def submit(self, doc):
+            await db.insert('visitor_events', doc)
+
+    server.ingestor = Direct()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as client:
+        elapsed = await replay(client, args.sessions, args.concurrency)
+    return {"mode": "per-hit insert", "elapsed": elapsed, "drained": elapsed, "db": db}
+
+
+async def run_batched(args) -> dict:
+    db = RoundTripRepository(args.rtt, args.pool_size)
+    server.ingestor = EventIngestor(db, batch_size=args.batch_size, flush_interval=args.flush_interval,
+                                    max_pending=args.max_pending)
+    await server.ingestor.start()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as client:
+        started = time.perf_counter()
+        elapsed = await replay(client, args.sessions, args.concurrency)
+    await server.ingestor.stop()
+    return {"mode": f"batched ({args.batch_size}/{args.flush_interval}s)", "elapsed": elapsed,
+            "drained": time.perf_counter() - started, "db": db}
+
+
+def report(result: dict, events: int) -> None:
+    db = result["db"]
+    print(f"{result['mode']:<28} accepted {events / result['elapsed']:>9.0f} ev/s   "
+          f"persisted {db.rows:>7} rows in {result['drained']:6.2f}s   round trips {db.round_trips:>7}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--rtt', type=float, default=0.01, help="simulated database round trip in seconds")
+    parser.add_argument('--pool-size', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=0.25)
+    parser.add_argument('--max-pending', type=int, default=10000)
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    events = args.sessions * 2
+    print(f"{events} events, concurrency {args.concurrency}, rtt {args.rtt * 1000:.0f}ms, pool {args.pool_size}")
+    report(await run_unbatched(args), events)
+    report(await run_batched(args), events)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""Query plans and latency of the hot read paths before and after the schema migrations.
+
+Builds a SQLite database shaped like production (leads, visitor events and
+outbox rows, with some timestamps in the older "Z" and naive forms), runs the
+list, counter and outbox queries through SQLiteRepository, then applies
+migrations.py and runs them again. Postgres plans differ in detail, but the
+indexes are the same.
+
+    python backend/benchmarks/bench_migrations.py --bookings 200000 --events 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pagination import decode_cursor, fetch_page  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+STATUSES = ("confirmed",) * 6 + ("completed",) * 2 + ("cancelled", "pending")
+
+# (label, SQL the repository issues, for EXPLAIN QUERY PLAN)
+QUERIES = [
+    ("bookings page 1", 'SELECT * FROM demo_bookings ORDER BY created_at DESC, id DESC LIMIT 51'),
+    ("bookings page deep", 'SELECT * FROM demo_bookings WHERE (created_at, id) < (?, ?) '
+                           'ORDER BY created_at DESC, id DESC LIMIT 51'),
+    ("bookings ?status=pending", "SELECT * FROM demo_bookings WHERE status = 'pending' "
+                                 "ORDER BY created_at DESC, id DESC LIMIT 51"),
+    ("count pending bookings", "SELECT COUNT(*) FROM demo_bookings WHERE status = 'pending'"),
+    ("count visits", "SELECT COUNT(*) FROM visitor_events WHERE event_type = 'visit'"),
+    ("outbox pending on start", "SELECT * FROM email_outbox WHERE status = 'pending' ORDER BY created_at ASC"),
+]
+
+
+def stamp(seconds: float, rng: random.Random) -> str:
+    moment = EPOCH + timedelta(seconds=seconds)
+    roll = rng.random()
+    # Rows written by older code or by hand: a "Z" suffix or no offset at all.
+    if roll < 0.05:
+        return moment.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    if roll < 0.08:
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+    return moment.isoformat()
+
+
+async def populate(path: str, bookings: int, events: int, rng: random.Random) -> None:
+    repo = SQLiteRepository(path, migrations=())
+    chunk = 20000
+    for start in range(0, bookings, chunk):
+        await repo.insert('demo_bookings', [{
+            "id": f"b{i:08d}", "name": f"Student {i}", "email": f"s{i}@example.com", "phone": "+919800000000",
+            "subject_interest": ("Mathematics", "Physics", "Chemistry", "English")[i % 4],
+            "status": rng.choice(STATUSES), "created_at": stamp(i * 60.0, rng),
+        } for i in range(start, min(bookings, start + chunk))])
+    for start in range(0, events, chunk):
+        await repo.insert('visitor_events', [{
+            "id": f"e{i:09d}", "session_id": f"s{i // 6}", "event_type": "visit" if i % 3 else "leave",
+            "page": "/", "browser": "chrome", "os": "android", "device": "mobile", "timestamp": stamp(i * 5.0, rng),
+        } for i in range(start, min(events, start + chunk))])
+    await repo.insert('email_outbox', [{
+        "id": f"m{i:07d}", "kind": "booking_confirmation", "payload": {"to": f"s{i}@example.com"},
+        "status": "pending" if i % 500 == 0 else "sent", "created_at": stamp(i * 60.0, rng),
+    } for i in range(bookings)])
+    await repo.aclose()
+
+
+def plans(path: str, middle: list) -> list:
+    db = sqlite3.connect(path)
+    out = []
+    for _, sql in QUERIES:
+        params = middle if "?" in sql else []
+        out.append(" / ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql, params)))
+    db.close()
+    return out
+
+
+async def latencies(repo: SQLiteRepository, middle: str, repeat: int) -> list:
+    calls = [
+        lambda: fetch_page(repo, 'demo_bookings', limit=50),
+        lambda: fetch_page(repo, 'demo_bookings', limit=50, cursor=middle),
+        lambda: fetch_page(repo, 'demo_bookings', where=[('status', 'eq', 'pending')], limit=50),
+        lambda: repo.count('demo_bookings', [('status', 'eq', 'pending')]),
+        lambda: repo.count('visitor_events', [('event_type', 'eq', 'visit')]),
+        lambda: repo.select('email_outbox', where=[('status', 'eq', 'pending')], order=[('created_at', False)]),
+    ]
+    out = []
+    for call in calls:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - started)
+        out.append(statistics.median(samples))
+    return out
+
+
+async def measure(path: str, migrate: bool, repeat: int):
+    started = time.perf_counter()
+    repo = SQLiteRepository(path, **({} if migrate else {"migrations": ()}))
+    opened = time.perf_counter() - started
+    # A cursor halfway down the list, as an admin paging far back would send.
+    page = await fetch_page(repo, 'demo_bookings', limit=await repo.count('demo_bookings') // 2)
+    middle = page["next_cursor"]
+    timings = await latencies(repo, middle, repeat)
+    await repo.aclose()
+    return opened, plans(path, decode_cursor(middle)), timings
+
+
+async def main(args):
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.sqlite3")
+        started = time.perf_counter()
+        await populate(path, args.bookings, args.events, rng)
+        print(f"{args.bookings} bookings, {args.events} visitor events, {args.bookings} outbox rows "
+              f"written in {time.perf_counter() - started:.1f}s")
+
+        _, before_plans, before = await measure(path, False, args.repeat)
+        migrated, after_plans, after = await measure(path, True, args.repeat)
+        print(f"migrations applied in {migrated:.2f}s\n")
+
+        for (label, _), old_plan, new_plan, old, new in zip(QUERIES, before_plans, after_plans, before, after):
+            print(f"{label:26s} {old * 1e3:9.2f} ms -> {new * 1e3:7.2f} ms   ({old / new:6.1f}x)")
+            print(f"    before: {old_plan}")
+            print(f"    after:  {new_plan}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=200000)
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""Free-slot queries and slot claims with thousands of tutors and a year of bookings.
+
+Tutors get a random weekly schedule (one or two windows on five or six days,
+in one of a few time zones) and two or three of eight subjects; each of
+their slots over the next year is booked with probability --booked. The
+sorted claim arrays are compared with keeping claims unsorted and checking a
+slot by scanning them, which is what the free-text preferred_date leaves an
+operator doing by hand. Claims are also timed end to end against SQLite,
+where the tutor_slots primary key settles races between workers.
+
+    python backend/benchmarks/bench_scheduling.py --tutors 1000 5000 --booked 0.3
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import epoch  # noqa: E402
+from scheduling import WEEKDAYS, Scheduler, SlotUnavailable  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+SUBJECTS = ("mathematics", "physics", "chemistry", "biology", "english", "computer-science", "history", "music")
+ZONES = ("Asia/Kolkata", "Asia/Dubai", "Europe/London", "America/New_York")
+DAY = 86400
+
+
+def synthetic_profiles(count: int, rng: random.Random):
+    for i in range(count):
+        days = rng.sample(WEEKDAYS, rng.choice((5, 6)))
+        opens = rng.randrange(7, 12)
+        hours = [[f"{opens:02d}:00", f"{opens + 4:02d}:00"]]
+        if rng.random() < 0.5:
+            hours.append([f"{opens + 6:02d}:00", f"{opens + 9:02d}:00"])
+        yield {"slug": f"tutor-{i}", "name": f"Tutor {i}", "subjects": rng.sample(SUBJECTS, rng.choice((2, 3))),
+               "timezone": rng.choice(ZONES), "weekly": {day: hours for day in days}}
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), max(samples)
+
+
+def scan_conflicts(claims, lo: int, hi: int) -> bool:
+    return any(start < hi and end > lo for start, end in claims)
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 1e6
+
+
+async def claims_per_second(schedule: Scheduler, slots, repeat: int) -> float:
+    started = time.perf_counter()
+    claimed = 0
+    for i, slot in enumerate(slots[:repeat]):
+        try:
+            await schedule.claim(slot["tutor"], epoch(slot["start"]), f"b{i}")
+            claimed += 1
+        except SlotUnavailable:
+            pass
+    return claimed / (time.perf_counter() - started)
+
+
+def main(args):
+    for count in args.tutors:
+        rng = random.Random(5)
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(list(synthetic_profiles(count, rng)), f)
+            f.flush()
+            schedule = Scheduler(SQLiteRepository(), f.name, min_notice=0, horizon_days=400)
+        now = time.time()
+        year = (now, now + 365 * DAY)
+
+        before = rss_mb()
+        started = time.perf_counter()
+        for tutor in schedule.tutors.values():
+            for t in list(tutor.free(*year, schedule.length)):
+                if rng.random() < args.booked:
+                    tutor.reserve(t, t + schedule.length)
+        fill = time.perf_counter() - started
+        claims = sum(len(t.starts) for t in schedule.tutors.values())
+        print(f"{count} tutors: {claims} claims over a year filled in {fill:.1f}s, +{rss_mb() - before:.0f} MB RSS")
+
+        subject = SUBJECTS[0]
+        later = now + 300 * DAY
+        for name, fn in {
+            f"next 10 for {subject}": lambda: schedule.free_slots(subject, start=now, limit=10),
+            f"next 10 in 300 days": lambda: schedule.free_slots(subject, start=later, limit=10),
+            "next 100, any subject": lambda: schedule.free_slots(start=now, limit=100),
+            "one tutor, next 50": lambda: schedule.free_slots(tutor="tutor-0", start=now, limit=50),
+        }.items():
+            p50, worst = timed(fn, args.repeat)
+            print(f"  {name:24s} {p50 * 1e3:7.2f} ms (max {worst * 1e3:6.2f})")
+
+        tutor = max(schedule.tutors.values(), key=lambda t: len(t.starts))
+        pairs = list(zip(tutor.starts, tutor.ends))
+        probes = [int(rng.uniform(*year)) for _ in range(1000)]
+        (bisect, _) = timed(lambda: [tutor.conflicts(t, t + schedule.length) for t in probes], 5)
+        (scan, _) = timed(lambda: [scan_conflicts(pairs, t, t + schedule.length) for t in probes], 1)
+        print(f"  conflict check, {len(pairs)} claims: bisect {bisect * 1e3:.2f} µs   scan {scan * 1e3:.1f} µs")
+
+        slots = schedule.free_slots(subject, start=now + 200 * DAY, limit=args.claims)
+        rate = asyncio.run(claims_per_second(schedule, slots, args.claims))
+        print(f"  claim + SQLite insert      {rate:7.0f} claims/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tutors", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--booked", type=float, default=0.3)
+    parser.add_argument("--claims", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
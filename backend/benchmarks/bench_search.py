@@ -0,0 +1,106 @@
+"""Admin lead search: trigram index against a linear scan as the number of leads grows.
+
+Leads are synthetic (Indian first and last names, gmail/yahoo/school email
+addresses, +91 phone numbers, short messages) and spread over the three lead
+tables. Each query kind is run against the index and against a lowercase
+substring scan over the same rows, which is what searching without the
+index costs even once the rows are already in memory.
+
+    python backend/benchmarks/bench_search.py --leads 100000 300000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search import TABLES, LeadIndex, words  # noqa: E402
+
+FIRST = ("Aarav Vivaan Aditya Vihaan Arjun Sai Reyansh Ayaan Krishna Ishaan Ananya Diya Saanvi Aadhya Pari "
+         "Anika Navya Myra Sara Ira Kabir Rohan Meera Asha Zoya Tara Dev Neel Riya Kavya").split()
+LAST = ("Sharma Verma Gupta Iyer Nair Reddy Das Singh Khan Patel Mehta Rao Joshi Kapoor Menon Bose Ghosh Pillai "
+        "Chopra Malhotra").split()
+DOMAINS = ("gmail.com", "yahoo.co.in", "outlook.com", "school.edu.in", "hotmail.com")
+SUBJECTS = ("Mathematics", "Physics", "Chemistry", "Biology", "English", "Coding", "Economics", "History")
+PHRASES = ("needs help with algebra before the board exams", "looking for weekend classes",
+           "can you share fees for grade 9", "struggling with organic chemistry", "wants an essay writing coach",
+           "interested in olympiad preparation", "please call after 6pm", "is there a trial class for coding")
+
+
+def synthetic_leads(count: int, rng: random.Random):
+    tables = list(TABLES)
+    for i in range(count):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        table = tables[i % 3]
+        row = {"id": f"{table[0]}{i}", "name": f"{first} {last}",
+               "email": f"{first.lower()}.{last.lower()}{rng.randrange(1000)}@{rng.choice(DOMAINS)}",
+               "phone": f"+91 9{rng.randrange(10 ** 8, 10 ** 9)}", "message": rng.choice(PHRASES),
+               "created_at": f"2026-01-01T00:00:{i:09d}"}
+        if TABLES[table]:
+            row[TABLES[table]] = rng.choice(SUBJECTS)
+        yield table, row
+
+
+def scan(rows, query: str, limit: int = 20):
+    terms = [word for word in words(query) if len(word) >= 2]
+    found = []
+    for table, row in rows:
+        text = " ".join(str(value) for value in row.values()).lower()
+        if all(term in text for term in terms):
+            found.append(row["id"])
+    return found[-limit:]
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), max(samples)
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 1e6
+
+
+def main(args):
+    for count in args.leads:
+        rng = random.Random(11)
+        rows = list(synthetic_leads(count, rng))
+        sample = rows[count // 2][1]
+        queries = {
+            "full name": sample["name"],
+            "email fragment": sample["email"].split("@")[0][-8:],
+            "phone fragment": sample["phone"][-7:],
+            "two words": "algebra " + sample["name"].split()[1],
+            "common word": "gmail",
+            "prefix": sample["name"][:2],
+        }
+        before = rss_mb()
+        leads = LeadIndex(None)
+        started = time.perf_counter()
+        for table, row in rows:
+            leads.add(table, row)
+        build = time.perf_counter() - started
+        stats = leads.stats()
+        print(f"{count} leads: built in {build:.1f}s, {stats['trigrams']} trigrams, "
+              f"{stats['postings_bytes'] / 1e6:.1f} MB of postings, +{rss_mb() - before:.0f} MB RSS")
+        for name, query in queries.items():
+            leads.search(query)  # first use builds the bitmaps it needs
+            (p50, worst), result = timed(lambda: leads.search(query), args.repeat), leads.search(query)
+            (scan_p50, _) = timed(lambda: scan(rows, query), 3)
+            print(f"  {name:15s} {query!r:28s} {result['total']:7d} hits  index {p50 * 1e3:6.2f} ms "
+                  f"(max {worst * 1e3:5.2f})  scan {scan_p50 * 1e3:8.1f} ms")
+        del leads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, nargs="+", default=[100000, 300000])
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+"""Per-request CPU of the booking write path and the list body, before and after the fast path.
+
+write: what create_demo_booking did with a validated DemoBookingCreate -
+rebuild and re-validate a DemoBooking, dump it twice, then let FastAPI
+validate and jsonable_encode it again for response_model - against dumping
+once, model_construct for the server defaults, and orjson.
+
+list: a page of rows as FastAPI serializes it through response_model=
+List[DemoBooking] and JSONResponse, as the stdlib json.dumps the cache used,
+and as orjson; plus what gzip/brotli costs and saves on the same body.
+
+    python backend/benchmarks/bench_serialization.py --rows 50 200 500
+"""
+import argparse
+import json
+import sys
+import time
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from serialization import ENCODINGS, JSONBytesResponse, compress, dumps  # noqa: E402
+from server import DemoBooking, DemoBookingCreate, new_row  # noqa: E402
+
+PAYLOAD = {"name": "Asha Verma", "email": "asha@example.com", "phone": "+91 98765 43210",
+           "grade_level": "Grade 10", "subject_interest": "Mathematics", "preferred_date": "2026-05-02",
+           "message": "Looking for help with algebra and geometry before the board exams."}
+BOOKING_FIELD = create_response_field(name="response", type_=DemoBooking)
+LIST_FIELD = create_response_field(name="response", type_=List[DemoBooking])
+
+
+def run_sync(coro):
+    # serialize_response never suspends for async routes; drive it without an event loop.
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("serialize_response suspended")
+
+
+def old_write(input: DemoBookingCreate) -> bytes:
+    input.model_dump()  # idempotency fingerprint
+    booking = DemoBooking(**input.model_dump())
+    booking.model_dump()  # insert, event
+    booking.model_dump()  # outbox
+    content = run_sync(serialize_response(field=BOOKING_FIELD, response_content=booking))
+    return JSONResponse(content).body
+
+
+def new_write(input: DemoBookingCreate) -> bytes:
+    doc = new_row(DemoBooking, input.model_dump())
+    return JSONBytesResponse(doc).body
+
+
+def rows(count: int):
+    return [{**PAYLOAD, "id": str(uuid.uuid4()), "status": "pending",
+             "created_at": datetime.now(timezone.utc).isoformat()} for _ in range(count)]
+
+
+def per_call(fn, *args) -> float:
+    number = 200
+    return min(timeit.repeat(lambda: fn(*args), number=number, repeat=5)) / number
+
+
+def main(args):
+    input = DemoBookingCreate.model_validate(PAYLOAD)
+    assert json.loads(old_write(input)).keys() == json.loads(new_write(input)).keys()
+    old, new = per_call(old_write, input), per_call(new_write, input)
+    print(f"write path       before {old * 1e6:7.1f} µs   after {new * 1e6:7.1f} µs   "
+          f"saved {(old - new) * 1e6:6.1f} µs/request")
+
+    for count in args.rows:
+        page = {"items": rows(count), "next_cursor": None}
+        fastapi_ = per_call(lambda: JSONResponse(
+            {"items": run_sync(serialize_response(field=LIST_FIELD, response_content=page["items"])),
+             "next_cursor": None}).body)
+        stdlib = per_call(lambda: json.dumps(page, separators=(",", ":")).encode())
+        fast = per_call(dumps, page)
+        print(f"list {count:4d} rows  response_model {fastapi_ * 1e3:6.2f} ms   json {stdlib * 1e3:6.2f} ms   "
+              f"orjson {fast * 1e3:6.2f} ms")
+        body = dumps(page)
+        for encoding in ENCODINGS:
+            started = time.perf_counter()
+            encoded = compress(body, encoding)
+            elapsed = time.perf_counter() - started
+            print(f"     {encoding:>4}  {len(body) / 1024:7.1f} KiB -> {len(encoded) / 1024:6.1f} KiB "
+                  f"in {elapsed * 1e3:5.2f} ms (once per cached page)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 200, 500])
+    main(parser.parse_args())
@@ -0,0 +1,152 @@
+"""Lead capture during a database outage: request latency, spool throughput and replay speed.
+
+A stand-in database either hangs (every call takes --hang seconds, like an
+overloaded Supabase) or refuses connections. Demo bookings are posted
+through the app at --concurrency while it is down, with email notifications
+on, so each one writes both the booking and its outbox row: first straight
+to the database and then through the deadline and circuit breaker, with the
+spool taking the rows. The spool's group commit is then measured on its
+own, and finally the spooled rows are replayed into SQLite.
+
+    python backend/benchmarks/bench_spool.py --requests 400 --concurrency 40 --hang 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ['RATE_LIMIT_STORE'] = 'off'
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from breaker import CircuitBreaker, GuardedRepository  # noqa: E402
+from outbox import ResendSender  # noqa: E402
+from repository import Repository  # noqa: E402
+from spool import Spool  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+
+class Outage(Repository):
+    def __init__(self, hang: float):
+        self.hang = hang
+        self.calls = 0
+
+    async def insert(self, table, rows):
+        self.calls += 1
+        if self.hang:
+            await asyncio.sleep(self.hang)
+        raise httpx.ConnectError("connection refused")
+
+
+def use(repo: Repository):
+    # What the app's own wiring does, with the guard under test instead of the configured one.
+    server.repo = repo
+    for component in server.guarded_components:
+        component.repo = repo
+
+
+def percentile(samples, share):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def post_leads(count: int, concurrency: int, run: str):
+    transport = httpx.ASGITransport(app=server.app)
+    gate = asyncio.Semaphore(concurrency)
+    latencies, codes = [], []
+
+    async def one(client, i):
+        async with gate:
+            started = time.perf_counter()
+            response = await client.post("/api/demo-bookings", headers={"X-Session-Id": f"s{i}"}, json={
+                "name": f"Parent {i}", "email": f"parent{i}@{run}.example.com", "subject_interest": "Physics"})
+            latencies.append(time.perf_counter() - started)
+            codes.append(response.status_code)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+        await asyncio.gather(*[one(client, i) for i in range(count)])
+    return latencies, codes, time.perf_counter() - started
+
+
+def report(label, latencies, codes, elapsed, database_calls):
+    print(f"  {label:34s} p50 {statistics.median(latencies) * 1e3:8.1f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1e3:8.1f} ms   {len(codes) / elapsed:7.0f} req/s   {codes.count(200)}/{len(codes)} saved   "
+          f"{database_calls} database calls")
+
+
+async def main(args):
+    # Every failed insert logs an error; thousands of them would drown the report.
+    logging.disable(logging.CRITICAL)
+    # Emails are queued but never sent: the outbox workers are not started.
+    server.outbox.sender = ResendSender("re_bench", transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"id": "email"})))
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.requests} demo bookings with email at concurrency {args.concurrency}, database hanging {args.hang}s")
+        # Without a deadline each request waits out the hang; fewer requests keep this short.
+        outage = Outage(args.hang)
+        server.spool = Spool(Path(directory) / "direct")
+        use(outage)
+        small = max(args.concurrency, args.requests // 10)
+        report("no deadline, no breaker", *await post_leads(small, args.concurrency, "direct"), outage.calls)
+
+        outage = Outage(args.hang)
+        server.spool = Spool(Path(directory) / "deadline")
+        use(GuardedRepository(outage, CircuitBreaker(failure_threshold=10 ** 9), deadline=args.deadline))
+        report(f"{args.deadline}s deadline", *await post_leads(args.requests, args.concurrency, "deadline"), outage.calls)
+
+        outage = Outage(args.hang)
+        spool = server.spool = Spool(Path(directory) / "breaker")
+        use(GuardedRepository(outage, CircuitBreaker(), deadline=args.deadline))
+        report(f"{args.deadline}s deadline + circuit breaker", *await post_leads(args.requests, args.concurrency, "breaker"),
+               outage.calls)
+
+        print(f"\nspool appends ({args.rows} rows, fsync per batch)")
+        for concurrency in args.append_concurrency:
+            target = Spool(Path(directory) / f"append-{concurrency}")
+            rows = [{"id": f"m{i:07d}", "name": f"Parent {i}", "email": f"parent{i}@example.com",
+                     "message": "Call me back", "created_at": "2026-03-01T10:00:00+00:00"} for i in range(args.rows)]
+            gate = asyncio.Semaphore(concurrency)
+
+            async def append(row):
+                async with gate:
+                    await target.append('contact_messages', row)
+
+            started = time.perf_counter()
+            await asyncio.gather(*[append(row) for row in rows])
+            elapsed = time.perf_counter() - started
+            print(f"  concurrency {concurrency:4d}   {args.rows / elapsed:8.0f} rows/s   "
+                  f"{target.fsyncs:6d} fsyncs ({args.rows / target.fsyncs:6.1f} rows each)")
+            await target.stop()
+
+        print("\nreplay once the database is back")
+        for path in target.files():
+            path.rename(spool.directory / path.name)
+        spool.repo = SQLiteRepository()
+        started = time.perf_counter()
+        written = await spool.replay()
+        elapsed = time.perf_counter() - started
+        tables = {table: await spool.repo.count(table) for table in ('demo_bookings', 'email_outbox', 'contact_messages')}
+        print(f"  {written} rows in {elapsed:.2f}s ({written / elapsed:.0f} rows/s), "
+              f"{', '.join(f'{count} in {table}' for table, count in tables.items())}, "
+              f"{len(spool.files())} spool files left")
+        await spool.repo.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--hang", type=float, default=5.0)
+    parser.add_argument("--deadline", type=float, default=2.0)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--append-concurrency", type=int, nargs="+", default=[1, 16, 256])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""User-Agent classification on the tracking path: cached against parsing every event.
+
+Events draw their User-Agent from a Zipf-like mix of synthetic browser
+builds (a few versions of each browser on each platform) plus a share of
+crawlers, uptime checks and HTTP libraries. For each cache size the hit
+rate and the per-event cost are reported, along with how much smaller the
+stored row gets when browser, OS and device replace the raw string.
+
+    python backend/benchmarks/bench_useragent.py --events 200000 --cache-sizes 100 1000 10000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from useragent import UserAgentClassifier, parse  # noqa: E402
+
+PLATFORMS = ("Windows NT 10.0; Win64; x64", "Macintosh; Intel Mac OS X 10_15_7", "X11; Linux x86_64",
+             "Linux; Android 14; SM-S918B", "Linux; Android 13; Redmi Note 12", "Linux; Android 12; SM-X200")
+BOTS = ("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+        "Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)",
+        "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+        "Mozilla/5.0+(compatible; UptimeRobot/2.0; http://www.uptimerobot.com/)",
+        "python-requests/2.31.0", "curl/8.4.0", "WhatsApp/2.23.20.0 A")
+
+
+def browser_builds():
+    for platform in PLATFORMS:
+        mobile = " Mobile" if "Android" in platform and "SM-X" not in platform else ""
+        for version in range(118, 126):
+            chrome = f"Mozilla/5.0 ({platform}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{version}.0.0.0{mobile} Safari/537.36"
+            yield chrome
+            yield chrome + f" Edg/{version}.0.0.0"
+            yield f"Mozilla/5.0 ({platform}; rv:{version}.0) Gecko/20100101 Firefox/{version}.0"
+    for version in ("16_6", "17_2", "17_4", "17_5"):
+        yield (f"Mozilla/5.0 (iPhone; CPU iPhone OS {version} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+               f"Version/{version.replace('_', '.')} Mobile/15E148 Safari/604.1")
+
+
+def synthetic_agents(count: int, bot_share: float, rng: random.Random):
+    builds = list(browser_builds())
+    rng.shuffle(builds)
+    weights = [1 / (rank + 1) for rank in range(len(builds))]
+    for _ in range(count):
+        if rng.random() < bot_share:
+            yield rng.choice(BOTS)
+        else:
+            yield rng.choices(builds, weights)[0]
+
+
+def main(args):
+    rng = random.Random(3)
+    agents = list(synthetic_agents(args.events, args.bot_share, rng))
+    distinct = len(set(agents))
+
+    started = time.perf_counter()
+    for user_agent in agents:
+        parse(user_agent)
+    uncached = (time.perf_counter() - started) / len(agents)
+    print(f"{len(agents)} events, {distinct} distinct User-Agents, {args.bot_share:.0%} bots")
+    print(f"  parse every event       {uncached * 1e6:6.2f} µs/event")
+
+    for size in args.cache_sizes:
+        classifier = UserAgentClassifier(cache_size=size)
+        started = time.perf_counter()
+        for user_agent in agents:
+            classifier.classify(user_agent)
+        elapsed = (time.perf_counter() - started) / len(agents)
+        stats = classifier.stats()
+        print(f"  LRU of {size:6d}          {elapsed * 1e6:6.2f} µs/event   hit rate {stats['cache_hit_rate']:.3f}   "
+              f"{stats['parse_us_avg']} µs per miss   {stats['bot_hits']} bot events not written")
+
+    humans = [user_agent for user_agent in agents if parse(user_agent).bot is None]
+    raw = sum(len(user_agent) for user_agent in humans) / len(humans)
+    dims = sum(sum(len(part) for part in parse(user_agent)[1:]) for user_agent in humans) / len(humans)
+    print(f"  stored per event        {raw:6.1f} bytes raw -> {dims:4.1f} bytes as browser/os/device")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--bot-share", type=float, default=0.15)
+    parser.add_argument("--cache-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    main(parser.parse_args())
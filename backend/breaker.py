@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from repository import Repository, RepositoryError
+
+
+class CircuitOpen(RepositoryError):
+    pass
+
+
+def is_outage(error: BaseException) -> bool:
+    # Timeouts, dropped connections and 5xx answers mean the database is unwell;
+    # a 4xx or a bad filter is the caller's problem and says nothing about it.
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, OSError, CircuitOpen)):
+        return True
+    if isinstance(error, RepositoryError):
+        return error.status_code is None or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Stops sending calls to a database that keeps failing or timing out.
+
+    After failure_threshold outages in a row the circuit opens and calls fail
+    at once with CircuitOpen. reset_timeout seconds later one call is let
+    through as a probe (half-open); its success closes the circuit, its
+    failure opens it for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open, only the one probe may."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def succeeded(self) -> None:
+        if self._opened_at is not None:
+            logging.info("Database answering again, closing the circuit")
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def failed(self) -> None:
+        self.failures += 1
+        if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+            if self._opened_at is None:
+                logging.warning(f"Database failed {self.failures} calls in a row, opening the circuit "
+                                f"for {self.reset_timeout:.0f}s")
+                self.opened += 1
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def abandoned(self) -> None:
+        # The caller went away mid-call; a probe in flight tells us nothing.
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class GuardedRepository(Repository):
+    """Wraps a repository with a deadline per call and a circuit breaker.
+
+    A call that outlives deadline seconds is cancelled and raises
+    asyncio.TimeoutError. A write cancelled that way may still have reached
+    the database, so callers that retry it elsewhere must tolerate the row
+    already being there.
+    """
+
+    def __init__(self, inner: Repository, breaker: CircuitBreaker, deadline: float = 2.0):
+        self.inner = inner
+        self.breaker = breaker
+        self.deadline = deadline
+
+    async def _guarded(self, table: str, call):
+        if not self.breaker.allow():
+            call.close()
+            raise CircuitOpen(f"Circuit open, not querying {table}")
+        try:
+            result = await asyncio.wait_for(call, self.deadline)
+        except asyncio.CancelledError:
+            self.breaker.abandoned()
+            raise
+        except Exception as e:
+            if is_outage(e):
+                self.breaker.failed()
+            else:
+                # The database answered, even if it said no.
+                self.breaker.succeeded()
+            raise
+        self.breaker.succeeded()
+        return result
+
+    async def insert(self, table, rows):
+        return await self._guarded(table, self.inner.insert(table, rows))
+
+    async def upsert(self, table, rows, on_conflict="id"):
+        return await self._guarded(table, self.inner.upsert(table, rows, on_conflict))
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        return await self._guarded(table, self.inner.select(table, columns, where, order, limit, after))
+
+    async def update(self, table, values, where):
+        return await self._guarded(table, self.inner.update(table, values, where))
+
+    async def delete(self, table, where):
+        return await self._guarded(table, self.inner.delete(table, where))
+
+    async def count(self, table, where=()):
+        return await self._guarded(table, self.inner.count(table, where))
+
+    async def warm(self, connections=1):
+        await self.inner.warm(connections)
+
+    async def aclose(self):
+        await self.inner.aclose()
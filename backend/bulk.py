@@ -0,0 +1,104 @@
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from repository import Repository
+
+# Ids per statement. PostgREST takes filters in the query string, where 100
+# uuids stay well under common URL length limits.
+DEFAULT_CHUNK_SIZE = 100
+
+
+def chunked(ids: Sequence[str], size: int) -> Iterator[Sequence[str]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class BulkOutcome:
+    """Per-id results of a bulk operation, in request order.
+
+    Each result is {"id", "result", "previous"} where previous is the value
+    of the column before the change (None for ids that were not found).
+    """
+
+    def __init__(self, ids: Sequence[str]):
+        self.results: Dict[str, Dict[str, Any]] = {id: {"id": id, "result": "not_found", "previous": None}
+                                                   for id in ids}
+        self.statements = 0
+
+    def set(self, id: str, result: str, previous: Any = None) -> None:
+        self.results[id] = {"id": id, "result": result, "previous": previous}
+
+    def with_result(self, result: str) -> List[Dict[str, Any]]:
+        return [r for r in self.results.values() if r["result"] == result]
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = defaultdict(int)
+        for r in self.results.values():
+            counts[r["result"]] += 1
+        return dict(counts)
+
+
+async def bulk_delete(repo: Repository, table: str, ids: Sequence[str], column: str = 'status',
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, dry_run: bool = False) -> BulkOutcome:
+    """Deletes ids with one `id in (...)` statement per chunk.
+
+    The deleted rows come back from the delete itself, so ids missing from
+    them were not there. A dry run selects the same rows instead.
+    """
+    outcome = BulkOutcome(ids)
+    for chunk in chunked(ids, chunk_size):
+        try:
+            if dry_run:
+                rows = await repo.select(table, f"id,{column}", [('id', 'in', list(chunk))])
+            else:
+                rows = await repo.delete(table, [('id', 'in', list(chunk))])
+            outcome.statements += 1
+        except Exception as e:
+            logging.error(f"Error bulk deleting {len(chunk)} {table} rows: {e}")
+            for id in chunk:
+                outcome.set(id, "error")
+            continue
+        for row in rows:
+            outcome.set(row["id"], "would_delete" if dry_run else "deleted", row.get(column))
+    return outcome
+
+
+async def bulk_set(repo: Repository, table: str, ids: Sequence[str], column: str, value: Any,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, dry_run: bool = False) -> BulkOutcome:
+    """Sets column to value for ids, one select plus one update per distinct old value per chunk.
+
+    Each update is guarded on the old value it expects, so the previous values
+    reported (and the counters moved from them) are exact; a row changed by
+    someone else in between is reported as "conflict" and left alone.
+    """
+    outcome = BulkOutcome(ids)
+    for chunk in chunked(ids, chunk_size):
+        # Ids whose outcome is still unknown if a statement fails.
+        pending = set(chunk)
+        try:
+            rows = await repo.select(table, f"id,{column}", [('id', 'in', list(chunk))])
+            outcome.statements += 1
+            by_previous: Dict[Optional[Any], List[str]] = defaultdict(list)
+            for row in rows:
+                previous = row.get(column)
+                if previous == value:
+                    outcome.set(row["id"], "unchanged", previous)
+                elif dry_run:
+                    outcome.set(row["id"], "would_update", previous)
+                else:
+                    by_previous[previous].append(row["id"])
+            pending = {id for group in by_previous.values() for id in group}
+            for previous, group in by_previous.items():
+                guard = (column, 'is', None) if previous is None else (column, 'eq', previous)
+                updated = await repo.update(table, {column: value}, [('id', 'in', group), guard])
+                outcome.statements += 1
+                changed = {row["id"] for row in updated}
+                for id in group:
+                    outcome.set(id, "updated" if id in changed else "conflict", previous)
+                pending.difference_update(group)
+        except Exception as e:
+            logging.error(f"Error bulk updating {len(chunk)} {table} rows: {e}")
+            for id in pending:
+                outcome.set(id, "error", outcome.results[id]["previous"])
+    return outcome
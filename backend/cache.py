@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from serialization import COMPRESS_MIN_BYTES, accepted_encoding, compress, dumps
+
+V = TypeVar('V')
+
+_MISSING = object()
+
+
+class TTLCache(Generic[V]):
+    """Bounded LRU map whose entries also expire ttl seconds after they were set."""
+
+    def __init__(self, max_entries: int, ttl: float, on_evict: Optional[Callable[[Hashable], None]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[V]:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            if self.on_evict:
+                self.on_evict(key)
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Optional[V]:
+        entry = self._entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# A cached response: (etag, JSON body).
+Entry = Tuple[str, bytes]
+
+
+class MemoryBackend:
+    """Per-process store; each uvicorn worker keeps its own copy."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._keys_by_tag: Dict[str, Set[str]] = defaultdict(set)
+        self._tags_by_key: Dict[str, List[str]] = {}
+        self._entries: TTLCache = TTLCache(max_entries, ttl, on_evict=self._forget)
+
+    def _forget(self, key: str) -> None:
+        for tag in self._tags_by_key.pop(key, ()):
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    async def get(self, key: str) -> Optional[Entry]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, entry: Entry, tags: Iterable[str]) -> None:
+        self._forget(key)
+        tags = list(tags)
+        self._tags_by_key[key] = tags
+        for tag in tags:
+            self._keys_by_tag[tag].add(key)
+        self._entries.set(key, entry)
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        dropped = 0
+        for tag in tags:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                if self._entries.pop(key) is not None:
+                    dropped += 1
+                self._forget(key)
+        return dropped
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_tag.clear()
+        self._tags_by_key.clear()
+
+
+class SQLiteBackend:
+    """Store in a local SQLite file so every worker on the host shares one cache."""
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, etag TEXT, body BLOB,"
+                         " expires REAL, used REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT, key TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tags_key ON tags (key)")
+
+    def _get(self, key: str) -> Optional[Entry]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT etag, body, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                self._delete([key])
+                return None
+            self._db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def _set(self, key: str, entry: Entry, tags: List[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM tags WHERE key = ?", (key,))
+                self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                                 (key, entry[0], entry[1], now + self.ttl, now))
+                self._db.executemany("INSERT INTO tags VALUES (?, ?)", [(tag, key) for tag in tags])
+                excess = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    stale = [r[0] for r in self._db.execute(
+                        "SELECT key FROM entries ORDER BY expires <= ? DESC, used LIMIT ?", (now, excess))]
+                    self._delete(stale)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _delete(self, keys: List[str]) -> None:
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in keys])
+        self._db.executemany("DELETE FROM tags WHERE key = ?", [(k,) for k in keys])
+
+    def _invalidate(self, tags: List[str]) -> int:
+        with self._lock:
+            marks = ",".join("?" * len(tags))
+            keys = [r[0] for r in self._db.execute(f"SELECT DISTINCT key FROM tags WHERE tag IN ({marks})", tags)]
+            self._delete(keys)
+        return len(keys)
+
+    async def get(self, key: str) -> Optional[Entry]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, entry: Entry, tags: Iterable[str]) -> None:
+        await asyncio.to_thread(self._set, key, entry, list(tags))
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        return await asyncio.to_thread(self._invalidate, tags) if tags else 0
+
+    async def clear(self) -> None:
+        def run():
+            with self._lock:
+                self._db.execute("DELETE FROM entries")
+                self._db.execute("DELETE FROM tags")
+        await asyncio.to_thread(run)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == "*":
+            return True
+    return False
+
+
+class ResponseCache:
+    """Read-through cache of JSON GET responses with tag-based invalidation.
+
+    Entries are keyed on path plus sorted query parameters and tagged by the
+    caller; writes drop exactly the entries carrying the tags they affect.
+    Every response carries an ETag, and a matching If-None-Match gets a 304.
+    Bodies of compress_min_bytes or more are sent gzip- or brotli-encoded to
+    clients that accept it; the encoded body is kept per ETag, so each cached
+    page is compressed once per process rather than once per request.
+    """
+
+    def __init__(self, backend=None, compress_min_bytes: int = COMPRESS_MIN_BYTES):
+        self.backend = backend
+        self.compress_min_bytes = compress_min_bytes
+        self._encoded: TTLCache[bytes] = TTLCache(max_entries=256, ttl=3600)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidated = 0
+        self.compressed = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def key(request: Request) -> str:
+        return request.url.path + "?" + "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+
+    async def get(self, request: Request) -> Optional[Entry]:
+        if self.backend is None:
+            return None
+        entry = await self.backend.get(self.key(request))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def put(self, request: Request, payload: Any, tags: Iterable[str]) -> Entry:
+        body = dumps(payload)
+        entry = (make_etag(body), body)
+        if self.backend is not None:
+            await self.backend.set(self.key(request), entry, tags)
+        return entry
+
+    async def invalidate(self, *tags: str) -> None:
+        if self.backend is not None:
+            self.invalidated += await self.backend.invalidate(tags)
+
+    def respond(self, request: Request, entry: Entry) -> Response:
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        encoding = None
+        if len(body) >= self.compress_min_bytes:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = accepted_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            # Each encoding is a different representation, so it gets its own
+            # ETag; a client holding either form of this body gets a 304.
+            headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+        if_none_match = request.headers.get("if-none-match")
+        if etag_matches(if_none_match, etag) or etag_matches(if_none_match, headers["ETag"]):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            encoded = self._encoded.get((etag, encoding))
+            if encoded is None:
+                encoded = compress(body, encoding)
+                self._encoded.set((etag, encoding), encoded)
+            self.compressed += 1
+            self.bytes_saved += len(body) - len(encoded)
+            headers["Content-Encoding"] = encoding
+            body = encoded
+        return Response(body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidated": self.invalidated,
+            "compressed": self.compressed,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -0,0 +1,164 @@
+import heapq
+import json
+import logging
+import math
+import re
+import time
+import uuid
+from array import array
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from cache import TTLCache
+from ingest import EventIngestor, IngestQueueFull
+
+FAQ_PATH = Path(__file__).parent / 'data' / 'faq.json'
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an the is are was be to of and or i me my it in on at for with can could please "
+                      "does do what who you your we our there get want".split())
+# Keywords are what an entry is about; its answer text only backs them up.
+KEYWORD_WEIGHT = 3
+
+
+def _stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str, pairs: bool = True) -> List[str]:
+    """Stemmed words minus stopwords, plus adjacent word pairs that are not all stopwords.
+
+    Pairs are what let the keyword "how much" mean pricing instead of matching
+    anything that says "how".
+    """
+    words = [word if word in STOPWORDS else _stem(word) for word in TOKEN.findall(text.lower())]
+    tokens = [w for w in words if w not in STOPWORDS]
+    if pairs:
+        tokens += [f"{a} {b}" for a, b in zip(words, words[1:]) if a not in STOPWORDS or b not in STOPWORDS]
+    return tokens
+
+
+class FAQIndex:
+    """BM25 over FAQ entries with an inverted index of token -> entries.
+
+    Each posting stores the entry's precomputed BM25 weight for the token, so
+    a lookup only sums the postings of the query's tokens; its cost follows
+    how many entries share those tokens, not how many entries there are.
+    """
+
+    def __init__(self, entries: Sequence[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.entries = list(entries)
+        docs = []
+        for entry in self.entries:
+            # Pairs come from keyword phrases only; in free text they are mostly noise.
+            terms = Counter(tokenize(entry.get("answer", ""), pairs=False))
+            for keyword in entry.get("keywords", ()):
+                for token in tokenize(keyword):
+                    terms[token] += KEYWORD_WEIGHT
+            docs.append(terms)
+        avg_length = sum(sum(d.values()) for d in docs) / len(docs) if docs else 0.0
+        frequency = Counter(token for terms in docs for token in terms)
+        n = len(docs)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        for doc_id, terms in enumerate(docs):
+            norm = k1 * (1 - b + b * sum(terms.values()) / avg_length)
+            for token, tf in terms.items():
+                idf = math.log(1 + (n - frequency[token] + 0.5) / (frequency[token] + 0.5))
+                ids, weights = self.postings.setdefault(token, (array('I'), array('f')))
+                ids.append(doc_id)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, tokens: Sequence[str], limit: int = 3) -> List[Tuple[float, int]]:
+        scores: Dict[int, float] = {}
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            for doc_id, weight in zip(*posting):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        return heapq.nlargest(limit, ((score, doc_id) for doc_id, score in scores.items()))
+
+
+class ChatBot:
+    """Answers chat messages from the FAQ data file.
+
+    The index is built once from path and swapped whole on reload(). Answers
+    are cached per normalized question, and questions no entry answers well
+    enough are queued to the unanswered ingestor, which writes them in batches.
+    """
+
+    def __init__(self, path: Path = FAQ_PATH, unanswered: Optional[EventIngestor] = None,
+                 cache_size: int = 1000, cache_ttl: float = 3600, min_score: float = 1.0):
+        self.path = Path(path)
+        self.unanswered = unanswered
+        self.min_score = min_score
+        self.cache: TTLCache = TTLCache(cache_size, cache_ttl)
+        self.hits = 0
+        self.misses = 0
+        self.unanswered_count = 0
+        self.reload()
+
+    def reload(self) -> int:
+        started = time.perf_counter()
+        data = json.loads(self.path.read_text(encoding='utf-8'))
+        index, fallback = FAQIndex(data["entries"]), data["fallback"]
+        self.index, self.fallback = index, fallback
+        self.cache.clear()
+        self.loaded_at = datetime.now(timezone.utc)
+        self.build_seconds = time.perf_counter() - started
+        return len(self.index)
+
+    def match(self, message: str) -> Dict[str, Any]:
+        tokens = tuple(tokenize(message))
+        key = " ".join(tokens)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        best = self.index.search(tokens, limit=1)
+        if best and best[0][0] >= self.min_score:
+            score, doc_id = best[0]
+            entry = self.index.entries[doc_id]
+            result = {"answer": entry["answer"], "faq_id": entry["id"], "score": round(score, 3)}
+        else:
+            result = {"answer": self.fallback, "faq_id": None, "score": round(best[0][0], 3) if best else 0.0}
+        self.cache.set(key, result)
+        return result
+
+    async def answer(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        result = self.match(message)
+        if result["faq_id"] is None and self.unanswered is not None:
+            self.unanswered_count += 1
+            try:
+                await self.unanswered.submit({
+                    "id": str(uuid.uuid4()),
+                    "question": message[:1000],
+                    "session_id": session_id or "",
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                })
+            except IngestQueueFull:
+                logging.warning("Unanswered chat queue full, question not logged")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.index),
+            "tokens": len(self.index.postings),
+            "loaded_at": self.loaded_at.isoformat(),
+            "build_seconds": round(self.build_seconds, 4),
+            "cache_entries": len(self.cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "unanswered": self.unanswered_count,
+            "unanswered_pending": self.unanswered.stats()["pending"] if self.unanswered else 0,
+        }
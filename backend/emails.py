@@ -0,0 +1,120 @@
+import html
+import string
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+TEMPLATE_DIR = Path(__file__).parent / 'templates'
+
+
+def _identity(value: str) -> str:
+    return value
+
+
+class EmailTemplate:
+    """A $placeholder template split once into literal chunks and field slots.
+
+    Rendering is a single join over the precomputed parts; the static chrome
+    is never re-scanned or re-built.
+    """
+
+    def __init__(self, source: str):
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        position = 0
+        for match in string.Template.pattern.finditer(source):
+            if match.group('escaped') is not None:
+                self.parts.append((source[position:match.end()][:-1], None))
+            elif match.group('named') or match.group('braced'):
+                self.parts.append((source[position:match.start()], match.group('named') or match.group('braced')))
+            else:
+                raise ValueError(f"Invalid placeholder at offset {match.start()}")
+            position = match.end()
+        self.parts.append((source[position:], None))
+        self.fields = {name for _, name in self.parts if name}
+
+    @classmethod
+    def load(cls, path: Path) -> 'EmailTemplate':
+        return cls(path.read_text(encoding='utf-8'))
+
+    def render(self, values: Mapping[str, Any], escape: Callable[[str], str] = html.escape,
+               safe: Iterable[str] = ()) -> str:
+        safe = set(safe)
+        out = []
+        for literal, name in self.parts:
+            out.append(literal)
+            if name:
+                value = str(values[name])
+                out.append(value if name in safe else escape(value))
+        return "".join(out)
+
+
+def _single_line(value: str) -> str:
+    return " ".join(str(value).split())
+
+
+class Notifications:
+    """Renders notification emails from the templates compiled at startup."""
+
+    KINDS = ('booking', 'query')
+    DIGEST_LABELS = {'booking': 'Demo', 'query': 'Query'}
+
+    def __init__(self, sender_email: str, notification_email: str, whatsapp_number: str,
+                 template_dir: Path = TEMPLATE_DIR):
+        self.sender_email = sender_email
+        self.notification_email = notification_email
+        self.whatsapp_number = whatsapp_number
+        names = [f"{kind}.{ext}" for kind in self.KINDS + ('digest', 'digest_row') for ext in ('html', 'txt')]
+        self.templates: Dict[str, EmailTemplate] = {
+            name: EmailTemplate.load(template_dir / name) for name in names
+        }
+
+    def _fields(self, kind: str, data: Mapping[str, Any]) -> Dict[str, Any]:
+        # Missing fields render empty rather than failing the whole notification.
+        fields = dict.fromkeys(self.templates[f"{kind}.html"].fields | self.templates[f"{kind}.txt"].fields, "")
+        fields.update((key, value) for key, value in data.items() if value is not None)
+        if kind == 'booking':
+            fields["message"] = fields.get("message") or "N/A"
+            text = f"Hi {fields.get('name', '')}, thanks for booking a demo with LearnSphere!"
+            fields["whatsapp_url"] = f"https://wa.me/{self.whatsapp_number}?text={quote(text)}"
+        return fields
+
+    def subject(self, kind: str, data: Mapping[str, Any]) -> str:
+        if kind == 'booking':
+            return _single_line(f"New Demo Booking: {data.get('name', '')} - {data.get('subject_interest', '')}")
+        return _single_line(f"Subject Query: {data.get('subject', '')} from {data.get('name', '')}")
+
+    def _message(self, subject: str, html_body: str, text_body: str) -> Dict[str, Any]:
+        return {
+            "from": self.sender_email,
+            "to": [self.notification_email],
+            "subject": subject,
+            "html": html_body,
+            "text": text_body,
+        }
+
+    def render(self, kind: str, data: Mapping[str, Any]) -> Dict[str, Any]:
+        fields = self._fields(kind, data)
+        return self._message(
+            self.subject(kind, data),
+            self.templates[f"{kind}.html"].render(fields),
+            self.templates[f"{kind}.txt"].render(fields, escape=_identity),
+        )
+
+    def render_digest(self, items: List[Tuple[str, Mapping[str, Any]]]) -> Dict[str, Any]:
+        html_rows, text_rows = [], []
+        for kind, data in items:
+            row = {
+                "label": self.DIGEST_LABELS.get(kind, kind),
+                "name": data.get("name", ""),
+                "email": data.get("email", ""),
+                "phone": data.get("phone", ""),
+                "subject": data.get("subject_interest") or data.get("subject") or "",
+            }
+            html_rows.append(self.templates["digest_row.html"].render(row))
+            text_rows.append(self.templates["digest_row.txt"].render(row, escape=_identity))
+        count = len(items)
+        return self._message(
+            f"{count} new leads",
+            self.templates["digest.html"].render({"count": count, "rows": "".join(html_rows)}, safe=("rows",)),
+            self.templates["digest.txt"].render({"count": count, "rows": "".join(text_rows)}, escape=_identity),
+        )
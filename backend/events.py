@@ -0,0 +1,103 @@
+import asyncio
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from serialization import dumps
+
+# (id, event name, data)
+Message = Tuple[str, str, Dict[str, Any]]
+
+
+def format_sse(event_id: Optional[str], event: str, data: Dict[str, Any]) -> bytes:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    return ("\n".join(lines) + "\ndata: ").encode() + dumps(data) + b"\n\n"
+
+
+class Subscription:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class EventBus:
+    """In-process pub/sub for admin dashboards.
+
+    Every message gets an id of the form "<epoch>-<seq>", where epoch is fixed
+    for the life of the process. The last history messages are kept so a
+    client reconnecting with Last-Event-ID gets exactly what it missed. If the
+    id is from another process lifetime or older than the history, the client
+    is told to reset and reload instead. A subscriber that falls queue_size
+    messages behind is disconnected rather than buffered without bound; its
+    reconnect resumes from the history.
+    """
+
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._seq = 0
+        self._history: Deque[Tuple[int, Message]] = deque(maxlen=history)
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.overflows = 0
+
+    def publish(self, event: str, data: Dict[str, Any]) -> str:
+        self._seq += 1
+        message = (f"{self.epoch}-{self._seq}", event, data)
+        self._history.append((self._seq, message))
+        self.published += 1
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self.overflows += 1
+                self._subscribers.discard(subscription)
+        return message[0]
+
+    def replay(self, last_event_id: str) -> Optional[List[Message]]:
+        """Messages after last_event_id, or None when they can no longer be replayed."""
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq >= self._seq:
+            return []
+        if not self._history or self._history[0][0] > seq + 1:
+            return None
+        return [message for n, message in self._history if n > seq]
+
+    async def stream(self, last_event_id: Optional[str] = None, heartbeat: float = 15.0,
+                     retry_ms: int = 3000) -> AsyncIterator[bytes]:
+        subscription = Subscription(self.queue_size)
+        # Subscribing and computing the replay happen together, so every message
+        # is either replayed or queued, never both or neither.
+        self._subscribers.add(subscription)
+        missed = self.replay(last_event_id) if last_event_id else []
+        try:
+            yield f"retry: {retry_ms}\n\n".encode()
+            if missed is None:
+                yield format_sse(None, "reset", {"reason": "resume point is no longer available"})
+            else:
+                for message in missed:
+                    yield format_sse(*message)
+            while not subscription.overflowed:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                yield format_sse(*message)
+        finally:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "overflows": self.overflows,
+            "history": len(self._history),
+        }
@@ -0,0 +1,72 @@
+import csv
+import io
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from repository import Repository
+from serialization import dumps
+
+# Exports run oldest first so an incremental export can resume from the
+# newest created_at it has already seen.
+EXPORT_ORDER = [('created_at', False), ('id', False)]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+DEFAULT_CHUNK_SIZE = 1000
+
+
+async def iter_chunks(repo: Repository, table: str, columns: Sequence[str], since: Optional[str] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+    where = [('created_at', 'gt', since)] if since else []
+    after = None
+    while True:
+        rows = await repo.select(table, ",".join(columns), where=where, order=EXPORT_ORDER,
+                                 limit=chunk_size, after=after)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = [rows[-1][column] for column, _ in EXPORT_ORDER]
+
+
+def encode_ndjson(rows: List[Dict[str, Any]], columns: Sequence[str]) -> bytes:
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def encode_csv(rows: List[Dict[str, Any]], columns: Sequence[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore").writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def csv_header(columns: Sequence[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue().encode()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+async def stream_export(repo: Repository, table: str, columns: Sequence[str], fmt: str,
+                        since: Optional[str] = None, compress: bool = False,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yields the export one database chunk at a time, so memory stays at one chunk."""
+    encode = ENCODERS[fmt]
+    # wbits=31 writes a gzip container so the output can be saved as .gz as-is.
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    async for block in _blocks(repo, table, columns, fmt, encode, since, chunk_size):
+        if gzip:
+            block = gzip.compress(block)
+        if block:
+            yield block
+    if gzip:
+        yield gzip.flush()
+
+
+async def _blocks(repo, table, columns, fmt, encode, since, chunk_size):
+    if fmt == "csv":
+        yield csv_header(columns)
+    async for rows in iter_chunks(repo, table, columns, since, chunk_size):
+        yield encode(rows, columns)
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache import TTLCache
+
+
+class IdempotencyKeyReused(Exception):
+    """The Idempotency-Key was already used for a request with a different body."""
+
+
+def fingerprint(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def content_key(scope: str, email: str, subject: str, *rest: Any) -> str:
+    return fingerprint(scope, email.strip().lower(), subject.strip().lower(), *rest)
+
+
+class Deduplicator:
+    """Folds repeated submissions into the first one.
+
+    A request is a repeat if it carries an Idempotency-Key seen in the last
+    key_ttl seconds, or, when it has no key, if the same content key (email,
+    subject and whatever else tells two submissions apart, such as a booked
+    slot) was submitted to the same endpoint in the last content_window
+    seconds. Repeats get the original response body and never reach the
+    database or the outbox. A repeat that arrives while the original is still
+    running waits for it. A create that raises is not remembered.
+    """
+
+    def __init__(self, key_ttl: float = 86400, content_window: float = 300, max_entries: int = 10000):
+        self.keys: TTLCache = TTLCache(max_entries, key_ttl)
+        self.contents: TTLCache = TTLCache(max_entries, content_window)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.key_hits = 0
+        self.content_hits = 0
+        self.inflight_hits = 0
+        self.key_conflicts = 0
+
+    async def run(self, scope: str, idempotency_key: Optional[str], body: Dict[str, Any], content: str,
+                  create: Callable[[], Awaitable[Any]]) -> Any:
+        request_hash = fingerprint(scope, body)
+        slot = f"key:{scope}:{idempotency_key}" if idempotency_key else f"content:{content}"
+
+        if idempotency_key:
+            seen = self.keys.get(slot)
+            if seen is not None:
+                if seen[0] != request_hash:
+                    self.key_conflicts += 1
+                    raise IdempotencyKeyReused()
+                self.key_hits += 1
+                return seen[1]
+        else:
+            cached = self.contents.get(content)
+            if cached is not None:
+                self.content_hits += 1
+                return cached
+
+        pending = self._inflight.get(slot)
+        if pending is not None:
+            self.inflight_hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[slot] = future
+        try:
+            result = await create()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the same error; nobody else retrieves it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if idempotency_key:
+                self.keys.set(slot, (request_hash, result))
+            self.contents.set(content, result)
+            return result
+        finally:
+            del self._inflight[slot]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "collapsed_by_key": self.key_hits,
+            "collapsed_by_content": self.content_hits,
+            "collapsed_in_flight": self.inflight_hits,
+            "key_conflicts": self.key_conflicts,
+            "tracked_keys": len(self.keys),
+            "tracked_contents": len(self.contents),
+        }
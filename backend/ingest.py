@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List
+
+from repository import Repository
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class EventIngestor:
+    """Accepts events immediately and writes them as bulk inserts.
+
+    A batch is flushed when batch_size events are waiting or flush_interval
+    seconds after the first event of the batch arrived, whichever comes first.
+    At most max_pending events are held in memory; once that is reached submit()
+    waits up to put_timeout for room and then raises IngestQueueFull.
+    """
+
+    def __init__(self, repo: Repository, table: str = 'visitor_events', batch_size: int = 500,
+                 flush_interval: float = 1.0, max_pending: int = 10000, put_timeout: float = 0.05):
+        self.repo = repo
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        # Called with each batch after it has been written.
+        self.listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._batch_ready = asyncio.Event()
+        self._task = None
+        self._flushing = None
+        self._held: List[Dict[str, Any]] = []
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+    async def submit(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise IngestQueueFull()
+        self.accepted += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+        held, self._held = self._held, []
+        await self._flush(held + self._drain(self.batch_size - len(held)))
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            self._held = [await self._queue.get()]
+            if self._queue.qsize() < self.batch_size - 1:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+            # Shielded so that stop() never cancels a batch halfway through its insert.
+            batch, self._held = self._held + self._drain(self.batch_size - 1), []
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            await self.repo.insert(self.table, batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logging.error(f"Error flushing {len(batch)} {self.table} rows: {e}")
+            return
+        self.flushed += len(batch)
+        self.batches += 1
+        for listener in self.listeners:
+            listener(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
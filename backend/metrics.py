@@ -0,0 +1,435 @@
+import asyncio
+import functools
+import inspect
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+
+from repository import Repository
+
+# Upper bounds in seconds, from a fast cache hit to a stuck upstream.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Where a request's time went. handler excludes database time; serialization is
+# request parsing and validation plus response validation and encoding; other
+# is middleware and sending the response.
+PHASES = ("db", "handler", "serialization", "other")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed buckets, one series per label tuple."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def sum(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            pairs = list(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Counter = Counter()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(zip(self.labels, labels))} {value}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + text + "}" if text else ""
+
+
+class RequestTimer:
+    """Per-request time accounting, reachable from anywhere in the request via current_timer."""
+
+    __slots__ = ("route", "route_seconds", "handler_seconds", "db_seconds")
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.route_seconds = 0.0
+        self.handler_seconds = 0.0
+        # Summed over calls, so concurrent queries within one request can add up to more than wall time.
+        self.db_seconds = 0.0
+
+
+current_timer: ContextVar[Optional[RequestTimer]] = ContextVar("current_timer", default=None)
+
+
+class Metrics:
+    """Registry behind GET /api/metrics.
+
+    Request latency is recorded per method, route template and status, and
+    split into PHASES. Gauges are read from callbacks at scrape time, so
+    components only need to keep the counters they already have.
+    """
+
+    def __init__(self):
+        self.requests = Histogram("http_request_duration_seconds", "Request latency by route.",
+                                  ("method", "route", "status"))
+        self.phases = Histogram("http_request_phase_seconds", "Request latency by route and phase.",
+                                ("route", "phase"))
+        self.db = Histogram("db_query_seconds", "Data layer call latency, including background work.",
+                            ("table", "operation"))
+        self.db_errors = CounterMetric("db_query_errors_total", "Data layer calls that raised.",
+                                       ("table", "operation"))
+        self.email = Histogram("email_send_seconds", "Outbound email send latency.", ("kind", "outcome"))
+        self.loop_lag = Histogram("event_loop_lag_seconds", "How late the event loop ran a timer.")
+        self.slow_profiles = CounterMetric("slow_request_profiles_total", "Stack profiles written for slow requests.",
+                                           ("route",))
+        self.in_flight = 0
+        self.max_loop_lag = 0.0
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self._gauges.append((name, help, read))
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, timer: RequestTimer) -> None:
+        self.requests.observe(seconds, method, route, str(status))
+        handler = max(timer.handler_seconds - timer.db_seconds, 0.0)
+        serialization = max(timer.route_seconds - timer.handler_seconds, 0.0)
+        other = max(seconds - timer.route_seconds, 0.0)
+        for phase, value in zip(PHASES, (timer.db_seconds, handler, serialization, other)):
+            self.phases.observe(value, route, phase)
+
+    def record_email(self, kind: str, seconds: float, error: Optional[Exception]) -> None:
+        self.email.observe(seconds, kind, "error" if error else "sent")
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP event_loop_lag_max_seconds Largest event loop lag seen since start.",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.max_loop_lag:.6f}",
+        ]
+        for name, help, read in self._gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {read()}"]
+        for metric in (self.requests, self.phases, self.db, self.db_errors, self.email, self.loop_lag,
+                       self.slow_profiles):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class TimedRepository(Repository):
+    """Wraps a repository and records the latency of every call.
+
+    Time spent inside a request is also added to that request's db phase.
+    """
+
+    def __init__(self, inner: Repository, metrics: Metrics):
+        self.inner = inner
+        self.metrics = metrics
+
+    async def _timed(self, operation: str, table: str, call):
+        started = time.perf_counter()
+        try:
+            return await call
+        except Exception:
+            self.metrics.db_errors.inc(table, operation)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.db.observe(elapsed, table, operation)
+            timer = current_timer.get()
+            if timer is not None:
+                timer.db_seconds += elapsed
+
+    async def insert(self, table, rows):
+        return await self._timed("insert", table, self.inner.insert(table, rows))
+
+    async def upsert(self, table, rows, on_conflict="id"):
+        return await self._timed("upsert", table, self.inner.upsert(table, rows, on_conflict))
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        return await self._timed("select", table, self.inner.select(table, columns, where, order, limit, after))
+
+    async def update(self, table, values, where):
+        return await self._timed("update", table, self.inner.update(table, values, where))
+
+    async def delete(self, table, where):
+        return await self._timed("delete", table, self.inner.delete(table, where))
+
+    async def count(self, table, where=()):
+        return await self._timed("count", table, self.inner.count(table, where))
+
+    async def warm(self, connections=1):
+        await self.inner.warm(connections)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def _timed_endpoint(endpoint):
+    # include_router() builds every route a second time from the already wrapped endpoint.
+    if getattr(endpoint, "__timed__", False):
+        return endpoint
+    # functools.wraps keeps the signature FastAPI reads parameters from.
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            timer = current_timer.get()
+            started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if timer is not None:
+                    timer.handler_seconds += time.perf_counter() - started
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            timer = current_timer.get()
+            started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if timer is not None:
+                    timer.handler_seconds += time.perf_counter() - started
+    timed.__timed__ = True
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """Route class that tells the metrics middleware which route ran and how long its handler took."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def timed_handler(request):
+            timer = current_timer.get()
+            if timer is None:
+                return await handler(request)
+            timer.route = route
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                timer.route_seconds += time.perf_counter() - started
+
+        return timed_handler
+
+
+class SlowRequestProfiler:
+    """Samples the event loop thread's stack while requests run, and keeps the samples of slow ones.
+
+    A sampler thread looks at the loop thread every interval seconds and, if a
+    request's coroutine is on the stack, counts the stack for that request.
+    Requests slower than threshold seconds get their samples written to
+    directory as folded stacks ("frame;frame;frame count" per line), ready for
+    flamegraph.pl or speedscope. Only time the request spent on the CPU shows
+    up; time awaiting the database is in the db phase instead.
+    """
+
+    def __init__(self, threshold: float, directory: str, interval: float = 0.005, keep: int = 100):
+        self.threshold = threshold
+        self.directory = Path(directory)
+        self.interval = interval
+        self.keep = keep
+        self.written = 0
+        self._active: Dict[Any, Counter] = {}
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._sampler is None:
+            self._thread_id = threading.get_ident()
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, name="slow-request-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def begin(self, frame) -> None:
+        self._active[frame] = Counter()
+
+    def end(self, frame, method: str, route: str, seconds: float) -> Optional[Path]:
+        samples = self._active.pop(frame, None)
+        if not samples or seconds < self.threshold:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = self.directory / f"{stamp}-{method}-{slug}-{seconds * 1000:.0f}ms.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+        self.written += 1
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("*.folded"))
+        for old in files[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self._active:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                samples = self._active.get(frame)
+                if samples is not None:
+                    samples[";".join(reversed(stack))] += 1
+                    break
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts those in flight.
+
+    Requests that never reached a route (404s, or shed by the rate limiter)
+    are labelled by the first route whose path matches, or "unmatched".
+    """
+
+    def __init__(self, app, metrics: Metrics, routes=(), exclude: Sequence[str] = (),
+                 profiler: Optional[SlowRequestProfiler] = None):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+        self.exclude = frozenset(exclude)
+        self.profiler = profiler
+
+    def _route(self, scope) -> str:
+        for route in self.routes:
+            if isinstance(route, APIRoute) and route.path_regex.match(scope["path"]):
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            return await self.app(scope, receive, send)
+        timer = RequestTimer()
+        token = current_timer.set(timer)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        frame = sys._getframe()
+        if self.profiler:
+            self.profiler.begin(frame)
+        self.metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.in_flight -= 1
+            current_timer.reset(token)
+            route = timer.route or self._route(scope)
+            self.metrics.record_request(scope["method"], route, status, elapsed, timer)
+            if self.profiler and self.profiler.end(frame, scope["method"], route, elapsed):
+                self.metrics.slow_profiles.inc(route)
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires; a blocked event loop delays every request by as much."""
+
+    def __init__(self, metrics: Metrics, interval: float = 0.5):
+        self.metrics = metrics
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self.metrics.loop_lag.observe(lag)
+            self.metrics.max_loop_lag = max(self.metrics.max_loop_lag, lag)
+
+
+def create_profiler() -> Optional[SlowRequestProfiler]:
+    threshold = os.environ.get('METRICS_PROFILE_SLOW_MS', '')
+    if not threshold:
+        return None
+    return SlowRequestProfiler(
+        float(threshold) / 1000,
+        os.environ.get('METRICS_PROFILE_DIR', 'profiles'),
+        interval=float(os.environ.get('METRICS_PROFILE_INTERVAL_MS', '5')) / 1000,
+        keep=int(os.environ.get('METRICS_PROFILE_KEEP', '100')),
+    )
@@ -0,0 +1,209 @@
+"""Versioned schema changes on top of the tables in SETUP.md.
+
+    python backend/migrations.py status                    # applied and pending versions, via DB_BACKEND
+    python backend/migrations.py sql                       # pending changes as one script for the Supabase SQL editor
+    python backend/migrations.py apply --sqlite FILE       # apply pending changes to a SQLite database
+
+Each migration has a Postgres form, run by pasting the generated script into
+Supabase (PostgREST cannot run DDL), and a SQLite form, which
+SQLiteRepository applies when it opens a database. Applied versions are
+recorded in schema_migrations, so either form runs once per database.
+"""
+import argparse
+import asyncio
+import logging
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple, Union
+
+MIGRATIONS_TABLE = 'schema_migrations'
+MIGRATIONS_COLUMNS = {"version": "INTEGER PRIMARY KEY", "name": "TEXT NOT NULL", "applied_at": "TEXT"}
+
+# Columns written by Python as ISO strings that the first Supabase DDL declared
+# as TIMESTAMP (no time zone). chat_unanswered, visitor_rollups and tutor_slots
+# were created as TIMESTAMPTZ.
+TIMESTAMP_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'demo_bookings': ('created_at',),
+    'subject_queries': ('created_at',),
+    'contact_messages': ('created_at',),
+    'visitor_events': ('timestamp',),
+    'email_outbox': ('created_at', 'updated_at'),
+}
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    postgres: Tuple[str, ...]
+    # Statements, or a function given the connection inside the migration's transaction.
+    sqlite: Union[Tuple[str, ...], Callable[[sqlite3.Connection], None]]
+
+
+def utc_isoformat(value):
+    """The form Python writes (datetime.isoformat in UTC), so text order is time order."""
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def normalize_sqlite_timestamps(db: sqlite3.Connection) -> None:
+    # SQLite has no timestamp type; pagination and range filters compare the
+    # text, which only matches time order while every value is UTC "+00:00".
+    db.create_function("utc_isoformat", 1, utc_isoformat, deterministic=True)
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            db.execute(f'UPDATE "{table}" SET "{column}" = utc_isoformat("{column}") '
+                       f'WHERE "{column}" NOT LIKE \'____-__-__T__:__:__%+00:00\'')
+
+
+def postgres_timestamps() -> Tuple[str, ...]:
+    return tuple(
+        f"ALTER TABLE {table} " + ", ".join(
+            f"ALTER COLUMN {column} TYPE TIMESTAMPTZ USING {column} AT TIME ZONE 'UTC'" for column in columns)
+        for table, columns in TIMESTAMP_COLUMNS.items()
+    )
+
+
+# Access paths of the list routes (newest first, id as tie-breaker), the admin
+# counters and the email outbox. Valid in both Postgres and SQLite. Pending
+# bookings are a range of the status index, so they need no partial index of
+# their own; pending emails are a sliver of the outbox and get one.
+PERFORMANCE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS demo_bookings_created_at_id ON demo_bookings (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS subject_queries_created_at_id ON subject_queries (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS contact_messages_created_at_id ON contact_messages (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS demo_bookings_status_created_at_id ON demo_bookings (status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS visitor_events_event_type_timestamp ON visitor_events (event_type, timestamp)",
+    "CREATE INDEX IF NOT EXISTS email_outbox_pending ON email_outbox (created_at) WHERE status = 'pending'",
+)
+
+MIGRATIONS: List[Migration] = [
+    # Rewrites the tables once, before the indexes below are built on the new types.
+    Migration(1, "timestamptz", postgres_timestamps(), normalize_sqlite_timestamps),
+    Migration(2, "performance_indexes", PERFORMANCE_INDEXES, PERFORMANCE_INDEXES),
+]
+
+
+def pending(applied: Iterable[int], migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    done = set(applied)
+    return [migration for migration in migrations if migration.version not in done]
+
+
+def migrate_sqlite(db: sqlite3.Connection, migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    """Applies the pending migrations, each in its own transaction; returns the ones applied.
+
+    The connection must be in autocommit mode (isolation_level=None), as
+    SQLiteRepository's is.
+    """
+    body = ", ".join(f'"{name}" {kind}' for name, kind in MIGRATIONS_COLUMNS.items())
+    db.execute(f'CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" ({body})')
+    applied = [row[0] for row in db.execute(f'SELECT version FROM "{MIGRATIONS_TABLE}"')]
+    done = []
+    for migration in pending(applied, migrations):
+        db.execute("BEGIN IMMEDIATE")
+        # Another process may have applied it between the read above and taking the write lock.
+        if db.execute(f'SELECT 1 FROM "{MIGRATIONS_TABLE}" WHERE version = ?', (migration.version,)).fetchone():
+            db.execute("ROLLBACK")
+            continue
+        try:
+            if callable(migration.sqlite):
+                migration.sqlite(db)
+            else:
+                for statement in migration.sqlite:
+                    db.execute(statement)
+            db.execute(f'INSERT INTO "{MIGRATIONS_TABLE}" (version, name, applied_at) VALUES (?, ?, ?)',
+                       (migration.version, migration.name, datetime.now(timezone.utc).isoformat()))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        logging.info(f"Applied migration {migration.version} {migration.name}")
+        done.append(migration)
+    return done
+
+
+def postgres_script(applied: Iterable[int] = (), migrations: Sequence[Migration] = MIGRATIONS) -> str:
+    """One transaction with every pending migration and its schema_migrations row."""
+    lines = ["BEGIN;", f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (version INTEGER PRIMARY KEY, "
+                       "name TEXT NOT NULL, applied_at TIMESTAMPTZ DEFAULT NOW());"]
+    for migration in pending(applied, migrations):
+        lines.append(f"\n-- {migration.version}: {migration.name}")
+        lines.extend(f"{statement};" for statement in migration.postgres)
+        lines.append(f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES ({migration.version}, "
+                     f"'{migration.name}') ON CONFLICT (version) DO NOTHING;")
+    lines.append("COMMIT;")
+    return "\n".join(lines) + "\n"
+
+
+async def applied_versions(repo) -> List[int]:
+    rows = await repo.select(MIGRATIONS_TABLE, 'version', order=[('version', False)])
+    return [row["version"] for row in rows]
+
+
+async def schema_status(repo) -> Dict[str, List[int]]:
+    applied = await applied_versions(repo)
+    return {"applied": applied, "pending": [migration.version for migration in pending(applied)]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("status", "sql", "apply"))
+    parser.add_argument("--sqlite", help="SQLite database file; defaults to DB_BACKEND for status and sql")
+    parser.add_argument("--all", action="store_true", help="sql: include migrations already applied")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "apply":
+        if not args.sqlite:
+            parser.error("apply needs --sqlite; for Supabase, run the output of `sql` in the SQL editor")
+        from sqlite_repository import SQLiteRepository
+        # Opening the database creates missing tables and applies what is pending.
+        asyncio.run(SQLiteRepository(args.sqlite).aclose())
+        return 0
+
+    applied: List[int] = []
+    if args.sqlite:
+        db = sqlite3.connect(args.sqlite, isolation_level=None)
+        try:
+            applied = [row[0] for row in db.execute(f'SELECT version FROM "{MIGRATIONS_TABLE}"')]
+        except sqlite3.OperationalError:
+            applied = []
+        finally:
+            db.close()
+    elif not args.all:
+        applied = asyncio.run(read_applied())
+    if args.command == "sql":
+        sys.stdout.write(postgres_script(() if args.all else applied))
+    else:
+        for migration in MIGRATIONS:
+            state = "applied" if migration.version in applied else "pending"
+            print(f"{migration.version:4d}  {migration.name:24s} {state}")
+    return 0
+
+
+async def read_applied() -> List[int]:
+    from dotenv import load_dotenv
+    from repository import create_repository
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    repo = create_repository()
+    try:
+        return await applied_versions(repo)
+    except Exception as e:
+        # Before the first script runs there is no schema_migrations table to read.
+        logging.warning(f"Could not read {MIGRATIONS_TABLE}, assuming nothing is applied: {e}")
+        return []
+    finally:
+        await repo.aclose()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
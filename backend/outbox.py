@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from breaker import is_outage
+from emails import Notifications
+from repository import Repository
+
+
+class SendError(Exception):
+    pass
+
+
+class PermanentSendError(SendError):
+    """The provider rejected the message itself; retrying will not help."""
+
+
+class ResendSender:
+    """Posts to the Resend HTTP API. base_url can point at a local fake server."""
+
+    def __init__(self, api_key: str, base_url: str = 'https://api.resend.com', timeout: float = 10.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.transport = transport
+        # Created on first use: building the TLS context is a noticeable part of importing the app.
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key) and self.api_key != 're_YOUR_API_KEY_HERE'
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def warm(self) -> None:
+        """Opens the connection to Resend so the first email does not pay for the TLS handshake."""
+        if self.configured:
+            await self.client.head("/")
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        try:
+            response = await self.client.post("/emails", json=message)
+        except httpx.HTTPError as e:
+            raise SendError(str(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise SendError(f"Resend answered {response.status_code}")
+        if response.status_code >= 400:
+            raise PermanentSendError(f"Resend answered {response.status_code}: {response.text[:200]}")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class Outbox:
+    """Durable notification queue.
+
+    Each job stores the fields of the row it belongs to and is written to the
+    outbox table next to that row, then handed to a fixed pool of workers which
+    render and send it. Sends go through a token bucket; failures are retried
+    with exponential backoff and jitter until max_attempts, after which the job
+    is marked dead.
+
+    Several processes may share the table, so a row is only sent by the
+    outbox that claimed it: enqueue() writes it as 'sending', and start()
+    takes 'pending' rows by switching them to 'sending' in one update, which
+    the database lets only one caller win. Claims are renewed every
+    claim_timeout / 3 seconds; a 'sending' row not renewed for claim_timeout
+    seconds belonged to a process that died and is claimed again by the
+    next sweep. On stop, jobs not sent yet are released back to 'pending'.
+
+    If the database is down when a job is enqueued and spool is set, the row
+    is handed to it as 'pending' instead of being sent from memory, so the
+    email goes out once the spool is replayed and a sweep claims it.
+
+    When digest_threshold jobs or more are queued, a worker folds up to
+    digest_max of them into one digest email instead of sending each one.
+    """
+
+    def __init__(self, repo: Repository, sender: ResendSender, renderer: Notifications,
+                 table: str = 'email_outbox', workers: int = 4, rate: float = 2.0, burst: float = 2.0,
+                 max_attempts: int = 6, retry_base: float = 2.0, retry_max: float = 300.0,
+                 digest_threshold: int = 0, digest_max: int = 25, claim_timeout: float = 300.0):
+        self.repo = repo
+        self.sender = sender
+        self.renderer = renderer
+        self.digest_threshold = digest_threshold
+        self.digest_max = digest_max
+        self.table = table
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.claim_timeout = claim_timeout
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._retry_handles: Dict[str, asyncio.TimerHandle] = {}
+        # Jobs claimed by this outbox and not yet sent or dead.
+        self._held: Dict[str, Job] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self.in_flight = 0
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.digests = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        # Called after every send attempt with the kind ("digest" for digests), its duration and the error if any.
+        self.listeners: List[Callable[[str, float, Optional[Exception]], None]] = []
+        # Takes (table, row) for rows the database would not take during an outage, e.g. Spool.append.
+        self.spool: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], lead_spooled: bool = False) -> Optional[Job]:
+        """Stores and queues a job; lead_spooled skips the database, which just failed the lead itself."""
+        if not self.sender.configured:
+            logging.warning("Resend API key not configured, skipping email")
+            return None
+        job = Job(id=str(uuid.uuid4()), kind=kind, payload=payload)
+        now = datetime.now(timezone.utc).isoformat()
+        row = {"id": job.id, "kind": kind, "payload": payload, "status": "sending",
+               "attempts": 0, "last_error": "", "created_at": now, "updated_at": now}
+        error: Optional[Exception] = None
+        if not (lead_spooled and self.spool is not None):
+            try:
+                await self.repo.insert(self.table, row)
+                return self._hold(job)
+            except Exception as e:
+                error = e
+        if self.spool is not None and (error is None or is_outage(error)):
+            try:
+                await self.spool(self.table, {**row, "status": "pending"})
+                return job
+            except Exception as e:
+                error = e
+        # Still send it; it just won't survive a restart.
+        logging.error(f"Error persisting {kind} email job: {error}")
+        return self._hold(job)
+
+    def _hold(self, job: Job) -> Job:
+        self._held[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    async def _claim(self) -> List[Job]:
+        """Takes pending rows and rows whose claim expired, queueing them in creation order."""
+        now = datetime.now(timezone.utc)
+        claimed = {"status": "sending", "updated_at": now.isoformat()}
+        expired = (now - timedelta(seconds=self.claim_timeout)).isoformat()
+        rows = await self.repo.update(self.table, claimed, [('status', 'eq', 'pending')])
+        rows += await self.repo.update(self.table, claimed, [('status', 'eq', 'sending'), ('updated_at', 'lt', expired)])
+        rows.sort(key=lambda row: str(row["created_at"]))
+        jobs = []
+        for row in rows:
+            jobs.append(self._hold(Job(id=row["id"], kind=row["kind"], payload=row["payload"],
+                                       attempts=row.get("attempts") or 0)))
+        return jobs
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.claim_timeout / 3)
+            try:
+                if self._held:
+                    await self.repo.update(self.table, {"updated_at": datetime.now(timezone.utc).isoformat()},
+                                           [('id', 'in', list(self._held)), ('status', 'eq', 'sending')])
+                jobs = await self._claim()
+                if jobs:
+                    logging.info(f"Claimed {len(jobs)} email jobs released or abandoned by another worker")
+            except Exception as e:
+                logging.error(f"Error renewing email job claims: {e}")
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        try:
+            jobs = await self._claim()
+        except Exception as e:
+            logging.error(f"Error loading pending email jobs: {e}")
+            jobs = []
+        if jobs:
+            logging.info(f"Resumed {len(jobs)} pending email jobs")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Stopping with {self._queue.qsize()} email jobs queued; they are released for the next worker")
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._tasks + [self._sweeper]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, self._sweeper, return_exceptions=True)
+        self._tasks, self._sweeper = [], None
+        if self._held:
+            # Handed back so the next worker to start or sweep sends them.
+            try:
+                await self.repo.update(self.table, {"status": "pending"},
+                                       [('id', 'in', list(self._held)), ('status', 'eq', 'sending')])
+            except Exception as e:
+                logging.error(f"Error releasing {len(self._held)} email jobs: {e}")
+            self._held.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            jobs = [await self._queue.get()]
+            try:
+                await self.bucket.acquire()
+                if self.digest_threshold and self._queue.qsize() + 1 >= self.digest_threshold:
+                    while len(jobs) < self.digest_max and not self._queue.empty():
+                        jobs.append(self._queue.get_nowait())
+                self.in_flight += len(jobs)
+                await self._deliver(jobs)
+            finally:
+                self.in_flight -= len(jobs)
+                for _ in jobs:
+                    self._queue.task_done()
+
+    async def _deliver(self, jobs: List[Job]) -> None:
+        for job in jobs:
+            job.attempts += 1
+        kind = jobs[0].kind if len(jobs) == 1 else "digest"
+        started = time.perf_counter()
+        try:
+            if len(jobs) == 1:
+                message = self.renderer.render(jobs[0].kind, jobs[0].payload)
+            else:
+                message = self.renderer.render_digest([(job.kind, job.payload) for job in jobs])
+            await self.sender.send(message)
+        except Exception as e:
+            self._notify(kind, time.perf_counter() - started, e)
+            permanent = not isinstance(e, SendError) or isinstance(e, PermanentSendError)
+            for job in jobs:
+                if permanent or job.attempts >= self.max_attempts:
+                    await self._mark_dead(job, str(e))
+                else:
+                    await self._schedule_retry(job, str(e))
+            return
+        self._notify(kind, time.perf_counter() - started, None)
+        now = time.monotonic()
+        for job in jobs:
+            latency = now - job.enqueued
+            self.sent += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+        if len(jobs) == 1:
+            await self._mark(jobs[0], "sent")
+            return
+        self.digests += 1
+        for job in jobs:
+            self._held.pop(job.id, None)
+        try:
+            await self.repo.update(self.table, {"status": "sent", "updated_at": datetime.now(timezone.utc).isoformat()},
+                                   [('id', 'in', [job.id for job in jobs])])
+        except Exception as e:
+            logging.error(f"Error updating {len(jobs)} digested email jobs: {e}")
+
+    def _notify(self, kind: str, seconds: float, error: Optional[Exception]) -> None:
+        for listener in self.listeners:
+            listener(kind, seconds, error)
+
+    async def _schedule_retry(self, job: Job, error: str) -> None:
+        delay = min(self.retry_max, self.retry_base * 2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+        self.retried += 1
+        logging.warning(f"Email job {job.id} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {error}")
+        await self._mark(job, "sending", error)
+        loop = asyncio.get_running_loop()
+        self._retry_handles[job.id] = loop.call_later(delay, self._requeue, job)
+
+    def _requeue(self, job: Job) -> None:
+        self._retry_handles.pop(job.id, None)
+        self._queue.put_nowait(job)
+
+    async def _mark_dead(self, job: Job, error: str) -> None:
+        self.dead += 1
+        logging.error(f"Email job {job.id} moved to dead letters after {job.attempts} attempts: {error}")
+        self.dead_letters.append({"id": job.id, "kind": job.kind, "attempts": job.attempts, "error": error})
+        await self._mark(job, "dead", error)
+
+    async def _mark(self, job: Job, status: str, error: str = "") -> None:
+        if status != "sending":
+            self._held.pop(job.id, None)
+        try:
+            await self.repo.update(self.table, {
+                "status": status, "attempts": job.attempts, "last_error": error,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }, [('id', 'eq', job.id)])
+        except Exception as e:
+            logging.error(f"Error updating email job {job.id}: {e}")
+
+    async def retry_dead(self, job_id: str) -> bool:
+        rows = await self.repo.update(self.table, {"status": "sending", "attempts": 0, "last_error": "",
+                                                   "updated_at": datetime.now(timezone.utc).isoformat()},
+                                      [('id', 'eq', job_id), ('status', 'eq', 'dead')])
+        if not rows:
+            return False
+        row = rows[0]
+        self.dead_letters = deque((d for d in self.dead_letters if d["id"] != job_id), maxlen=self.dead_letters.maxlen)
+        self._hold(Job(id=row["id"], kind=row["kind"], payload=row["payload"]))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "waiting_retry": len(self._retry_handles),
+            "claimed": len(self._held),
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "digests": self.digests,
+            "avg_latency_seconds": round(self._latency_total / self.sent, 3) if self.sent else None,
+            "max_latency_seconds": round(self._latency_max, 3),
+            "dead_letters": list(self.dead_letters),
+        }
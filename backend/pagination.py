@@ -0,0 +1,63 @@
+import base64
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from repository import Filter, Repository
+
+# Every list is ordered newest first; id breaks ties between equal timestamps.
+PAGE_ORDER = [('created_at', True), ('id', True)]
+CURSOR_COLUMNS = [column for column, _ in PAGE_ORDER]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row[column] for column in CURSOR_COLUMNS], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(CURSOR_COLUMNS):
+        raise InvalidPageRequest("Invalid cursor")
+    return values
+
+
+def projection(fields: Optional[str], allowed: Iterable[str]) -> str:
+    if not fields:
+        return "*"
+    allowed = set(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise InvalidPageRequest(f"Unknown fields: {', '.join(unknown)}")
+    # The cursor columns are always returned so the next page can be requested.
+    columns = CURSOR_COLUMNS + [f for f in requested if f not in CURSOR_COLUMNS]
+    return ",".join(columns)
+
+
+def date_range(column: str, created_after: Optional[str], created_before: Optional[str]) -> List[Filter]:
+    where: List[Filter] = []
+    if created_after:
+        where.append((column, 'gte', created_after))
+    if created_before:
+        where.append((column, 'lt', created_before))
+    return where
+
+
+async def fetch_page(repo: Repository, table: str, columns: str = "*", where: Sequence[Filter] = (),
+                     limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row tells us whether another page exists without a count query.
+    rows = await repo.select(table, columns, where=where, order=PAGE_ORDER, limit=limit + 1, after=after)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from cache import TTLCache
+
+SESSION_FIELD = re.compile(rb'"session_id"\s*:\s*"([^"\\]{1,128})"')
+# Bodies larger than this are not scanned for a session_id; validation rejects them anyway.
+MAX_PEEK_BYTES = 8192
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Token bucket: up to burst requests at once, refilling at rate per second."""
+    rate: float
+    burst: float
+
+    @classmethod
+    def parse(cls, spec: str) -> Optional['Limit']:
+        """Reads "count/seconds", e.g. "20/600" for 20 requests per 10 minutes; "off" means no limit."""
+        if spec.strip().lower() in ("", "off", "0"):
+            return None
+        count, _, seconds = spec.partition("/")
+        count, seconds = float(count), float(seconds or 1)
+        return cls(rate=count / seconds, burst=count)
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    per_ip: Optional[Limit]
+    per_session: Optional[Limit]
+
+
+# (key, limit) pairs checked together for one request.
+Checks = Sequence[Tuple[str, Limit]]
+
+
+def _refill(limit: Limit, tokens: Optional[float], updated: float, now: float) -> float:
+    if tokens is None:
+        return limit.burst
+    return min(limit.burst, tokens + (now - updated) * limit.rate)
+
+
+class MemoryBuckets:
+    """Per-process bucket store, split into shards of bounded LRU maps.
+
+    A bucket is forgotten once it would have refilled completely, so idle
+    clients cost nothing; under a flood of distinct keys the least recently
+    used buckets in a shard are evicted first, which at worst lets those
+    clients start over with a full bucket.
+    """
+
+    def __init__(self, max_keys: int = 100_000, shards: int = 16):
+        self.shards = [TTLCache(max(1, max_keys // shards), ttl=0) for _ in range(shards)]
+
+    def _shard(self, key: str) -> TTLCache:
+        return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+    def _take(self, checks: Checks, now: float) -> float:
+        states = []
+        wait = 0.0
+        for key, limit in checks:
+            shard = self._shard(key)
+            state = shard.get(key)
+            tokens = _refill(limit, *(state or (None, now)), now)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / limit.rate)
+            states.append((shard, key, limit, tokens))
+        if wait:
+            return wait
+        for shard, key, limit, tokens in states:
+            shard.set(key, (tokens - 1, now), ttl=(limit.burst - tokens + 1) / limit.rate)
+        return 0.0
+
+    async def take(self, checks: Checks) -> float:
+        return self._take(checks, time.monotonic())
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+
+class SQLiteBuckets:
+    """Bucket store in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path: str, sweep_every: int = 1000):
+        self.sweep_every = sweep_every
+        self._takes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL,"
+                         " expires REAL)")
+
+    def _take(self, checks: Checks) -> float:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                states = []
+                wait = 0.0
+                for key, limit in checks:
+                    row = self._db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                    tokens = _refill(limit, *(row or (None, now)), now)
+                    if tokens < 1:
+                        wait = max(wait, (1 - tokens) / limit.rate)
+                    states.append((key, limit, tokens))
+                if not wait:
+                    self._db.executemany("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", [
+                        (key, tokens - 1, now, now + (limit.burst - tokens + 1) / limit.rate)
+                        for key, limit, tokens in states
+                    ])
+                self._takes += 1
+                if self._takes % self.sweep_every == 0:
+                    # Expired buckets are full again; dropping them keeps the file small.
+                    self._db.execute("DELETE FROM buckets WHERE expires < ?", (now,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return wait
+
+    async def take(self, checks: Checks) -> float:
+        return await asyncio.to_thread(self._take, list(checks))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class RateLimiter:
+    """Decides, per request, whether the route's per-IP and per-session buckets allow it.
+
+    Requests are keyed by client IP and by visitor session, taken from
+    X-Session-Id or, failing that, from the "session_id" field of a small
+    JSON body (read once and replayed to the app).
+    """
+
+    def __init__(self, buckets, rules: Dict[Tuple[str, str], Rule], trust_proxy: bool = False):
+        self.buckets = buckets
+        self.rules = rules
+        self.trust_proxy = trust_proxy
+        self.allowed: Counter = Counter()
+        self.shed: Counter = Counter()
+        self.errors = 0
+
+    def client_ip(self, scope, headers: Dict[bytes, bytes]) -> str:
+        if self.trust_proxy:
+            forwarded = headers.get(b"x-forwarded-for")
+            if forwarded:
+                # The rightmost address was added by our own proxy and is the only one it vouches for.
+                return forwarded.decode("latin-1").rsplit(",", 1)[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def check(self, rule: Rule, scope, receive) -> Tuple[float, Any]:
+        """Seconds to wait (0 when allowed) and the receive callable the app should use."""
+        headers = dict(scope["headers"])
+        checks: List[Tuple[str, Limit]] = []
+        if rule.per_ip:
+            checks.append((f"{rule.name}:ip:{self.client_ip(scope, headers)}", rule.per_ip))
+        if rule.per_session:
+            session = headers.get(b"x-session-id")
+            if not session:
+                body, receive = await peek_body(receive)
+                match = SESSION_FIELD.search(body) if body else None
+                session = match.group(1) if match else None
+            if session:
+                checks.append((f"{rule.name}:session:{session.decode('latin-1')}", rule.per_session))
+        try:
+            wait = await self.buckets.take(checks) if checks else 0.0
+        except Exception:
+            # A broken shared store must not take the public forms down with it.
+            self.errors += 1
+            wait = 0.0
+        (self.shed if wait else self.allowed)[rule.name] += 1
+        return wait, receive
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "allowed": dict(self.allowed),
+            "shed": dict(self.shed),
+            "store_errors": self.errors,
+            "tracked_keys": len(self.buckets),
+        }
+
+
+async def peek_body(receive) -> Tuple[bytes, Any]:
+    messages, body = [], b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body") or len(body) > MAX_PEEK_BYTES:
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    return (body if len(body) <= MAX_PEEK_BYTES else b""), replay
+
+
+class RateLimitMiddleware:
+    """Answers 429 for over-limit requests to the limiter's routes.
+
+    Runs before routing, so a shed request costs a bucket lookup: no model
+    validation, no database call, no email.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        rule = self.limiter.rules.get((scope["method"], scope["path"])) if scope["type"] == "http" else None
+        if rule is None:
+            return await self.app(scope, receive, send)
+        wait, receive = await self.limiter.check(rule, scope, receive)
+        if not wait:
+            return await self.app(scope, receive, send)
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({"type": "http.response.start", "status": 429, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, int(wait + 0.999))).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
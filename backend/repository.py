@@ -0,0 +1,266 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+# A filter is (column, operator, value); operators follow PostgREST naming:
+# eq, neq, lt, lte, gt, gte, in, is.
+Filter = Tuple[str, str, Any]
+# An ordering is (column, descending).
+Order = Tuple[str, bool]
+# Keyset position: values of the order columns for the last row already seen.
+# select() then returns only rows that sort strictly after it.
+Keyset = Sequence[Any]
+Rows = Union[Dict[str, Any], List[Dict[str, Any]]]
+
+OPERATORS = ("eq", "neq", "lt", "lte", "gt", "gte", "in", "is")
+
+
+class RepositoryError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        # HTTP status of the failed call, when the backend speaks HTTP.
+        self.status_code = status_code
+
+
+class Repository:
+    """Async data access used by every route. Backends differ only in transport."""
+
+    async def insert(self, table: str, rows: Rows) -> None:
+        raise NotImplementedError
+
+    async def upsert(self, table: str, rows: Rows, on_conflict: str = "id") -> None:
+        """Inserts rows, overwriting any existing row with the same on_conflict key."""
+        raise NotImplementedError
+
+    async def select(self, table: str, columns: str = "*", where: Sequence[Filter] = (),
+                     order: Sequence[Order] = (), limit: Optional[int] = None,
+                     after: Optional[Keyset] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def update(self, table: str, values: Dict[str, Any], where: Sequence[Filter]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def delete(self, table: str, where: Sequence[Filter]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def count(self, table: str, where: Sequence[Filter] = ()) -> int:
+        raise NotImplementedError
+
+    async def warm(self, connections: int = 1) -> None:
+        """Opens connections ahead of the first request; a no-op for backends without a pool."""
+
+    async def aclose(self) -> None:
+        pass
+
+
+def check_operator(op: str) -> None:
+    if op not in OPERATORS:
+        raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def _escape(value: Any) -> str:
+    return _literal(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _quote(value: Any) -> str:
+    text = _literal(value)
+    if any(ch in text for ch in ',()" '):
+        return '"' + _escape(text) + '"'
+    return text
+
+
+def _literal(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def filter_params(where: Sequence[Filter]) -> List[Tuple[str, str]]:
+    params = []
+    for column, op, value in where:
+        check_operator(op)
+        if op == "in":
+            params.append((column, "in.(" + ",".join(_quote(v) for v in value) + ")"))
+        else:
+            params.append((column, f"{op}.{_literal(value)}"))
+    return params
+
+
+def keyset_param(order: Sequence[Order], after: Keyset) -> str:
+    # (a, b) after (x, y) in descending order: a < x OR (a = x AND b < y)
+    if len(after) != len(order):
+        raise ValueError("Keyset must have one value per order column")
+    branches = []
+    for i, (column, desc) in enumerate(order):
+        terms = [f'{c}.eq."{_escape(v)}"' for (c, _), v in zip(order[:i], after[:i])]
+        terms.append(f'{column}.{"lt" if desc else "gt"}."{_escape(after[i])}"')
+        branches.append(terms[0] if len(terms) == 1 else "and(" + ",".join(terms) + ")")
+    return "(" + ",".join(branches) + ")"
+
+
+def order_param(order: Sequence[Order]) -> str:
+    return ",".join(f"{column}.{'desc' if desc else 'asc'}" for column, desc in order)
+
+
+def parse_content_range(header: Optional[str]) -> int:
+    # PostgREST answers "0-24/3573" or "*/0".
+    if not header or "/" not in header:
+        return 0
+    total = header.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else 0
+
+
+class PostgrestRepository(Repository):
+    """Talks to Supabase's PostgREST endpoint over one pooled, keep-alive AsyncClient."""
+
+    def __init__(self, url: str, key: str, pool_size: int = 20, timeout: float = 10.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._pool_size = pool_size
+        self._client = httpx.AsyncClient(
+            base_url=url.rstrip("/") + "/rest/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}",
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                keepalive_expiry=30.0),
+            transport=transport,
+        )
+
+    async def _request(self, method: str, table: str, params=None, json=None,
+                       prefer: Optional[str] = None) -> httpx.Response:
+        headers = {"Prefer": prefer} if prefer else None
+        response = await self._client.request(method, f"/{table}", params=params, json=json, headers=headers)
+        if response.status_code >= 400:
+            raise RepositoryError(f"{method} {table} failed with {response.status_code}: {response.text[:200]}",
+                                  response.status_code)
+        return response
+
+    async def insert(self, table, rows):
+        await self._request("POST", table, json=rows, prefer="return=minimal")
+
+    async def upsert(self, table, rows, on_conflict="id"):
+        await self._request("POST", table, params=[("on_conflict", on_conflict)], json=rows,
+                            prefer="resolution=merge-duplicates,return=minimal")
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        params = [("select", columns)] + filter_params(where)
+        if after is not None:
+            params.append(("or", keyset_param(order, after)))
+        if order:
+            params.append(("order", order_param(order)))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        response = await self._request("GET", table, params=params)
+        return response.json()
+
+    async def update(self, table, values, where):
+        response = await self._request("PATCH", table, params=filter_params(where), json=values,
+                                       prefer="return=representation")
+        return response.json()
+
+    async def delete(self, table, where):
+        response = await self._request("DELETE", table, params=filter_params(where),
+                                       prefer="return=representation")
+        return response.json()
+
+    async def count(self, table, where=()):
+        params = [("select", "id")] + filter_params(where)
+        response = await self._request("HEAD", table, params=params, prefer="count=exact")
+        return parse_content_range(response.headers.get("content-range"))
+
+    async def warm(self, connections=1):
+        # Concurrent requests each take their own connection, which then stays in the keep-alive pool.
+        await asyncio.gather(*(self._request("HEAD", "demo_bookings", params=[("select", "id"), ("limit", "1")])
+                               for _ in range(min(connections, self._pool_size))))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class ThreadPoolRepository(Repository):
+    """Fallback that keeps the sync supabase client but runs it off the event loop."""
+
+    def __init__(self, url: str, key: str, max_workers: int = 8):
+        from supabase import create_client
+        self._client = create_client(url, key)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase")
+
+    async def _run(self, fn):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn)
+
+    @staticmethod
+    def _apply(query, where):
+        for column, op, value in where:
+            check_operator(op)
+            if op == "in":
+                query = query.in_(column, list(value))
+            elif op == "is":
+                query = query.is_(column, _literal(value))
+            else:
+                query = getattr(query, op)(column, value)
+        return query
+
+    async def insert(self, table, rows):
+        await self._run(lambda: self._client.table(table).insert(rows).execute())
+
+    async def upsert(self, table, rows, on_conflict="id"):
+        await self._run(lambda: self._client.table(table).upsert(rows, on_conflict=on_conflict).execute())
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        def run():
+            query = self._apply(self._client.table(table).select(columns), where)
+            if after is not None:
+                query = query.or_(keyset_param(order, after)[1:-1])
+            for column, desc in order:
+                query = query.order(column, desc=desc)
+            if limit is not None:
+                query = query.limit(limit)
+            return query.execute().data
+        return await self._run(run)
+
+    async def update(self, table, values, where):
+        return await self._run(lambda: self._apply(self._client.table(table).update(values), where).execute().data)
+
+    async def delete(self, table, where):
+        return await self._run(lambda: self._apply(self._client.table(table).delete(), where).execute().data)
+
+    async def count(self, table, where=()):
+        def run():
+            query = self._apply(self._client.table(table).select("id", count="exact"), where)
+            return query.execute().count or 0
+        return await self._run(run)
+
+    async def warm(self, connections=1):
+        await asyncio.gather(*(self.select('demo_bookings', 'id', limit=1)
+                               for _ in range(min(connections, self._executor._max_workers))))
+
+    async def aclose(self):
+        self._executor.shutdown(wait=False)
+
+
+def create_repository() -> Repository:
+    backend = os.environ.get('DB_BACKEND', 'async')
+    if backend == 'sqlite':
+        from sqlite_repository import SQLiteRepository
+        return SQLiteRepository(os.environ.get('SQLITE_PATH', 'tutorvia.sqlite3'))
+    url = os.environ['SUPABASE_URL']
+    key = os.environ['SUPABASE_ANON_KEY']
+    if backend == 'async':
+        return PostgrestRepository(
+            url, key,
+            pool_size=int(os.environ.get('DB_POOL_SIZE', '20')),
+            timeout=float(os.environ.get('DB_TIMEOUT', '10')),
+        )
+    if backend == 'threadpool':
+        return ThreadPoolRepository(url, key, max_workers=int(os.environ.get('DB_THREADPOOL_SIZE', '8')))
+    raise ValueError(f"Unknown DB_BACKEND: {backend}")
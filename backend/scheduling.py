@@ -0,0 +1,352 @@
+import asyncio
+import heapq
+import json
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from analytics import epoch, isoformat
+from export import iter_chunks
+from repository import Repository
+
+TUTORS_PATH = Path(__file__).parent / 'data' / 'tutors.json'
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+LOAD_ORDER = (('slot_start', False), ('id', False))
+
+
+class SlotUnavailable(Exception):
+    """The slot overlaps one that is already claimed, here or by another worker."""
+
+
+def subject_key(subject: str) -> str:
+    # "Computer Science" from the booking form and "computer-science" from the profiles are the same subject.
+    return "-".join(subject.lower().replace("-", " ").split())
+
+
+def minutes(clock: str) -> int:
+    hours, _, mins = clock.partition(":")
+    return int(hours) * 60 + int(mins or 0)
+
+
+@lru_cache(maxsize=65536)
+def local_windows(zone: ZoneInfo, ordinal: int, hours: Tuple[Tuple[int, int], ...]) -> Tuple[Tuple[int, int], ...]:
+    """Opening hours on one local day as epoch seconds; tutors in one zone mostly share them."""
+    day = date.fromordinal(ordinal)
+    midnight = datetime(day.year, day.month, day.day, tzinfo=zone)
+    # Wall-clock arithmetic: 9 AM stays 9 AM across a DST change.
+    return tuple((int((midnight + timedelta(minutes=open_)).timestamp()),
+                  int((midnight + timedelta(minutes=close)).timestamp())) for open_, close in hours)
+
+
+class Tutor:
+    """A tutor's weekly availability and the slots claimed from it.
+
+    Claims are kept as two parallel sorted arrays of start and end times
+    (epoch seconds), which the garbage collector never has to walk. They never overlap, so the ends are sorted too and the
+    only claim that can overlap [lo, hi) is the last one starting before hi:
+    one bisect answers the conflict check, whatever the number of claims.
+    """
+
+    __slots__ = ("slug", "name", "subjects", "zone", "weekly", "starts", "ends")
+
+    def __init__(self, profile: Dict[str, Any]):
+        self.slug: str = profile["slug"]
+        self.name: str = profile.get("name", self.slug)
+        self.subjects = [subject_key(s) for s in profile.get("subjects", ())]
+        self.zone = ZoneInfo(profile.get("timezone", "UTC"))
+        weekly = profile.get("weekly", {})
+        # Weekday -> [(open, close)] in minutes after local midnight.
+        self.weekly = [tuple(sorted((minutes(a), minutes(b)) for a, b in weekly.get(day, ()))) for day in WEEKDAYS]
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def windows(self, start: float, end: float) -> Iterator[Tuple[int, int]]:
+        """Availability windows overlapping [start, end) as epoch seconds, in order."""
+        first = datetime.fromtimestamp(start, self.zone).toordinal()
+        last = datetime.fromtimestamp(end, self.zone).toordinal()
+        for ordinal in range(first, last + 1):
+            # Day 1 of the proleptic calendar was a Monday.
+            hours = self.weekly[(ordinal - 1) % 7]
+            if hours:
+                for lo, hi in local_windows(self.zone, ordinal, hours):
+                    if hi > start and lo < end:
+                        yield lo, hi
+
+    def conflicts(self, lo: int, hi: int) -> bool:
+        j = bisect_left(self.starts, hi)
+        return j > 0 and self.ends[j - 1] > lo
+
+    def free(self, start: float, end: float, length: int) -> Iterator[int]:
+        """Starts of the free slots in [start, end), in order.
+
+        Slots are laid out every length seconds from the opening of each
+        window; a claim is skipped in one step to the first slot after it.
+        """
+        for lo, hi in self.windows(start, end):
+            t = lo if lo >= start else lo + -(-(int(start) - lo) // length) * length
+            while t + length <= hi and t < end:
+                j = bisect_left(self.starts, t + length)
+                if j and self.ends[j - 1] > t:
+                    t = lo + -(-(self.ends[j - 1] - lo) // length) * length
+                    continue
+                yield t
+                t += length
+
+    def offers(self, t: int, length: int) -> bool:
+        """Whether a slot of length seconds starting at t is on this tutor's grid."""
+        return any(lo <= t and t + length <= hi and (t - lo) % length == 0
+                   for lo, hi in self.windows(t, t + length))
+
+    def reserve(self, lo: int, hi: int) -> None:
+        if self.conflicts(lo, hi):
+            raise SlotUnavailable(f"{self.slug} is not free at {isoformat(lo)}")
+        j = bisect_left(self.starts, lo)
+        self.starts.insert(j, lo)
+        self.ends.insert(j, hi)
+
+    def release(self, lo: int) -> bool:
+        j = bisect_left(self.starts, lo)
+        if j < len(self.starts) and self.starts[j] == lo:
+            del self.starts[j], self.ends[j]
+            return True
+        return False
+
+    def profile(self) -> Dict[str, Any]:
+        return {
+            "slug": self.slug,
+            "name": self.name,
+            "subjects": self.subjects,
+            "timezone": self.zone.key,
+            "weekly": {day: [[f"{a // 60:02d}:{a % 60:02d}", f"{b // 60:02d}:{b % 60:02d}"] for a, b in hours]
+                       for day, hours in zip(WEEKDAYS, self.weekly) if hours},
+        }
+
+
+class Scheduler:
+    """Free slots per subject and conflict-checked slot claims.
+
+    Claims live in the tutor_slots table, whose id is the tutor and the slot
+    start: the database rejects a second claim of the same slot from any
+    worker. Each worker mirrors the upcoming claims in memory, reserves a
+    slot there before writing it (so two requests in one worker cannot both
+    reach the database), picks up other workers' claims every
+    refresh_interval and reloads everything every reload_interval, which is
+    when slots released elsewhere show up again. A stale mirror can only hide
+    a free slot, never hand out a taken one.
+    """
+
+    def __init__(self, repo: Optional[Repository], path: Path = TUTORS_PATH, slot_minutes: float = 60,
+                 min_notice: float = 12 * 3600, horizon_days: float = 90, refresh_interval: float = 30.0,
+                 reload_interval: float = 3600.0, table: str = 'tutor_slots'):
+        self.repo = repo
+        self.path = Path(path)
+        self.length = int(slot_minutes * 60)
+        self.min_notice = min_notice
+        self.horizon = horizon_days * 86400
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        self.table = table
+        self.tutors: Dict[str, Tutor] = {}
+        self.by_subject: Dict[str, List[Tutor]] = {}
+        self.loaded = False
+        self.claimed = 0
+        self.conflicts = 0
+        self.released = 0
+        self.last_load_seconds = 0.0
+        self._seen: Optional[str] = None
+        # Claims and releases made while load() reads the table, replayed onto what it read.
+        self._loading: Optional[List[Tuple[str, str, int]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.use_profiles(json.loads(self.path.read_text(encoding='utf-8')))
+
+    def use_profiles(self, profiles: Sequence[Dict[str, Any]]) -> None:
+        """Replaces the tutors; their claims come back with the next load()."""
+        self.tutors = {profile["slug"]: Tutor(profile) for profile in profiles}
+        self.by_subject = {}
+        for tutor in self.tutors.values():
+            for subject in tutor.subjects:
+                self.by_subject.setdefault(subject, []).append(tutor)
+
+    def bookable(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[float, float]:
+        now = time.time()
+        lo = max(start or now, now + self.min_notice)
+        hi = min(end or now + self.horizon, now + self.horizon)
+        return lo, hi
+
+    def free_slots(self, subject: Optional[str] = None, tutor: Optional[str] = None, start: Optional[float] = None,
+                   end: Optional[float] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """The next limit free slots in [start, end), earliest first, across the subject's tutors."""
+        if tutor is not None:
+            tutors = [self.tutors[tutor]] if tutor in self.tutors else []
+        elif subject:
+            tutors = self.by_subject.get(subject_key(subject), [])
+        else:
+            tutors = list(self.tutors.values())
+        if tutor is not None and subject:
+            tutors = [t for t in tutors if subject_key(subject) in t.subjects]
+        lo, hi = self.bookable(start, end)
+        merged = heapq.merge(*(zip(t.free(lo, hi, self.length), repeat(t.slug)) for t in tutors))
+        return [self.slot(self.tutors[slug], t) for t, slug in islice(merged, limit)]
+
+    def slot(self, tutor: Tutor, t: int) -> Dict[str, Any]:
+        return {"tutor": tutor.slug, "name": tutor.name, "start": isoformat(t), "end": isoformat(t + self.length)}
+
+    async def claim(self, tutor_slug: str, start: float, booking_id: str) -> Dict[str, Any]:
+        """Claims a slot for booking_id and returns the tutor_slots row.
+
+        Raises ValueError for a slot the tutor does not offer and
+        SlotUnavailable when it is taken.
+        """
+        tutor = self.tutors.get(tutor_slug)
+        if tutor is None:
+            raise ValueError(f"Unknown tutor: {tutor_slug}")
+        t = int(start)
+        lo, hi = self.bookable()
+        if t != start or not lo <= t < hi or not tutor.offers(t, self.length):
+            raise ValueError("Not a bookable slot")
+        try:
+            self._apply("reserve", tutor, t)
+        except SlotUnavailable:
+            self.conflicts += 1
+            raise
+        row = {"id": f"{tutor.slug}@{isoformat(t)}", "tutor": tutor.slug, "slot_start": isoformat(t),
+               "slot_end": isoformat(t + self.length), "booking_id": booking_id, "created_at": isoformat(time.time())}
+        try:
+            await self.repo.insert(self.table, row)
+        except Exception:
+            # Either another worker claimed the slot first, or the write failed or
+            # timed out, in which case it may still have landed. If this select
+            # fails as well, whether the row exists is unknown, so the slot stays
+            # reserved here until the next load() settles it from the table.
+            stored = await self.repo.select(self.table, 'booking_id', [('id', 'eq', row["id"])])
+            if not stored:
+                self._apply("release", tutor, t)
+                raise
+            if stored[0]["booking_id"] != booking_id:
+                self.conflicts += 1
+                raise SlotUnavailable(f"{tutor.slug} is not free at {row['slot_start']}")
+        self.claimed += 1
+        return row
+
+    async def cancel(self, booking_ids: Sequence[str]) -> int:
+        """Frees the slots claimed for these bookings."""
+        if not booking_ids:
+            return 0
+        rows = await self.repo.delete(self.table, [('booking_id', 'in', list(booking_ids))])
+        for row in rows:
+            tutor = self.tutors.get(row["tutor"])
+            if tutor is not None and self._apply("release", tutor, int(epoch(row["slot_start"]))):
+                self.released += 1
+        return len(rows)
+
+    def _apply(self, op: str, tutor: Tutor, t: int) -> bool:
+        if self._loading is not None:
+            self._loading.append((op, tutor.slug, t))
+        if op == "reserve":
+            tutor.reserve(t, t + self.length)
+            return True
+        return tutor.release(t)
+
+    def _reserve_row(self, tutors: Dict[str, Tutor], row: Dict[str, Any]) -> None:
+        tutor = tutors.get(row["tutor"])
+        if tutor is None:
+            return
+        lo, hi = int(epoch(row["slot_start"])), int(epoch(row["slot_end"]))
+        if not tutor.conflicts(lo, hi):
+            tutor.reserve(lo, hi)
+        if self._seen is None or row["created_at"] > self._seen:
+            self._seen = row["created_at"]
+
+    async def load(self, chunk_size: int = 1000) -> int:
+        """Reads the upcoming claims into fresh arrays, then swaps them in."""
+        started = time.perf_counter()
+        fresh = {slug: Tutor(tutor.profile()) for slug, tutor in self.tutors.items()}
+        where = [('slot_end', 'gt', isoformat(time.time()))]
+        count, after = 0, None
+        self._loading = []
+        try:
+            while True:
+                rows = await self.repo.select(self.table, 'id,tutor,slot_start,slot_end,created_at', where=where,
+                                              order=LOAD_ORDER, limit=chunk_size, after=after)
+                for row in rows:
+                    self._reserve_row(fresh, row)
+                count += len(rows)
+                if len(rows) < chunk_size:
+                    break
+                after = [rows[-1][column] for column, _ in LOAD_ORDER]
+            for op, slug, t in self._loading:
+                tutor = fresh.get(slug)
+                if tutor is None:
+                    continue
+                if op == "release":
+                    tutor.release(t)
+                elif not tutor.conflicts(t, t + self.length):
+                    tutor.reserve(t, t + self.length)
+        finally:
+            self._loading = None
+        for slug, tutor in fresh.items():
+            current = self.tutors.get(slug)
+            if current is not None:
+                current.starts, current.ends = tutor.starts, tutor.ends
+        self.loaded = True
+        self.last_load_seconds = time.perf_counter() - started
+        return count
+
+    async def refresh(self, overlap: float = 60.0) -> int:
+        """Adds claims other workers made since the newest one seen here."""
+        if self._seen is None:
+            return await self.load()
+        added = 0
+        since = isoformat(epoch(self._seen) - overlap)
+        async for rows in iter_chunks(self.repo, self.table, ('id', 'tutor', 'slot_start', 'slot_end', 'created_at'),
+                                      since=since):
+            for row in rows:
+                self._reserve_row(self.tutors, row)
+            added += len(rows)
+        return added
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loaded = None
+        while True:
+            try:
+                if loaded is None or time.monotonic() - loaded >= self.reload_interval:
+                    await self.load()
+                    loaded = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing tutor slots: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tutors": len(self.tutors),
+            "subjects": len(self.by_subject),
+            "slot_minutes": self.length // 60,
+            "upcoming_claims": sum(len(t.starts) for t in self.tutors.values()),
+            "loaded": self.loaded,
+            "claimed": self.claimed,
+            "conflicts": self.conflicts,
+            "released": self.released,
+            "last_load_seconds": round(self.last_load_seconds, 3),
+        }
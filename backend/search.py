@@ -0,0 +1,362 @@
+import asyncio
+import heapq
+import logging
+import re
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from analytics import epoch, isoformat
+from export import iter_chunks
+from repository import Repository
+
+WORD = re.compile(r"[a-z0-9]+")
+NON_DIGIT = re.compile(r"\D+")
+NONZERO = re.compile(rb"[^\x00]")
+# Prefix of the posting keys that only cover name, email and phone.
+CONTACT = "="
+# Lead tables and the column each one keeps its subject in.
+TABLES = {"demo_bookings": "subject_interest", "subject_queries": "subject", "contact_messages": None}
+# Score of a query word by where it was found; the message is only indexed,
+# so a word found nowhere else must have matched there.
+NAME_WEIGHT = 4
+PHONE_WEIGHT = 3
+SUBJECT_WEIGHT = 2
+MESSAGE_WEIGHT = 1
+# Added when the name or email starts with the word.
+PREFIX_BONUS = 1
+
+
+class Lead(NamedTuple):
+    table: str
+    id: str
+    name: str
+    email: str
+    phone: str
+    subject: str
+    created_at: str
+
+
+def words(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+def word_grams(word: str) -> Iterable[str]:
+    # The leading space makes " ab" mean "a word starting with ab", which is
+    # how one- and two-letter query words are matched.
+    padded = " " + word
+    return (padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def query_grams(word: str) -> Iterable[str]:
+    if len(word) < 3:
+        return (" " + word,)
+    return (word[i:i + 3] for i in range(len(word) - 2))
+
+
+def columns(table: str) -> List[str]:
+    subject = TABLES[table]
+    return ["id", "name", "email", "phone", "message", "created_at"] + ([subject] if subject else [])
+
+
+class LeadIndex:
+    """Trigram index over demo_bookings, subject_queries and contact_messages.
+
+    Every lead gets a small integer doc id, and each trigram of the words in
+    its name, email, subject and message (and of its phone number's digits)
+    keeps the ids containing it in a sorted array('I'). A query word matches
+    the leads that have all of its trigrams; a query matches the leads that
+    match every word. Intersections run on integer bitmaps built from the
+    posting arrays, kept in a small LRU for the trigrams that are asked for
+    often, so a query costs a few bitwise ANDs over n/8 bytes no matter how
+    common its trigrams are.
+
+    Results are ranked: a word found in the name or email outweighs one
+    found in the phone or subject, which outweighs one only found in the
+    message, and newer leads win ties. Only the fields shown in results are
+    kept in memory; messages are indexed, not stored.
+    """
+
+    def __init__(self, repo: Repository, max_ranked: int = 200, message_chars: int = 500,
+                 bitmap_cache: int = 512, refresh_interval: float = 30.0, rebuild_interval: float = 3600.0):
+        self.repo = repo
+        self.max_ranked = max_ranked
+        self.message_chars = message_chars
+        self.bitmap_cache = bitmap_cache
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.leads: List[Optional[Lead]] = []
+        self.ids: Dict[Tuple[str, str], int] = {}
+        self.postings: Dict[str, array] = {}
+        self.dead = 0
+        # Newest created_at seen per table, for catching up with other workers.
+        self.seen: Dict[str, str] = {}
+        self._bitmaps: 'OrderedDict[str, int]' = OrderedDict()
+        self._alive: Optional[int] = None
+        self._loading: Optional[List[Tuple[str, str, Any]]] = None
+        self._task = None
+        self.loaded = False
+        self.queries = 0
+        self.last_build_seconds: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # --- Updates ---
+
+    def add(self, table: str, row: Dict[str, Any]) -> bool:
+        """Indexes a new row; rows already indexed are left as they are."""
+        if self._loading is not None:
+            self._loading.append(("add", table, row))
+        key = (table, row["id"])
+        if key in self.ids:
+            return False
+        subject = TABLES[table]
+        lead = Lead(table, row["id"], row.get("name") or "", row.get("email") or "", row.get("phone") or "",
+                    (row.get(subject) or "") if subject else "", row.get("created_at") or "")
+        doc = len(self.leads)
+        self.leads.append(lead)
+        self.ids[key] = doc
+        if lead.created_at > self.seen.get(table, ""):
+            self.seen[table] = lead.created_at
+        if self._alive is not None:
+            self._alive |= 1 << doc
+        contact = set(word_grams(NON_DIGIT.sub("", lead.phone)))
+        for text in (lead.name, lead.email):
+            for word in words(text):
+                contact.update(word_grams(word))
+        grams = set(contact)
+        for text in (lead.subject, (row.get("message") or "")[:self.message_chars]):
+            for word in words(text):
+                grams.update(word_grams(word))
+        grams.update(CONTACT + gram for gram in contact)
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(doc)
+            bitmap = self._bitmaps.get(gram)
+            if bitmap is not None:
+                self._bitmaps[gram] = bitmap | (1 << doc)
+        return True
+
+    def remove(self, table: str, id: str) -> bool:
+        if self._loading is not None:
+            self._loading.append(("remove", table, id))
+        doc = self.ids.pop((table, id), None)
+        if doc is None:
+            return False
+        self.leads[doc] = None
+        self.dead += 1
+        if self._alive is not None:
+            self._alive &= ~(1 << doc)
+        if self.dead > 1000 and self.dead * 4 > len(self.leads):
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        # Drops deleted ids from the postings; doc ids stay as they are.
+        leads = self.leads
+        for gram, posting in list(self.postings.items()):
+            kept = array('I', (doc for doc in posting if leads[doc] is not None))
+            if kept:
+                self.postings[gram] = kept
+            else:
+                del self.postings[gram]
+        self._bitmaps.clear()
+        self.dead = 0
+
+    # --- Building and catching up ---
+
+    async def build(self, chunk_size: int = 1000) -> int:
+        """Rebuilds the index from the tables, then swaps it in.
+
+        Writes that arrive while the tables are read are applied to both the
+        old index (still answering queries) and, after the read, the new one.
+        """
+        started = time.perf_counter()
+        fresh = LeadIndex(None, self.max_ranked, self.message_chars, self.bitmap_cache)
+        self._loading = []
+        try:
+            for table in TABLES:
+                async for rows in iter_chunks(self.repo, table, columns(table), chunk_size=chunk_size):
+                    for row in rows:
+                        fresh.add(table, row)
+            for op, table, value in self._loading:
+                if op == "add":
+                    fresh.add(table, value)
+                else:
+                    fresh.remove(table, value)
+        finally:
+            self._loading = None
+        for name in ("leads", "ids", "postings", "dead", "seen", "_bitmaps", "_alive"):
+            setattr(self, name, getattr(fresh, name))
+        self.loaded = True
+        self.last_build_seconds = time.perf_counter() - started
+        logging.info(f"Search index built: {len(self)} leads, {len(self.postings)} trigrams "
+                     f"in {self.last_build_seconds:.1f}s")
+        return len(self)
+
+    async def catch_up(self, overlap: float = 60.0) -> int:
+        """Adds rows other workers created since the newest one seen here.
+
+        Reading from overlap seconds before that row covers clock skew between
+        workers; rows already indexed are skipped.
+        """
+        added = 0
+        for table in TABLES:
+            seen = self.seen.get(table)
+            if seen is None:
+                continue
+            since = isoformat(epoch(seen) - overlap)
+            async for rows in iter_chunks(self.repo, table, columns(table), since=since):
+                added += sum(self.add(table, row) for row in rows)
+        return added
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        # Deletes made by other workers only show up at the next full build.
+        built = None
+        while True:
+            try:
+                if built is None or time.monotonic() - built >= self.rebuild_interval:
+                    await self.build()
+                    built = time.monotonic()
+                else:
+                    await self.catch_up()
+            except Exception as e:
+                logging.error(f"Error refreshing search index: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    # --- Queries ---
+
+    def _bitmap(self, gram: str) -> int:
+        bitmap = self._bitmaps.get(gram)
+        if bitmap is not None:
+            self._bitmaps.move_to_end(gram)
+            return bitmap
+        bits = bytearray((len(self.leads) + 7) // 8)
+        posting = self.postings.get(gram, ())
+        for doc in posting:
+            bits[doc >> 3] |= 1 << (doc & 7)
+        bitmap = int.from_bytes(bits, 'little')
+        # Short postings are cheaper to rebuild than to keep.
+        if len(posting) >= 64:
+            self._bitmaps[gram] = bitmap
+            if len(self._bitmaps) > self.bitmap_cache:
+                self._bitmaps.popitem(last=False)
+        return bitmap
+
+    def _alive_bitmap(self) -> int:
+        if self._alive is None:
+            bits = bytearray((len(self.leads) + 7) // 8)
+            for doc, lead in enumerate(self.leads):
+                if lead is not None:
+                    bits[doc >> 3] |= 1 << (doc & 7)
+            self._alive = int.from_bytes(bits, 'little')
+        return self._alive
+
+    def _newest(self, matches: int, limit: int) -> List[int]:
+        # Big-endian puts the highest doc ids first; the regex skips empty bytes in C.
+        raw = matches.to_bytes((len(self.leads) + 7) // 8, 'big')
+        top = len(raw) - 1
+        docs: List[int] = []
+        for found in NONZERO.finditer(raw):
+            byte, base = raw[found.start()], (top - found.start()) * 8
+            docs.extend(base + bit for bit in range(7, -1, -1) if byte >> bit & 1)
+            if len(docs) >= limit:
+                return docs[:limit]
+        return docs
+
+    @staticmethod
+    def _score(lead: Lead, terms: List[str]) -> int:
+        name, email, subject = lead.name.lower(), lead.email.lower(), lead.subject.lower()
+        phone = NON_DIGIT.sub("", lead.phone) if lead.phone else ""
+        score = 0
+        for word in terms:
+            if word in name or word in email:
+                score += NAME_WEIGHT + (PREFIX_BONUS if name.startswith(word) or email.startswith(word) else 0)
+            elif word in phone:
+                score += PHONE_WEIGHT
+            elif word in subject:
+                score += SUBJECT_WEIGHT
+            else:
+                score += MESSAGE_WEIGHT
+        return score
+
+    def _all(self, grams: Iterable[str], within: int) -> int:
+        # Rarest first: an empty posting ends the query before any bitmap is built.
+        ordered = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        if not ordered or not self.postings.get(ordered[0]):
+            return 0
+        for gram in ordered:
+            within &= self._bitmap(gram)
+            if not within:
+                break
+        return within
+
+    def search(self, query: str, limit: int = 20) -> Dict[str, Any]:
+        """Leads matching every word of query, best first.
+
+        Scoring needs the stored fields, so only max_ranked candidates are
+        scored: the newest of the matches with every word in the name, email
+        or phone, then of those with some word there, then of the rest. The
+        contact postings make those tiers a few more bitmap ANDs, and they
+        follow the score order, so the best leads are among the candidates
+        however many matches there are.
+        """
+        started = time.perf_counter()
+        self.queries += 1
+        terms = list(dict.fromkeys(word for word in words(query) if len(word) >= 2))
+        if not terms:
+            raise ValueError("Search for at least two letters or digits")
+        grams = {gram for word in terms for gram in query_grams(word)}
+        matches = self._all(grams, self._alive_bitmap()) if self.leads else 0
+        total = matches.bit_count()
+        candidates: List[int] = []
+        if total:
+            contact = [self._all((CONTACT + gram for gram in query_grams(word)), matches) for word in terms]
+            every, some = matches, 0
+            for bitmap in contact:
+                every &= bitmap
+                some |= bitmap
+            for tier in (every, some & ~every, matches & ~some):
+                if tier:
+                    candidates.extend(self._newest(tier, self.max_ranked - len(candidates)))
+                if len(candidates) >= self.max_ranked:
+                    break
+        ranked = [(self._score(self.leads[doc], terms), doc, self.leads[doc]) for doc in candidates]
+        items = [dict(lead._asdict(), score=score) for score, _, lead in heapq.nlargest(limit, ranked)]
+        return {
+            "query": query,
+            "total": total,
+            "ranked": len(candidates),
+            "items": items,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "leads": len(self),
+            "doc_ids": len(self.leads),
+            "trigrams": len(self.postings),
+            "postings": sum(len(posting) for posting in self.postings.values()),
+            "postings_bytes": sum(posting.itemsize * len(posting) for posting in self.postings.values()),
+            "cached_bitmaps": len(self._bitmaps),
+            "queries": self.queries,
+            "last_build_seconds": round(self.last_build_seconds, 3) if self.last_build_seconds is not None else None,
+        }
@@ -0,0 +1,78 @@
+import zlib
+from typing import Any, Optional, Tuple
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as-is: the headers and CPU cost more than they save.
+COMPRESS_MIN_BYTES = 1024
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON. Types orjson does not know are written with str()."""
+    return orjson.dumps(obj, default=str, option=_OPTIONS)
+
+
+class JSONBytesResponse(Response):
+    """JSON response encoded with orjson.
+
+    Returning one from a route skips FastAPI's response_model validation and
+    jsonable_encoder pass, so it is for payloads the server built itself or
+    read back from its own tables; response_model stays on the route for the
+    schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def accepted_encoding(header: Optional[str]) -> Optional[str]:
+    """The preferred encoding in ENCODINGS that an Accept-Encoding header allows, if any."""
+    if not header:
+        return None
+    weights = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best = None
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    # wbits=31 writes a gzip container.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def negotiate(request: Request, body: bytes, min_bytes: int = COMPRESS_MIN_BYTES) -> Tuple[Optional[str], bytes]:
+    """(Content-Encoding, body) for request: compressed when it is large enough and the client accepts it."""
+    if len(body) < min_bytes:
+        return None, body
+    encoding = accepted_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return None, body
+    return encoding, compress(body, encoding)
@@ -0,0 +1,105 @@
+"""Production entrypoint: uvicorn with one worker process per core.
+
+    python backend/serve.py                     # serve on $HOST:$PORT with $WEB_CONCURRENCY workers
+    python backend/serve.py --check             # start one app in-process, print the startup breakdown, stop
+
+Each worker imports the app, opens its own database pool and Resend
+connection in the lifespan (warmed before it takes traffic) and runs its
+own background tasks. On SIGTERM the supervisor stops the workers; each one
+stops accepting connections, waits up to --graceful-timeout seconds for
+requests in flight, then runs the lifespan shutdown, which keeps sending
+queued emails for up to OUTBOX_DRAIN_TIMEOUT seconds and flushes buffered
+visitor events.
+
+Rate limits and the response cache default to per-worker memory; with more
+than one worker a warning names the ones to move to sqlite.
+
+--check exits with status 1 when startup takes longer than
+STARTUP_BUDGET_SECONDS (or --budget), so CI can hold cold start to a budget.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+
+def default_workers() -> int:
+    # Cores this process may run on, which is what a container's CPU set limits.
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cores = os.cpu_count() or 1
+    return max(1, cores)
+
+
+def per_worker_stores(workers: int, environ=os.environ) -> List[str]:
+    """The stores left in per-worker memory that behave differently once there are several workers."""
+    if workers < 2:
+        return []
+    stores = []
+    if environ.get("RATE_LIMIT_STORE", "memory") == "memory":
+        stores.append("RATE_LIMIT_STORE=memory (each worker allows the full rate)")
+    if environ.get("RESPONSE_CACHE", "memory") == "memory":
+        stores.append("RESPONSE_CACHE=memory (a write only invalidates its own worker's lists)")
+    return stores
+
+
+async def check(budget: float) -> int:
+    started = time.perf_counter()
+    import server
+    imported = time.perf_counter() - started
+    async with server.lifespan(server.app):
+        pass
+    report = server.startup.stats()
+    report["import_seconds"] = round(imported, 4)
+    print(json.dumps(report, indent=2))
+    if budget and report["ready_seconds"] > budget:
+        print(f"Startup took {report['ready_seconds']:.2f}s, over the {budget:.2f}s budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY") or default_workers()))
+    parser.add_argument("--graceful-timeout", type=float,
+                        default=float(os.environ.get("GRACEFUL_TIMEOUT", "10")),
+                        help="seconds to wait for requests in flight before the lifespan shutdown")
+    parser.add_argument("--check", action="store_true", help="report startup time and exit")
+    parser.add_argument("--budget", type=float, default=float(os.environ.get("STARTUP_BUDGET_SECONDS") or 0))
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    if args.check:
+        return asyncio.run(check(args.budget))
+
+    stores = per_worker_stores(args.workers)
+    if stores:
+        logging.warning(f"Starting {args.workers} workers with {', '.join(stores)}; "
+                        f"set them to sqlite to share them between workers")
+    import uvicorn
+    uvicorn.run(
+        "server:app",
+        app_dir=str(BACKEND_DIR),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.environ.get("ACCESS_LOG", "") == "1",
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,331 @@
-from fastapi import FastAPI, APIRouter
+from startup import StartupReport
+# Cold start breakdown (GET /api/admin/startup); created before anything heavy is imported
+startup = StartupReport()
+
+import asyncio
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
-import asyncio
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uuid
 from datetime import datetime, timezone
-from supabase import create_client, Client
 
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
+startup.budget = float(os.environ['STARTUP_BUDGET_SECONDS']) if os.environ.get('STARTUP_BUDGET_SECONDS') else None
+startup.mark("framework imports")
+
+from repository import Repository, create_repository
+from breaker import CircuitBreaker, GuardedRepository, is_outage
+from spool import Spool
+from ingest import EventIngestor, IngestQueueFull
+from useragent import UserAgentClassifier
+from stats import StatsStore
+from events import EventBus
+from chat import ChatBot
+from search import LeadIndex
+from scheduling import Scheduler, SlotUnavailable
+from migrations import schema_status
+from analytics import GRANULARITIES, AnalyticsEngine, epoch as analytics_epoch
+from archive import ArchiveReader, EventArchiver
+from bulk import bulk_delete, bulk_set
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidPageRequest, date_range, fetch_page, projection
+from export import EXPORT_FORMATS, stream_export
+from serialization import COMPRESS_MIN_BYTES, JSONBytesResponse
+from outbox import Outbox, ResendSender
+from emails import Notifications
+from idempotency import Deduplicator, IdempotencyKeyReused, content_key
+from cache import MemoryBackend, ResponseCache, SQLiteBackend
+from ratelimit import Limit, MemoryBuckets, RateLimiter, RateLimitMiddleware, Rule, SQLiteBuckets
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, LoopLagMonitor, Metrics, MetricsMiddleware,
+                     TimedRepository, TimedRoute, create_profiler)
+startup.mark("app imports")
+
+# Request latency, data layer and email timings for GET /api/metrics
+metrics = Metrics()
+loop_lag = LoopLagMonitor(metrics, interval=float(os.environ.get('METRICS_LOOP_LAG_INTERVAL', '0.5')))
+# Folded stacks for requests slower than METRICS_PROFILE_SLOW_MS; off unless set
+profiler = create_profiler()
+
+# Data layer (DB_BACKEND=async|threadpool|sqlite). Created in the lifespan, not at import,
+# so the app can be imported, tested and benchmarked without a live database.
+repo: Optional[Repository] = None
+
+# Visitor events are buffered and written as bulk inserts
+ingestor = EventIngestor(
+    None,
+    batch_size=int(os.environ.get('INGEST_BATCH_SIZE', '500')),
+    flush_interval=float(os.environ.get('INGEST_FLUSH_INTERVAL', '1.0')),
+    max_pending=int(os.environ.get('INGEST_MAX_PENDING', '10000')),
+)
+
+# Browser, OS and device class are stored instead of the raw User-Agent; bots are only counted here
+user_agents = UserAgentClassifier(cache_size=int(os.environ.get('USER_AGENT_CACHE_SIZE', '10000')))
+
+# Admin counters served from memory, re-verified against the database
+stats = StatsStore(None, verify_interval=float(os.environ.get('STATS_VERIFY_INTERVAL', '300')))
+ingestor.listeners.append(stats.events_flushed)
+
+# FAQ chatbot; questions it cannot answer are written in batches for review
+unanswered_questions = EventIngestor(None, table='chat_unanswered', batch_size=100, flush_interval=5.0,
+                                     max_pending=1000)
+chatbot = ChatBot(
+    os.environ.get('CHAT_FAQ_PATH') or ROOT_DIR / 'backend' / 'data' / 'faq.json',
+    unanswered=unanswered_questions,
+    cache_size=int(os.environ.get('CHAT_CACHE_SIZE', '1000')),
+    min_score=float(os.environ.get('CHAT_MIN_SCORE', '1.0')),
+)
+
+# Trigram index over the lead tables for GET /api/admin/search, built in the background
+leads = LeadIndex(
+    None,
+    max_ranked=int(os.environ.get('SEARCH_MAX_RANKED', '200')),
+    refresh_interval=float(os.environ.get('SEARCH_REFRESH_INTERVAL', '30')),
+    rebuild_interval=float(os.environ.get('SEARCH_REBUILD_INTERVAL', '3600')),
+)
+
+# Tutor availability (data/tutors.json) and the slots claimed from it, mirrored in memory
+scheduler = Scheduler(
+    None,
+    os.environ.get('TUTORS_PATH') or ROOT_DIR / 'backend' / 'data' / 'tutors.json',
+    slot_minutes=float(os.environ.get('SLOT_MINUTES', '60')),
+    min_notice=float(os.environ.get('SLOT_MIN_NOTICE_HOURS', '12')) * 3600,
+    horizon_days=float(os.environ.get('SLOT_HORIZON_DAYS', '90')),
+    refresh_interval=float(os.environ.get('SLOT_REFRESH_INTERVAL', '30')),
+)
+
+# Database calls made by requests get a deadline, and fail at once while the database keeps failing
+breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get('DB_BREAKER_FAILURES', '5')),
+    reset_timeout=float(os.environ.get('DB_BREAKER_RESET_SECONDS', '15')),
+)
+DB_DEADLINE = float(os.environ.get('DB_DEADLINE_SECONDS', '2'))
+
+# Leads the database could not take wait in a local file and are replayed once it answers
+spool = Spool(
+    os.environ.get('SPOOL_DIR') or ROOT_DIR / 'spool',
+    replay_interval=float(os.environ.get('SPOOL_REPLAY_INTERVAL', '5')),
+    ready=lambda: breaker.state != "open",
+)
+
+# Live deltas for the admin dashboard (GET /api/admin/events)
+bus = EventBus(history=int(os.environ.get('ADMIN_EVENTS_HISTORY', '1000')))
+stats.listeners.append(lambda changed: bus.publish('counters', changed))
 
-# Supabase setup
-supabase_url = os.environ['SUPABASE_URL']
-supabase_key = os.environ['SUPABASE_ANON_KEY']
-supabase: Client = create_client(supabase_url, supabase_key)
+# Sessionized visitor rollups, fed by the same flushed batches
+analytics = AnalyticsEngine(
+    None,
+    session_timeout=float(os.environ.get('ANALYTICS_SESSION_TIMEOUT', '1800')),
+    engaged_seconds=float(os.environ.get('ANALYTICS_ENGAGED_SECONDS', '30')),
+    interval=float(os.environ.get('ANALYTICS_ROLLUP_INTERVAL', '60')),
+)
+ingestor.listeners.append(analytics.events_flushed)
+
+# Visitor events older than EVENT_RETENTION_DAYS move to compressed daily segments; off unless set
+archive = ArchiveReader(os.environ.get('ARCHIVE_DIR') or ROOT_DIR / 'archive')
+analytics.archive = archive
+stats.archived_events = archive.event_counts
+archiver = EventArchiver(
+    None, archive,
+    retain_days=float(os.environ.get('EVENT_RETENTION_DAYS') or 0),
+    interval=float(os.environ.get('ARCHIVE_INTERVAL', '3600')),
+    holdback=lambda: analytics.watermark,
+)
 
-# Resend setup
-import resend
-resend.api_key = os.environ.get('RESEND_API_KEY', '')
 NOTIFICATION_EMAIL = os.environ.get('NOTIFICATION_EMAIL', 'tutorviaa@gmail.com')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
 WHATSAPP_NUMBER = os.environ.get('WHATSAPP_NUMBER', '917009201851')
 
-app = FastAPI()
-api_router = APIRouter(prefix="/api")
+# Notification emails go through a persisted outbox drained by a rate-limited worker pool.
+# Templates are compiled once here.
+notifications = Notifications(SENDER_EMAIL, NOTIFICATION_EMAIL, WHATSAPP_NUMBER)
+sender = ResendSender(
+    os.environ.get('RESEND_API_KEY', ''),
+    base_url=os.environ.get('RESEND_API_URL', 'https://api.resend.com'),
+)
+outbox = Outbox(
+    None,
+    sender,
+    notifications,
+    workers=int(os.environ.get('OUTBOX_WORKERS', '4')),
+    rate=float(os.environ.get('RESEND_RATE_LIMIT', '2')),
+    burst=float(os.environ.get('RESEND_BURST', '2')),
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '6')),
+    retry_base=float(os.environ.get('OUTBOX_RETRY_BASE', '2')),
+    digest_threshold=int(os.environ.get('EMAIL_DIGEST_THRESHOLD', '10')),
+    digest_max=int(os.environ.get('EMAIL_DIGEST_MAX', '25')),
+    claim_timeout=float(os.environ.get('OUTBOX_CLAIM_TIMEOUT', '300')),
+)
+# During an outage an email job is spooled with its lead and sent once both are replayed
+outbox.spool = lambda table, row: spool.append(table, row)
+
+# Retried or double-clicked submissions are folded into the first one
+dedup = Deduplicator(
+    key_ttl=float(os.environ.get('IDEMPOTENCY_KEY_TTL', '86400')),
+    content_window=float(os.environ.get('DEDUP_WINDOW', '300')),
+    max_entries=int(os.environ.get('DEDUP_MAX_ENTRIES', '10000')),
+)
+
+# Read-through cache for the admin list endpoints (RESPONSE_CACHE=memory|sqlite|off)
+def create_response_cache() -> ResponseCache:
+    kind = os.environ.get('RESPONSE_CACHE', 'memory')
+    ttl = float(os.environ.get('RESPONSE_CACHE_TTL', '30'))
+    max_entries = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+    if kind == 'memory':
+        backend = MemoryBackend(max_entries, ttl)
+    elif kind == 'sqlite':
+        path = os.environ.get('RESPONSE_CACHE_PATH', str(ROOT_DIR / 'response_cache.sqlite3'))
+        backend = SQLiteBackend(path, max_entries, ttl)
+    elif kind == 'off':
+        backend = None
+    else:
+        raise ValueError(f"Unknown RESPONSE_CACHE: {kind}")
+    # Lists at least this large are gzip/brotli encoded for clients that accept it
+    compress_min_bytes = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', str(COMPRESS_MIN_BYTES)))
+    return ResponseCache(backend, compress_min_bytes)
+
+responses = create_response_cache()
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    store = os.environ.get('RATE_LIMIT_STORE', 'memory')
+    if store == 'off':
+        return None
+    if store == 'sqlite':
+        buckets = SQLiteBuckets(os.environ.get('RATE_LIMIT_PATH', 'rate_limit.sqlite3'))
+    elif store == 'memory':
+        buckets = MemoryBuckets(max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000')))
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_STORE: {store}")
+    track = Rule('track', Limit.parse(os.environ.get('RATE_LIMIT_TRACK_IP', '600/60')),
+                 Limit.parse(os.environ.get('RATE_LIMIT_TRACK_SESSION', '120/60')))
+    # The three forms share one bucket per client, so spreading a flood across them does not help.
+    forms = Rule('forms', Limit.parse(os.environ.get('RATE_LIMIT_FORMS_IP', '20/600')),
+                 Limit.parse(os.environ.get('RATE_LIMIT_FORMS_SESSION', '5/600')))
+    rules = {
+        ('POST', '/api/visitors/track'): track,
+        ('POST', '/api/demo-bookings'): forms,
+        ('POST', '/api/subject-queries'): forms,
+        ('POST', '/api/contact-messages'): forms,
+        ('POST', '/api/chat'): Rule('chat', Limit.parse(os.environ.get('RATE_LIMIT_CHAT_IP', '120/60')),
+                                    Limit.parse(os.environ.get('RATE_LIMIT_CHAT_SESSION', '30/60'))),
+    }
+    return RateLimiter(buckets, rules, trust_proxy=os.environ.get('RATE_LIMIT_TRUST_PROXY', '') == '1')
+
+rate_limiter = create_rate_limiter()
+
+outbox.listeners.append(metrics.record_email)
+metrics.gauge('ingest_pending_events', 'Visitor events waiting to be written.', lambda: ingestor.stats()["pending"])
+metrics.gauge('email_outbox_queued', 'Email jobs waiting for a worker.', lambda: outbox.stats()["queued"])
+metrics.gauge('email_outbox_in_flight', 'Email jobs being sent.', lambda: outbox.in_flight)
+metrics.gauge('user_agent_cache_hit_ratio', 'Share of tracked events classified from the cache.',
+              lambda: user_agents.stats()["cache_hit_rate"] or 0.0)
+metrics.gauge('tracking_bot_hits', 'Visitor events from bots, counted and not stored.',
+              lambda: sum(user_agents.bots.values()))
+metrics.gauge('db_circuit_open', 'Whether request-path database calls are being refused (1) or not (0).',
+              lambda: float(breaker.state == "open"))
+metrics.gauge('spool_bytes', 'Bytes of lead rows waiting on local disk to be replayed.',
+              lambda: spool.stats()["bytes"])
+metrics.gauge('admin_event_subscribers', 'Open admin event streams.', lambda: bus.stats()["subscribers"])
+
+startup.mark("components")
+
+guarded_components = (ingestor, unanswered_questions, outbox, scheduler)
+
+def use_repository(new_repo: Optional[Repository]):
+    global repo
+    repo = (TimedRepository(GuardedRepository(new_repo, breaker, DB_DEADLINE), metrics)
+            if new_repo is not None else None)
+    # Whatever a request waits on, directly or through a queue that backs up,
+    # gets the deadline and the breaker; scans and rollups in the background
+    # may take longer than DB_DEADLINE_SECONDS and use the database directly.
+    for component in guarded_components:
+        component.repo = repo
+    for component in (stats, analytics, archiver, leads):
+        component.repo = new_repo
+    # Replays go through the breaker so they wait out an outage instead of adding to it.
+    spool.repo = repo
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A repository installed beforehand (tests, benchmarks) is kept.
+    if repo is None:
+        async with startup.phase("repository"):
+            use_repository(create_repository())
+    async with startup.phase("schema check"):
+        await check_schema()
+    async with startup.phase("warm connections"):
+        await warm_connections()
+    async with startup.phase("background tasks"):
+        await loop_lag.start()
+        if profiler:
+            profiler.start()
+        await ingestor.start()
+        await unanswered_questions.start()
+        await stats.start()
+        await analytics.start()
+        if archiver.retain_days:
+            await archiver.start()
+        await outbox.start()
+        await leads.start()
+        await scheduler.start()
+        await spool.start()
+    startup.ready()
+    yield
+    await outbox.stop(drain_timeout=float(os.environ.get('OUTBOX_DRAIN_TIMEOUT', '10')))
+    await stats.stop()
+    await ingestor.stop()
+    await unanswered_questions.stop()
+    await analytics.stop()
+    await archiver.stop()
+    await leads.stop()
+    await scheduler.stop()
+    await spool.stop()
+    await sender.aclose()
+    await repo.aclose()
+    use_repository(None)
+    await loop_lag.stop()
+    if profiler:
+        profiler.stop()
+
+# Applied and pending migrations as of startup (GET /api/admin/startup)
+schema: dict = {}
+
+async def check_schema():
+    # Supabase migrations are run by hand from `python backend/migrations.py sql`. A worker
+    # on an older schema still serves, only slower, so this warns instead of failing.
+    global schema
+    try:
+        schema = await asyncio.wait_for(schema_status(repo), timeout=float(os.environ.get('WARM_TIMEOUT', '5')))
+    except Exception as e:
+        schema = {"error": str(e)}
+        logging.warning(f"Could not read the schema version: {e!r}")
+        return
+    if schema["pending"]:
+        logging.warning(f"Schema migrations {schema['pending']} are not applied; "
+                        f"run the output of `python backend/migrations.py sql` in Supabase")
+
+async def warm_connections():
+    # Opens pooled database connections and the Resend connection before the first
+    # request needs them. Failures are logged: they only cost that request the setup.
+    count = int(os.environ.get('DB_WARM_CONNECTIONS', '4'))
+    warm = [repo.warm(count)] if count > 0 else []
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*warm, sender.warm(), return_exceptions=True),
+                                         timeout=float(os.environ.get('WARM_TIMEOUT', '5')))
+    except asyncio.TimeoutError:
+        results = [asyncio.TimeoutError("timed out")]
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Could not pre-warm connections: {result!r}")
+
+app = FastAPI(lifespan=lifespan)
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
 
 # --- Models ---
 class DemoBooking(BaseModel):
@@ -51,6 +349,9 @@ class DemoBookingCreate(BaseModel):
     subject_interest: str = ""
     preferred_date: str = ""
     message: str = ""
+    # A slot from GET /api/slots; claimed with the booking, which then gets its start as preferred_date.
+    tutor: str = ""
+    slot_start: str = ""
 
 class SubjectQuery(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -93,69 +394,18 @@ class VisitorEventCreate(BaseModel):
     user_agent: str = ""
     referrer: str = ""
 
-# --- Email Helper ---
-async def send_booking_email(booking: DemoBooking):
-    if not resend.api_key or resend.api_key == 're_YOUR_API_KEY_HERE':
-        logging.warning("Resend API key not configured, skipping email")
-        return
-    html = f"""
-    <div style="font-family: 'Helvetica Neue', Arial, sans-serif; max-width: 600px; margin: 0 auto; background: #F9F8F6; padding: 32px;">
-      <div style="background: #2F5D62; padding: 24px; border-radius: 12px 12px 0 0;">
-        <h1 style="color: white; margin: 0; font-size: 22px;">New Demo Booking</h1>
-      </div>
-      <div style="background: white; padding: 24px; border: 1px solid #E2E0D6; border-radius: 0 0 12px 12px;">
-        <table style="width: 100%; border-collapse: collapse;">
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Name</td><td style="padding: 8px 0; font-weight: 600; color: #2C3333;">{booking.name}</td></tr>
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Email</td><td style="padding: 8px 0; color: #2C3333;">{booking.email}</td></tr>
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Phone</td><td style="padding: 8px 0; color: #2C3333;">{booking.phone}</td></tr>
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Grade</td><td style="padding: 8px 0; color: #2C3333;">{booking.grade_level}</td></tr>
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Subject</td><td style="padding: 8px 0; color: #2C3333;">{booking.subject_interest}</td></tr>
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Preferred Date</td><td style="padding: 8px 0; color: #2C3333;">{booking.preferred_date}</td></tr>
-          <tr><td style="padding: 8px 0; color: #6B7280; font-size: 14px;">Message</td><td style="padding: 8px 0; color: #2C3333;">{booking.message or 'N/A'}</td></tr>
-        </table>
-        <div style="margin-top: 16px; padding: 12px; background: #ECB390; border-radius: 8px; text-align: center;">
-          <a href="https://wa.me/{WHATSAPP_NUMBER}?text=Hi%20{booking.name}%2C%20thanks%20for%20booking%20a%20demo%20with%20LearnSphere!" style="color: #2C3333; font-weight: 600; text-decoration: none;">Reply via WhatsApp</a>
-        </div>
-      </div>
-    </div>
-    """
-    try:
-        await asyncio.to_thread(resend.Emails.send, {
-            "from": SENDER_EMAIL,
-            "to": [NOTIFICATION_EMAIL],
-            "subject": f"New Demo Booking: {booking.name} - {booking.subject_interest}",
-            "html": html,
-        })
-        logging.info(f"Email sent for booking {booking.id}")
-    except Exception as e:
-        logging.error(f"Failed to send email: {e}")
+BULK_MAX_IDS = int(os.environ.get('BULK_MAX_IDS', '1000'))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', '100'))
 
-async def send_query_email(query: SubjectQuery):
-    if not resend.api_key or resend.api_key == 're_YOUR_API_KEY_HERE':
-        return
-    html = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 24px; background: #F9F8F6;">
-      <div style="background: #DF7861; padding: 20px; border-radius: 12px 12px 0 0;">
-        <h1 style="color: white; margin: 0; font-size: 20px;">New Subject Query: {query.subject}</h1>
-      </div>
-      <div style="background: white; padding: 24px; border: 1px solid #E2E0D6; border-radius: 0 0 12px 12px;">
-        <p><strong>Name:</strong> {query.name}</p>
-        <p><strong>Email:</strong> {query.email}</p>
-        <p><strong>Phone:</strong> {query.phone}</p>
-        <p><strong>Query Type:</strong> {query.query_type}</p>
-        <p><strong>Message:</strong> {query.message}</p>
-      </div>
-    </div>
-    """
-    try:
-        await asyncio.to_thread(resend.Emails.send, {
-            "from": SENDER_EMAIL,
-            "to": [NOTIFICATION_EMAIL],
-            "subject": f"Subject Query: {query.subject} from {query.name}",
-            "html": html,
-        })
-    except Exception as e:
-        logging.error(f"Failed to send query email: {e}")
+class BulkBookingAction(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BULK_MAX_IDS)
+    action: Literal["delete", "set_status"]
+    status: Optional[str] = None
+    dry_run: bool = False
+
+class ChatMessage(BaseModel):
+    message: str = Field(min_length=1, max_length=1000)
+    session_id: str = ""
 
 # --- Routes ---
 @api_router.get("/")
@@ -163,33 +413,142 @@ async def root():
     return {"message": "Hello World"}
 
 @api_router.post("/demo-bookings", response_model=DemoBooking)
-async def create_demo_booking(input: DemoBookingCreate):
-    booking = DemoBooking(**input.model_dump())
-    doc = booking.model_dump()
+async def create_demo_booking(input: DemoBookingCreate, idempotency_key: Optional[str] = Header(None),
+                              x_session_id: Optional[str] = Header(None)):
+    if bool(input.tutor) != bool(input.slot_start):
+        raise HTTPException(status_code=400, detail="tutor and slot_start go together")
+    fields = input.model_dump()
+    # A second slot for the same subject is a new booking, not a repeat.
+    content = content_key('demo_bookings', input.email, input.subject_interest, input.tutor, input.slot_start)
+    return await deduplicated('demo_bookings', idempotency_key, fields, content,
+                              lambda: insert_demo_booking(fields, x_session_id))
+
+async def deduplicated(scope: str, idempotency_key: Optional[str], fields: dict, content: str, create):
+    try:
+        return await dedup.run(scope, idempotency_key, fields, content, create)
+    except IdempotencyKeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+def new_row(model, fields: dict) -> dict:
+    # fields come from the already validated *Create model, so only the
+    # server-side defaults (id, status, created_at) are filled in; building
+    # the model again (or even model_construct) costs more than the request's
+    # own validation. The factories are called directly: FieldInfo.get_default
+    # inspects their signature on every call.
+    return {name: fields[name] if name in fields
+            else info.default_factory() if info.default_factory else info.default
+            for name, info in model.model_fields.items()}
+
+async def store_lead(table: str, doc: dict) -> bool:
+    # A lead the database does not take within DB_DEADLINE_SECONDS (or at all, while
+    # the circuit is open) is fsynced to the spool and answered as saved; it shows
+    # up in the lists once the spool is replayed. Errors that are not an outage,
+    # and a spool that fails too, are raised. Returns False if the lead was spooled.
     try:
-        supabase.table('demo_bookings').insert(doc).execute()
+        await repo.insert(table, doc)
     except Exception as e:
-        logging.error(f"Error inserting booking: {e}")
-        return {"error": "Failed to create booking"}
-    asyncio.create_task(send_booking_email(booking))
-    whatsapp_link = f"https://wa.me/{WHATSAPP_NUMBER}?text=Hi%2C%20I%20just%20booked%20a%20demo%20session%20on%20TutorVia.%20My%20name%20is%20{booking.name.replace(' ', '%20')}%20and%20I'm%20interested%20in%20{booking.subject_interest.replace(' ', '%20')}."
-    return booking
-
-@api_router.get("/demo-bookings", response_model=List[DemoBooking])
-async def get_demo_bookings():
+        if not is_outage(e):
+            raise
+        logging.error(f"Error inserting into {table}, spooling it: {e!r}")
+        await spool.append(table, doc)
+        return False
+    return True
+
+async def insert_demo_booking(fields: dict, session_id: Optional[str] = None):
+    doc = new_row(DemoBooking, fields)
+    slot = await claim_slot(fields, doc["id"]) if fields["tutor"] else None
+    if slot:
+        doc["preferred_date"] = slot["start"]
+    try:
+        stored = await store_lead('demo_bookings', doc)
+    except Exception as e:
+        logging.error(f"Error saving booking: {e}")
+        if slot:
+            await release_slots([doc["id"]])
+        raise HTTPException(status_code=503 if is_outage(e) else 500, detail="Could not save the booking, please try again")
+    stats.booking_created(doc["status"])
+    leads.add('demo_bookings', doc)
+    bus.publish('booking_created', doc)
+    await responses.invalidate('demo_bookings:head')
+    await outbox.enqueue('booking', doc, lead_spooled=not stored)
+    if session_id:
+        await track_booking(session_id)
+    return JSONBytesResponse({**doc, "slot": slot} if slot else doc)
+
+async def claim_slot(fields: dict, booking_id: str) -> dict:
+    # Unlike the lead, a slot cannot be spooled: tutor_slots is what stops two
+    # workers from selling it twice. Its claim fails the booking instead.
     try:
-        response = supabase.table('demo_bookings').select("*").order('created_at', desc=True).execute()
-        return response.data
+        row = await scheduler.claim(fields["tutor"], analytics_epoch(fields["slot_start"]), booking_id)
+    except SlotUnavailable:
+        raise HTTPException(status_code=409, detail="This slot has just been booked, please pick another")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logging.error(f"Error fetching bookings: {e}")
-        return []
+        logging.error(f"Error claiming slot: {e}")
+        raise HTTPException(status_code=503 if is_outage(e) else 500, detail="Could not book the slot, please try again")
+    return scheduler.slot(scheduler.tutors[row["tutor"]], int(analytics_epoch(row["slot_start"])))
+
+async def release_slots(booking_ids: List[str]):
+    # A failure only leaves the slot taken until someone frees it by hand.
+    try:
+        await scheduler.cancel(booking_ids)
+    except Exception as e:
+        logging.error(f"Error releasing slots: {e}")
+
+def page_tags(table: str, page: dict, cursor: Optional[str], where) -> list:
+    # New rows only ever land on the first page (lists are newest first), an
+    # update or delete only touches pages holding that id, and a status change
+    # can move a row into any page filtered on status.
+    tags = [f"{table}:id:{row['id']}" for row in page["items"]]
+    if cursor is None:
+        tags.append(f"{table}:head")
+    tags.extend(f"{table}:filter:{column}" for column, op, _ in where if op == 'eq')
+    return tags
+
+async def list_page(request: Request, table: str, model, fields, where, limit, cursor):
+    entry = await responses.get(request)
+    if entry is None:
+        try:
+            columns = projection(fields, model.model_fields)
+            page = await fetch_page(repo, table, columns, where, limit, cursor)
+        except InvalidPageRequest as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logging.error(f"Error fetching {table}: {e}")
+            return {"items": [], "next_cursor": None}
+        entry = await responses.put(request, page, page_tags(table, page, cursor, where))
+    return responses.respond(request, entry)
+
+@api_router.get("/demo-bookings")
+async def get_demo_bookings(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    subject_interest: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+):
+    where = date_range('created_at', created_after, created_before)
+    if status:
+        where.append(('status', 'eq', status))
+    if subject_interest:
+        where.append(('subject_interest', 'eq', subject_interest))
+    return await list_page(request, 'demo_bookings', DemoBooking, fields, where, limit, cursor)
 
 @api_router.delete("/demo-bookings/{booking_id}")
 async def delete_demo_booking(booking_id: str):
     try:
-        result = supabase.table('demo_bookings').delete().eq('id', booking_id).execute()
-        if not result.data:
+        deleted = await repo.delete('demo_bookings', [('id', 'eq', booking_id)])
+        if not deleted:
             return {"error": "Booking not found"}
+        stats.booking_deleted(deleted[0].get("status"))
+        bus.publish('booking_deleted', {"id": booking_id})
+        leads.remove('demo_bookings', booking_id)
+        await release_slots([booking_id])
+        await responses.invalidate(f'demo_bookings:id:{booking_id}')
         return {"message": "Booking deleted"}
     except Exception as e:
         logging.error(f"Error deleting booking: {e}")
@@ -198,101 +557,336 @@ async def delete_demo_booking(booking_id: str):
 @api_router.patch("/demo-bookings/{booking_id}/status")
 async def update_booking_status(booking_id: str, status: str):
     try:
-        result = supabase.table('demo_bookings').update({"status": status}).eq('id', booking_id).execute()
-        if not result.data:
+        previous = await repo.select('demo_bookings', 'status', [('id', 'eq', booking_id)])
+        if not previous:
             return {"error": "Booking not found"}
+        updated = await repo.update('demo_bookings', {"status": status}, [('id', 'eq', booking_id)])
+        if not updated:
+            return {"error": "Booking not found"}
+        stats.booking_status_changed(previous[0].get("status"), status)
+        if status == "cancelled":
+            await release_slots([booking_id])
+        bus.publish('booking_status', {"id": booking_id, "status": status, "previous": previous[0].get("status")})
+        await responses.invalidate(f'demo_bookings:id:{booking_id}', 'demo_bookings:filter:status')
         return {"message": "Status updated"}
     except Exception as e:
         logging.error(f"Error updating booking: {e}")
         return {"error": "Failed to update booking"}
 
+@api_router.post("/admin/demo-bookings/bulk")
+async def bulk_demo_bookings(input: BulkBookingAction):
+    if input.action == "set_status" and not input.status:
+        raise HTTPException(status_code=400, detail="status is required for set_status")
+    ids = list(dict.fromkeys(input.ids))
+    if input.action == "delete":
+        outcome = await bulk_delete(repo, 'demo_bookings', ids, chunk_size=BULK_CHUNK_SIZE, dry_run=input.dry_run)
+        done = outcome.with_result("deleted")
+        if done:
+            stats.bookings_deleted(r["previous"] for r in done)
+            bus.publish('bookings_deleted', {"ids": [r["id"] for r in done]})
+            for r in done:
+                leads.remove('demo_bookings', r["id"])
+            await release_slots([r["id"] for r in done])
+            await responses.invalidate(*(f'demo_bookings:id:{r["id"]}' for r in done))
+    else:
+        outcome = await bulk_set(repo, 'demo_bookings', ids, 'status', input.status, chunk_size=BULK_CHUNK_SIZE,
+                                 dry_run=input.dry_run)
+        done = outcome.with_result("updated")
+        if done:
+            stats.bookings_status_changed((r["previous"] for r in done), input.status)
+            bus.publish('bookings_status', {"ids": [r["id"] for r in done], "status": input.status})
+            if input.status == "cancelled":
+                await release_slots([r["id"] for r in done])
+            await responses.invalidate(*(f'demo_bookings:id:{r["id"]}' for r in done), 'demo_bookings:filter:status')
+    return {
+        "action": input.action,
+        "status": input.status,
+        "dry_run": input.dry_run,
+        "counts": outcome.counts(),
+        "statements": outcome.statements,
+        "results": list(outcome.results.values()),
+    }
+
 @api_router.post("/subject-queries", response_model=SubjectQuery)
-async def create_subject_query(input: SubjectQueryCreate):
-    query = SubjectQuery(**input.model_dump())
-    doc = query.model_dump()
+async def create_subject_query(input: SubjectQueryCreate, idempotency_key: Optional[str] = Header(None)):
+    fields = input.model_dump()
+    return await deduplicated('subject_queries', idempotency_key, fields,
+                              content_key('subject_queries', input.email, input.subject),
+                              lambda: insert_subject_query(fields))
+
+async def insert_subject_query(fields: dict):
+    doc = new_row(SubjectQuery, fields)
     try:
-        supabase.table('subject_queries').insert(doc).execute()
+        stored = await store_lead('subject_queries', doc)
     except Exception as e:
-        logging.error(f"Error inserting query: {e}")
-        return {"error": "Failed to create query"}
-    asyncio.create_task(send_query_email(query))
-    return query
+        logging.error(f"Error saving query: {e}")
+        raise HTTPException(status_code=503 if is_outage(e) else 500, detail="Could not save the query, please try again")
+    stats.incr("total_queries")
+    leads.add('subject_queries', doc)
+    await responses.invalidate('subject_queries:head')
+    await outbox.enqueue('query', doc, lead_spooled=not stored)
+    return JSONBytesResponse(doc)
 
 @api_router.get("/subject-queries")
-async def get_subject_queries():
-    try:
-        response = supabase.table('subject_queries').select("*").order('created_at', desc=True).execute()
-        return response.data
-    except Exception as e:
-        logging.error(f"Error fetching queries: {e}")
-        return []
+async def get_subject_queries(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    subject: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+):
+    where = date_range('created_at', created_after, created_before)
+    if subject:
+        where.append(('subject', 'eq', subject))
+    return await list_page(request, 'subject_queries', SubjectQuery, fields, where, limit, cursor)
 
 @api_router.post("/contact-messages")
 async def create_contact_message(input: ContactMessageCreate):
-    msg = ContactMessage(**input.model_dump())
-    doc = msg.model_dump()
+    doc = new_row(ContactMessage, input.model_dump())
     try:
-        supabase.table('contact_messages').insert(doc).execute()
+        await store_lead('contact_messages', doc)
     except Exception as e:
-        logging.error(f"Error inserting message: {e}")
-        return {"error": "Failed to send message"}
-    return {"status": "sent", "id": msg.id}
+        logging.error(f"Error saving message: {e}")
+        raise HTTPException(status_code=503 if is_outage(e) else 500, detail="Could not send the message, please try again")
+    stats.incr("total_contacts")
+    leads.add('contact_messages', doc)
+    await responses.invalidate('contact_messages:head')
+    return {"status": "sent", "id": doc["id"]}
 
 @api_router.get("/contact-messages")
-async def get_contact_messages():
-    try:
-        response = supabase.table('contact_messages').select("*").order('created_at', desc=True).execute()
-        return response.data
-    except Exception as e:
-        logging.error(f"Error fetching messages: {e}")
-        return []
+async def get_contact_messages(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+):
+    where = date_range('created_at', created_after, created_before)
+    return await list_page(request, 'contact_messages', ContactMessage, fields, where, limit, cursor)
 
-@api_router.post("/visitors/track")
-async def track_visitor(input: VisitorEventCreate):
+@api_router.post("/visitors/track", status_code=202)
+async def track_visitor(input: VisitorEventCreate, response: Response):
+    agent = user_agents.classify(input.user_agent)
+    if agent.bot is not None:
+        return {"status": "ignored"}
     doc = {
         "id": str(uuid.uuid4()),
         "session_id": input.session_id,
         "event_type": input.event_type,
         "page": input.page,
-        "user_agent": input.user_agent,
+        "browser": agent.browser,
+        "os": agent.os,
+        "device": agent.device,
         "referrer": input.referrer,
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
     try:
-        supabase.table('visitor_events').insert(doc).execute()
-    except Exception as e:
-        logging.error(f"Error tracking visitor: {e}")
-        return {"status": "error"}
-    return {"status": "tracked"}
+        await ingestor.submit(doc)
+    except IngestQueueFull:
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return {"status": "dropped"}
+    return {"status": "accepted"}
+
+async def track_booking(session_id: str):
+    # Closes the visit -> booking funnel for the visitor's session.
+    try:
+        await ingestor.submit({
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "event_type": "booking",
+            "page": "/",
+            "browser": "",
+            "os": "",
+            "device": "",
+            "referrer": "",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+    except IngestQueueFull:
+        logging.warning("Visitor event queue full, booking not tracked")
+
+@api_router.post("/chat")
+async def chat(input: ChatMessage):
+    return await chatbot.answer(input.message, input.session_id)
+
+@api_router.get("/admin/chat")
+async def get_chat_stats():
+    return chatbot.stats()
+
+@api_router.post("/admin/chat/reload")
+async def reload_chat():
+    try:
+        entries = chatbot.reload()
+    except (OSError, ValueError, KeyError) as e:
+        # The previous index stays in service.
+        raise HTTPException(status_code=400, detail=f"Could not load FAQ data: {e}")
+    return {"entries": entries}
+
+@api_router.get("/tutors")
+async def get_tutors():
+    return [tutor.profile() for tutor in scheduler.tutors.values()]
+
+@api_router.get("/slots")
+async def get_free_slots(subject: Optional[str] = None, tutor: Optional[str] = None, start: Optional[str] = None,
+                         end: Optional[str] = None, limit: int = Query(10, ge=1, le=100)):
+    if tutor and tutor not in scheduler.tutors:
+        raise HTTPException(status_code=404, detail="Tutor not found")
+    try:
+        lo = analytics_epoch(start) if start else None
+        hi = analytics_epoch(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO 8601 timestamps")
+    items = scheduler.free_slots(subject, tutor, lo, hi, limit)
+    return JSONBytesResponse({"items": items, "slot_minutes": scheduler.length // 60, "complete": scheduler.loaded})
+
+@api_router.get("/admin/slots")
+async def get_slot_stats():
+    return scheduler.stats()
+
+@api_router.get("/admin/search")
+async def search_leads(q: str, limit: int = Query(20, ge=1, le=100)):
+    try:
+        result = leads.search(q, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Until the first build finishes only leads created since startup are found.
+    return JSONBytesResponse({**result, "complete": leads.loaded})
+
+@api_router.get("/admin/search/stats")
+async def get_search_stats():
+    return leads.stats()
+
+@api_router.get("/admin/tracking")
+async def get_tracking_stats():
+    return {"ingest": ingestor.stats(), "user_agents": user_agents.stats()}
+
+@api_router.get("/admin/spool")
+async def get_spool_stats():
+    return {"breaker": breaker.stats(), "spool": spool.stats()}
+
+@api_router.get("/admin/startup")
+async def get_startup_stats():
+    return {**startup.stats(), "schema": schema}
 
 @api_router.get("/admin/stats")
-async def get_admin_stats():
+async def get_admin_stats(recount: bool = False):
+    if recount:
+        try:
+            await stats.recount()
+        except Exception as e:
+            logging.error(f"Error recounting stats: {e}")
+    return stats.snapshot()
+
+def analytics_range(granularity: str, start: Optional[str], end: Optional[str]):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {', '.join(GRANULARITIES)}")
     try:
-        bookings_response = supabase.table('demo_bookings').select("id", count='exact').execute()
-        pending_response = supabase.table('demo_bookings').select("id", count='exact').eq('status', 'pending').execute()
-        visits_response = supabase.table('visitor_events').select("id", count='exact').eq('event_type', 'visit').execute()
-        leaves_response = supabase.table('visitor_events').select("id", count='exact').eq('event_type', 'leave').execute()
-        queries_response = supabase.table('subject_queries').select("id", count='exact').execute()
-        contacts_response = supabase.table('contact_messages').select("id", count='exact').execute()
-        
-        return {
-            "total_bookings": bookings_response.count or 0,
-            "pending_bookings": pending_response.count or 0,
-            "total_visits": visits_response.count or 0,
-            "total_leaves": leaves_response.count or 0,
-            "total_queries": queries_response.count or 0,
-            "total_contacts": contacts_response.count or 0,
-        }
+        end_ts = analytics_epoch(end) if end else datetime.now(timezone.utc).timestamp()
+        # Two days of hours or a month of days by default.
+        start_ts = analytics_epoch(start) if start else end_ts - GRANULARITIES[granularity] * (48 if granularity == 'hour' else 30)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO 8601 timestamps")
+    return start_ts, end_ts
+
+@api_router.get("/admin/analytics/pages")
+async def get_analytics_pages(granularity: str = 'day', start: Optional[str] = None, end: Optional[str] = None):
+    return {"items": await analytics.query('page', granularity, *analytics_range(granularity, start, end))}
+
+@api_router.get("/admin/analytics/referrers")
+async def get_analytics_referrers(granularity: str = 'day', start: Optional[str] = None, end: Optional[str] = None):
+    return {"items": await analytics.query('referrer', granularity, *analytics_range(granularity, start, end))}
+
+@api_router.get("/admin/analytics/funnel")
+async def get_analytics_funnel(granularity: str = 'day', start: Optional[str] = None, end: Optional[str] = None):
+    return await analytics.funnel(granularity, *analytics_range(granularity, start, end))
+
+@api_router.get("/admin/analytics/status")
+async def get_analytics_status():
+    return analytics.stats()
+
+@api_router.post("/admin/analytics/recompute")
+async def recompute_analytics(start: str, end: Optional[str] = None):
+    start_ts, end_ts = analytics_range('hour', start, end)
+    # Only final hours are stored; newer ones are always served live.
+    end_ts = min(end_ts, analytics.watermark or end_ts)
+    return {"events": await analytics.recompute(start_ts, end_ts)}
+
+@api_router.get("/admin/archive")
+async def get_archive_status():
+    return archiver.stats()
+
+@api_router.post("/admin/archive/run")
+async def run_archive():
+    if not archiver.retain_days:
+        raise HTTPException(status_code=400, detail="Set EVENT_RETENTION_DAYS to enable archiving")
+    return {"archived": await archiver.run_once(), **archiver.stats()}
+
+EXPORT_MODELS = {
+    'demo_bookings': DemoBooking,
+    'subject_queries': SubjectQuery,
+    'contact_messages': ContactMessage,
+}
+
+@api_router.get("/admin/export/{table}")
+async def export_table(table: str, format: str = "ndjson", since: Optional[str] = None, gzip: bool = False):
+    if table not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    columns = list(EXPORT_MODELS[table].model_fields)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    filename = f"{table}-{stamp}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(repo, table, columns, format, since=since, compress=gzip),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@api_router.get("/admin/outbox")
+async def get_outbox_stats():
+    return outbox.stats()
+
+@api_router.post("/admin/outbox/{job_id}/retry")
+async def retry_outbox_job(job_id: str):
+    try:
+        if not await outbox.retry_dead(job_id):
+            return {"error": "Dead job not found"}
+        return {"message": "Job requeued"}
     except Exception as e:
-        logging.error(f"Error fetching stats: {e}")
-        return {
-            "total_bookings": 0,
-            "pending_bookings": 0,
-            "total_visits": 0,
-            "total_leaves": 0,
-            "total_queries": 0,
-            "total_contacts": 0,
-        }
+        logging.error(f"Error requeueing email job: {e}")
+        return {"error": "Failed to requeue job"}
+
+@api_router.get("/admin/dedup")
+async def get_dedup_stats():
+    return dedup.stats()
+
+@api_router.get("/admin/cache")
+async def get_cache_stats():
+    return responses.stats()
+
+@api_router.get("/admin/events")
+async def admin_events(last_event_id: Optional[str] = Header(None)):
+    # EventSource sends Last-Event-ID on reconnect; the stream resumes after it.
+    return StreamingResponse(
+        bus.stream(last_event_id, heartbeat=float(os.environ.get('ADMIN_EVENTS_HEARTBEAT', '15'))),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_router.get("/admin/events/stats")
+async def get_admin_events_stats():
+    return bus.stats()
+
+@api_router.get("/admin/ratelimit")
+async def get_rate_limit_stats():
+    return rate_limiter.stats() if rate_limiter else {"enabled": False}
+
+@api_router.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
 
 @api_router.get("/whatsapp-config")
 async def get_whatsapp_config():
@@ -300,6 +894,10 @@ async def get_whatsapp_config():
 
 app.include_router(api_router)
 
+# Added before CORS so that CORS wraps it and 429s still carry CORS headers.
+if rate_limiter:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -308,5 +906,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request timings include the other middleware. The event stream is
+# long-lived by design and would only distort the latency histograms.
+app.add_middleware(MetricsMiddleware, metrics=metrics, routes=app.routes, profiler=profiler,
+                   exclude=("/api/metrics", "/api/admin/events"))
+
+startup.mark("routes")
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -0,0 +1,282 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from breaker import is_outage
+from repository import Repository
+
+SUFFIX = ".spool"
+QUARANTINE_SUFFIX = ".quarantine"
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Spool:
+    """Durable holding area for lead rows the database would not take.
+
+    append() returns once the row is on disk. Each worker appends JSON lines
+    to its own file in directory and holds an flock on it; rows that arrive
+    while an fsync is running are written together with the next one, so a
+    burst costs one fsync per batch rather than per row.
+
+    replay() seals the worker's file and writes every unlocked file in the
+    directory back to the database in chunks, skipping rows whose id is
+    already there (a write that timed out may have landed), then deletes the
+    file. Files left by a worker that died are picked up the same way. Rows
+    the database refuses for a reason other than an outage are moved to a
+    .quarantine file next to it, in the same format, so they do not hold up
+    the rest; an outage stops the replay and leaves the files for next time.
+    """
+
+    def __init__(self, directory, repo: Optional[Repository] = None, replay_interval: float = 5.0,
+                 chunk_size: int = 500, ready=lambda: True):
+        self.directory = Path(directory)
+        self.repo = repo
+        self.replay_interval = replay_interval
+        self.chunk_size = chunk_size
+        # Checked before each scheduled replay, e.g. that the circuit is not open.
+        self.ready = ready
+        self._fd: Optional[int] = None
+        self._path: Optional[Path] = None
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._replaying = asyncio.Lock()
+        self._task = None
+        self.spooled = 0
+        self.fsyncs = 0
+        self.replayed = 0
+        self.already_stored = 0
+        self.quarantined = 0
+        self.last_error: Optional[str] = None
+
+    async def append(self, table: str, row: Dict[str, Any]) -> None:
+        line = json.dumps({"table": table, "row": row}, separators=(",", ":")).encode() + b"\n"
+        done = asyncio.get_running_loop().create_future()
+        self._pending.append((line, done))
+        if self._flushing is None:
+            self._flushing = asyncio.create_task(self._flush())
+        await asyncio.shield(done)
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    await asyncio.to_thread(self._write, b"".join(line for line, _ in batch))
+                except Exception as e:
+                    self.last_error = str(e)
+                    for _, done in batch:
+                        done.set_exception(e)
+                        done.exception()
+                    continue
+                self.spooled += len(batch)
+                for _, done in batch:
+                    done.set_result(None)
+        finally:
+            self._flushing = None
+
+    def _write(self, data: bytes) -> None:
+        if self._fd is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{os.getpid()}-{time.time_ns()}{SUFFIX}"
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            _fsync_dir(self.directory)
+            self._fd, self._path = fd, path
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+            os.fsync(self._fd)
+        except OSError:
+            # The file may end in a torn line now; later rows go to a new file.
+            os.close(self._fd)
+            self._fd = self._path = None
+            raise
+        self.fsyncs += 1
+
+    async def _seal(self) -> None:
+        # Lets the next append start a new file and this one be replayed. Runs
+        # between flushes so no write is in progress on the descriptor.
+        while self._flushing is not None:
+            await asyncio.shield(self._flushing)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = self._path = None
+
+    def files(self) -> List[Path]:
+        try:
+            return sorted(self.directory.glob(f"*{SUFFIX}"))
+        except OSError:
+            return []
+
+    def _bytes(self) -> int:
+        total = 0
+        for path in self.files():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def has_pending(self) -> bool:
+        return self._bytes() > 0
+
+    def _claim(self, path: Path) -> Optional[Tuple[int, List[Tuple[str, Dict[str, Any]]]]]:
+        """Locks a sealed file and reads its rows; None if a live worker still writes to it."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if os.fstat(fd).st_nlink == 0:
+                # Replayed and deleted by another worker while we waited to open it.
+                os.close(fd)
+                return None
+            with os.fdopen(os.dup(fd), "rb") as f:
+                data = f.read()
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except Exception:
+            os.close(fd)
+            raise
+        rows = []
+        for number, line in enumerate(data.splitlines(), 1):
+            try:
+                entry = json.loads(line)
+                rows.append((entry["table"], entry["row"]))
+            except (ValueError, KeyError, TypeError):
+                # A torn tail left by a crash or a failed write, which was never acknowledged.
+                logging.warning(f"Skipping unreadable line {number} of {path.name}")
+        return fd, rows
+
+    async def replay(self) -> int:
+        """Writes every spooled row to the database; returns how many were not there yet."""
+        async with self._replaying:
+            await self._seal()
+            written = 0
+            for path in self.files():
+                claimed = await asyncio.to_thread(self._claim, path)
+                if claimed is None:
+                    continue
+                fd, rows = claimed
+                try:
+                    file_written, refused = await self._replay_rows(rows)
+                    if refused:
+                        await asyncio.to_thread(self._quarantine, path, refused)
+                    path.unlink()
+                    _fsync_dir(self.directory)
+                finally:
+                    os.close(fd)
+                written += file_written
+                logging.info(f"Replayed {len(rows)} spooled rows from {path.name}")
+            return written
+
+    async def _replay_rows(self, rows: List[Tuple[str, Dict[str, Any]]]) -> Tuple[int, List[Tuple[str, Any]]]:
+        """Writes the rows missing from the database; returns how many, and the rows it refused."""
+        by_table: Dict[str, List[Dict[str, Any]]] = {}
+        for table, row in rows:
+            by_table.setdefault(table, []).append(row)
+        written, refused = 0, []
+        for table, table_rows in by_table.items():
+            for i in range(0, len(table_rows), self.chunk_size):
+                chunk = table_rows[i:i + self.chunk_size]
+                try:
+                    written += await self._write_missing(table, chunk)
+                    continue
+                except Exception as e:
+                    if is_outage(e):
+                        raise
+                # One bad row fails its whole chunk; one at a time, only that row is refused.
+                for row in chunk:
+                    try:
+                        written += await self._write_missing(table, [row])
+                    except Exception as e:
+                        if is_outage(e):
+                            raise
+                        logging.error(f"Database refused a spooled {table} row, quarantining it: {e}")
+                        refused.append((table, row))
+        return written, refused
+
+    async def _write_missing(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        stored = await self.repo.select(table, 'id', [('id', 'in', [row["id"] for row in rows])])
+        stored_ids = {row["id"] for row in stored}
+        missing = [row for row in rows if row["id"] not in stored_ids]
+        if missing:
+            await self.repo.insert(table, missing)
+        self.replayed += len(missing)
+        self.already_stored += len(rows) - len(missing)
+        return len(missing)
+
+    def _quarantine(self, path: Path, refused: List[Tuple[str, Any]]) -> None:
+        data = b"".join(json.dumps({"table": table, "row": row}, separators=(",", ":")).encode() + b"\n"
+                        for table, row in refused)
+        fd = os.open(path.with_suffix(QUARANTINE_SUFFIX), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        _fsync_dir(self.directory)
+        self.quarantined += len(refused)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Rows still spooled stay on disk for the next start.
+        await self._seal()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            try:
+                if self.ready() and await asyncio.to_thread(self.has_pending):
+                    await self.replay()
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Error replaying spooled rows: {e}")
+
+    def quarantine_files(self) -> List[Path]:
+        try:
+            return sorted(self.directory.glob(f"*{QUARANTINE_SUFFIX}"))
+        except OSError:
+            return []
+
+    def stats(self) -> Dict[str, Any]:
+        files = self.files()
+        return {
+            "directory": str(self.directory),
+            "files": len(files),
+            "bytes": self._bytes(),
+            "spooled": self.spooled,
+            "fsyncs": self.fsyncs,
+            "replayed": self.replayed,
+            "already_stored": self.already_stored,
+            "quarantined": self.quarantined,
+            "quarantine_files": [path.name for path in self.quarantine_files()],
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from migrations import MIGRATIONS, MIGRATIONS_COLUMNS, MIGRATIONS_TABLE, Migration, migrate_sqlite
+from repository import Filter, Repository, check_operator
+
+# Column name -> SQL type for every table the app uses. JSON columns are stored
+# as text and decoded on the way out so rows look the same as from PostgREST.
+SCHEMA: Dict[str, Dict[str, str]] = {
+    'demo_bookings': {
+        "id": "TEXT PRIMARY KEY", "name": "TEXT NOT NULL", "email": "TEXT NOT NULL", "phone": "TEXT",
+        "grade_level": "TEXT", "subject_interest": "TEXT", "preferred_date": "TEXT", "message": "TEXT",
+        "status": "TEXT DEFAULT 'pending'", "created_at": "TEXT",
+    },
+    'subject_queries': {
+        "id": "TEXT PRIMARY KEY", "name": "TEXT NOT NULL", "email": "TEXT NOT NULL", "phone": "TEXT",
+        "subject": "TEXT NOT NULL", "query_type": "TEXT DEFAULT 'general'", "message": "TEXT", "created_at": "TEXT",
+    },
+    'contact_messages': {
+        "id": "TEXT PRIMARY KEY", "name": "TEXT NOT NULL", "email": "TEXT NOT NULL", "phone": "TEXT",
+        "message": "TEXT NOT NULL", "created_at": "TEXT",
+    },
+    'visitor_events': {
+        "id": "TEXT PRIMARY KEY", "session_id": "TEXT NOT NULL", "event_type": "TEXT NOT NULL", "page": "TEXT",
+        "user_agent": "TEXT", "browser": "TEXT", "os": "TEXT", "device": "TEXT", "referrer": "TEXT",
+        "timestamp": "TEXT",
+    },
+    'visitor_rollups': {
+        "id": "TEXT PRIMARY KEY", "granularity": "TEXT NOT NULL", "bucket": "TEXT NOT NULL",
+        "dimension": "TEXT NOT NULL", "value": "TEXT NOT NULL", "visits": "INTEGER DEFAULT 0",
+        "leaves": "INTEGER DEFAULT 0", "dwell_seconds": "REAL DEFAULT 0", "dwell_count": "INTEGER DEFAULT 0",
+        "sessions": "INTEGER DEFAULT 0", "engaged": "INTEGER DEFAULT 0", "bookings": "INTEGER DEFAULT 0",
+        "updated_at": "TEXT",
+    },
+    'tutor_slots': {
+        "id": "TEXT PRIMARY KEY", "tutor": "TEXT NOT NULL", "slot_start": "TEXT NOT NULL",
+        "slot_end": "TEXT NOT NULL", "booking_id": "TEXT NOT NULL", "created_at": "TEXT",
+    },
+    'chat_unanswered': {
+        "id": "TEXT PRIMARY KEY", "question": "TEXT NOT NULL", "session_id": "TEXT", "created_at": "TEXT",
+    },
+    'email_outbox': {
+        "id": "TEXT PRIMARY KEY", "kind": "TEXT NOT NULL", "payload": "JSON NOT NULL",
+        "status": "TEXT DEFAULT 'pending'", "attempts": "INTEGER DEFAULT 0", "last_error": "TEXT",
+        "created_at": "TEXT", "updated_at": "TEXT",
+    },
+    MIGRATIONS_TABLE: MIGRATIONS_COLUMNS,
+}
+
+# Indexes from the original DDL, as (table, columns). Later ones are in migrations.py.
+INDEXES: List[Tuple[str, Tuple[str, ...]]] = [
+    ('visitor_events', ('timestamp', 'id')),
+    ('tutor_slots', ('slot_start', 'id')),
+    ('tutor_slots', ('booking_id',)),
+]
+
+SQL_OPERATORS = {"eq": "=", "neq": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+
+class SQLiteRepository(Repository):
+    """Embedded engine for offline runs, tests and benchmarks.
+
+    One connection in WAL mode, used from a single dedicated thread so calls
+    never block the event loop and never share the connection across threads.
+    Statements are built deterministically from the arguments, so repeated
+    calls hit sqlite3's per-connection prepared statement cache.
+    """
+
+    def __init__(self, path: str = ':memory:', schema: Dict[str, Dict[str, str]] = SCHEMA,
+                 indexes: Sequence[Tuple[str, Tuple[str, ...]]] = INDEXES,
+                 migrations: Sequence[Migration] = MIGRATIONS):
+        self.schema = schema
+        self.indexes = indexes
+        self.migrations = migrations
+        self._json = {table: [name for name, kind in columns.items() if kind.startswith("JSON")]
+                      for table, columns in schema.items()}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._db = self._executor.submit(self._connect, path).result()
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, isolation_level=None, cached_statements=512, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        for table, columns in self.schema.items():
+            body = ", ".join(f'"{name}" {kind}' for name, kind in columns.items())
+            db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({body})')
+        for table, columns in self.indexes:
+            names = ", ".join(f'"{c}"' for c in columns)
+            db.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{"_".join(columns)}" ON "{table}" ({names})')
+        migrate_sqlite(db, self.migrations)
+        return db
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _columns(self, table: str) -> Dict[str, str]:
+        try:
+            return self.schema[table]
+        except KeyError:
+            raise ValueError(f"Unknown table: {table}")
+
+    def _column(self, table: str, name: str) -> str:
+        if name not in self._columns(table):
+            raise ValueError(f"Unknown column {table}.{name}")
+        return f'"{name}"'
+
+    def _projection(self, table: str, columns: str) -> str:
+        if columns.strip() == "*":
+            return "*"
+        return ", ".join(self._column(table, c.strip()) for c in columns.split(","))
+
+    def _where(self, table: str, where: Sequence[Filter]) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        for column, op, value in where:
+            check_operator(op)
+            name = self._column(table, column)
+            if op == "in":
+                values = list(value)
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{name} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            elif op == "is":
+                clauses.append(f"{name} IS ?")
+                params.append(value)
+            else:
+                clauses.append(f"{name} {SQL_OPERATORS[op]} ?")
+                params.append(value)
+        return clauses, params
+
+    def _encode(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        columns = self._columns(table)
+        return {k: json.dumps(v) if columns.get(k, "").startswith("JSON") and v is not None else v
+                for k, v in row.items()}
+
+    def _decode(self, table: str, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        self._columns(table)
+        out = list(map(dict, rows))
+        for key in self._json[table]:
+            for item in out:
+                value = item.get(key)
+                if isinstance(value, str):
+                    item[key] = json.loads(value)
+        return out
+
+    def _insert(self, table: str, rows: List[Dict[str, Any]], on_conflict: Optional[str] = None) -> None:
+        if not rows:
+            return
+        keys = list(rows[0])
+        names = ", ".join(self._column(table, k) for k in keys)
+        sql = f'INSERT INTO "{table}" ({names}) VALUES ({", ".join("?" * len(keys))})'
+        if on_conflict:
+            target = ", ".join(self._column(table, c.strip()) for c in on_conflict.split(","))
+            assignments = ", ".join(f"{self._column(table, k)} = excluded.{self._column(table, k)}" for k in keys)
+            sql += f" ON CONFLICT ({target}) DO UPDATE SET {assignments}"
+        encoded = [self._encode(table, row) for row in rows]
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(sql, [[row.get(k) for k in keys] for row in encoded])
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _select(self, table, columns, where, order, limit, after):
+        clauses, params = self._where(table, where)
+        if after is not None:
+            # Row-value comparison: (a, b) < (x, y) when every order column is descending.
+            directions = {desc for _, desc in order}
+            if len(directions) != 1 or len(after) != len(order):
+                raise ValueError("Keyset pagination needs one direction and one value per order column")
+            names = ", ".join(self._column(table, c) for c, _ in order)
+            clauses.append(f"({names}) {'<' if directions.pop() else '>'} ({', '.join('?' * len(after))})")
+            params.extend(after)
+        sql = f'SELECT {self._projection(table, columns)} FROM "{table}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order:
+            sql += " ORDER BY " + ", ".join(f"{self._column(table, c)} {'DESC' if d else 'ASC'}" for c, d in order)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._decode(table, self._db.execute(sql, params).fetchall())
+
+    def _update(self, table, values, where):
+        clauses, params = self._where(table, where)
+        encoded = self._encode(table, values)
+        assignments = ", ".join(f"{self._column(table, k)} = ?" for k in encoded)
+        sql = f'UPDATE "{table}" SET {assignments}'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self._decode(table, self._db.execute(sql + " RETURNING *", list(encoded.values()) + params).fetchall())
+
+    def _delete(self, table, where):
+        clauses, params = self._where(table, where)
+        sql = f'DELETE FROM "{table}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self._decode(table, self._db.execute(sql + " RETURNING *", params).fetchall())
+
+    def _count(self, table, where):
+        clauses, params = self._where(table, where)
+        sql = f'SELECT COUNT(*) FROM "{table}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self._db.execute(sql, params).fetchone()[0]
+
+    async def insert(self, table, rows):
+        await self._run(self._insert, table, rows if isinstance(rows, list) else [rows])
+
+    async def upsert(self, table, rows, on_conflict="id"):
+        await self._run(self._insert, table, rows if isinstance(rows, list) else [rows], on_conflict)
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        return await self._run(self._select, table, columns, where, order, limit, after)
+
+    async def update(self, table, values, where):
+        return await self._run(self._update, table, values, where)
+
+    async def delete(self, table, where):
+        return await self._run(self._delete, table, where)
+
+    async def count(self, table, where=()):
+        return await self._run(self._count, table, where)
+
+    async def aclose(self):
+        await self._run(self._db.close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,53 @@
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+
+class StartupReport:
+    """Where a worker's cold start went, for GET /api/admin/startup and serve.py --check.
+
+    Created first thing in server.py; mark() closes an import-time phase and
+    phase() times one step of the lifespan.
+    """
+
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget
+        self.phases: List[Tuple[str, float]] = []
+        self._started = self._last = time.perf_counter()
+        self.ready_seconds: Optional[float] = None
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @asynccontextmanager
+    async def phase(self, name: str) -> AsyncIterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def ready(self) -> None:
+        """The lifespan finished starting up; logs the breakdown, as a warning when over budget."""
+        self.ready_seconds = time.perf_counter() - self._started
+        summary = ", ".join(f"{name} {seconds * 1e3:.0f} ms" for name, seconds in self.phases)
+        message = f"Worker ready in {self.ready_seconds:.2f}s ({summary})"
+        if self.over_budget:
+            logging.warning(f"{message}, over the {self.budget:.2f}s startup budget")
+        else:
+            logging.info(message)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.ready_seconds is not None and self.ready_seconds > self.budget
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready_seconds": round(self.ready_seconds, 4) if self.ready_seconds is not None else None,
+            "budget_seconds": self.budget,
+            "over_budget": self.over_budget,
+            "phases": [{"name": name, "seconds": round(seconds, 4)} for name, seconds in self.phases],
+        }
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from repository import Repository
+
+# Counter name -> (table, filters) used for exact recounts.
+COUNTER_QUERIES = {
+    "total_bookings": ('demo_bookings', []),
+    "pending_bookings": ('demo_bookings', [('status', 'eq', 'pending')]),
+    "total_visits": ('visitor_events', [('event_type', 'eq', 'visit')]),
+    "total_leaves": ('visitor_events', [('event_type', 'eq', 'leave')]),
+    "total_queries": ('subject_queries', []),
+    "total_contacts": ('contact_messages', []),
+}
+
+EVENT_COUNTERS = {"visit": "total_visits", "leave": "total_leaves"}
+
+
+class StatsStore:
+    """Admin counters kept in memory.
+
+    Seeded with one exact recount at startup, then moved by the write handlers
+    and re-verified against the database every verify_interval seconds. Writes
+    that land while a recount is in flight may be counted twice or not at all;
+    the next verification corrects that.
+    """
+
+    def __init__(self, repo: Repository, verify_interval: float = 300.0):
+        self.repo = repo
+        self.verify_interval = verify_interval
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTER_QUERIES, 0)
+        self.verified_at: Optional[datetime] = None
+        self._verified_mono: Optional[float] = None
+        self._task = None
+        # Called with {name: new value} for the counters each change touched.
+        self.listeners: List[Callable[[Dict[str, int]], None]] = []
+        # Per event_type counts of visitor events moved out of the table into the archive.
+        self.archived_events: Callable[[], Dict[str, int]] = dict
+
+    def _apply(self, deltas: Dict[str, int]) -> None:
+        for name, delta in deltas.items():
+            self.counters[name] += delta
+        self._notify(deltas)
+
+    def _notify(self, names: Iterable[str]) -> None:
+        changed = {name: self.counters[name] for name in names}
+        if not changed:
+            return
+        for listener in self.listeners:
+            listener(changed)
+
+    def incr(self, name: str, delta: int = 1) -> None:
+        self._apply({name: delta})
+
+    def booking_created(self, status: str = 'pending') -> None:
+        self._apply({"total_bookings": 1, **({"pending_bookings": 1} if status == 'pending' else {})})
+
+    def booking_deleted(self, status: str) -> None:
+        self.bookings_deleted([status])
+
+    def bookings_deleted(self, statuses: Iterable[str]) -> None:
+        # One change for the whole batch, so listeners see one update instead of one per row.
+        statuses = list(statuses)
+        if not statuses:
+            return
+        pending = statuses.count('pending')
+        self._apply({"total_bookings": -len(statuses), **({"pending_bookings": -pending} if pending else {})})
+
+    def booking_status_changed(self, old: str, new: str) -> None:
+        self.bookings_status_changed([old], new)
+
+    def bookings_status_changed(self, old_statuses: Iterable[str], new: str) -> None:
+        moved = [old for old in old_statuses if old != new]
+        if new == 'pending':
+            delta = len(moved)
+        else:
+            delta = -moved.count('pending')
+        if delta:
+            self.incr("pending_bookings", delta)
+
+    def events_flushed(self, events: Iterable[Dict[str, Any]]) -> None:
+        deltas: Dict[str, int] = {}
+        for event in events:
+            name = EVENT_COUNTERS.get(event.get("event_type"))
+            if name:
+                deltas[name] = deltas.get(name, 0) + 1
+        self._apply(deltas)
+
+    async def recount(self) -> Dict[str, int]:
+        names = list(COUNTER_QUERIES)
+        results = await asyncio.gather(*[self.repo.count(*COUNTER_QUERIES[name]) for name in names])
+        fresh = dict(zip(names, results))
+        for event_type, count in self.archived_events().items():
+            if event_type in EVENT_COUNTERS:
+                fresh[EVENT_COUNTERS[event_type]] += count
+        drift = {name: fresh[name] - self.counters[name] for name in names if fresh[name] != self.counters[name]}
+        if drift and self.verified_at is not None:
+            logging.warning(f"Stats counters drifted from database: {drift}")
+        self.counters = fresh
+        self._notify(drift)
+        self.verified_at = datetime.now(timezone.utc)
+        self._verified_mono = time.monotonic()
+        return fresh
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = dict(self.counters)
+        if self.verified_at is None:
+            snapshot["verified_at"] = None
+            snapshot["stale_seconds"] = None
+        else:
+            snapshot["verified_at"] = self.verified_at.isoformat()
+            snapshot["stale_seconds"] = round(time.monotonic() - self._verified_mono, 3)
+        return snapshot
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.recount()
+            except Exception as e:
+                logging.error(f"Error recounting stats: {e}")
+            await asyncio.sleep(self.verify_interval)
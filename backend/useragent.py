@@ -0,0 +1,140 @@
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+# Crawlers, link previews, uptime checks and HTTP libraries, matched per word
+# of the string: a word starting or ending with one of BOT_WORDS ("googlebot",
+# "crawler") or equal to one of BOT_NAMES is the bot's name. A bot word inside
+# a word ("cubot_x30") does not count, and neither does the device model an
+# Android browser reports, which is a phone's name even when it is "CUBOT P40".
+# "Test Agent 1.0" style strings from scripts that do not announce themselves
+# are left to the rate limiter.
+BOT_WORDS = ("bot", "crawl", "spider", "slurp", "scraper", "fetcher", "monitor", "checker", "preview", "validator",
+             "headless", "lighthouse", "pagespeed")
+BOT_NAMES = frozenset((
+    "facebookexternalhit", "facebookcatalog", "whatsapp", "embedly", "phantomjs", "gtmetrix", "pingdom",
+    "statuscake", "site24x7", "curl", "wget", "httpie", "python-requests", "python-urllib", "aiohttp", "httpx",
+    "go-http-client", "okhttp", "java", "apache-httpclient", "node-fetch", "axios", "undici", "postmanruntime",
+    "insomnia", "scrapy", "selenium", "puppeteer", "playwright", "libwww-perl",
+))
+BOT_WORD = re.compile("|".join(BOT_WORDS))
+DEVICE_MODEL = re.compile(r"(android[^;)]*;)[^;)]*")
+WORD = re.compile(r"[a-z][a-z0-9._-]*")
+# First match wins, so the browsers that also claim to be Chrome or Safari come first.
+BROWSERS: Sequence[Tuple[str, Pattern]] = [
+    (name, re.compile(pattern)) for name, pattern in (
+        ("edge", r"Edg(?:e|A|iOS)?/"),
+        ("opera", r"OPR/|Opera|OPT/"),
+        ("samsung", r"SamsungBrowser/"),
+        ("uc", r"UCBrowser/"),
+        ("firefox", r"Firefox/|FxiOS/"),
+        ("chrome", r"Chrome/|CriOS/|Chromium/"),
+        ("safari", r"Version/[\d.]+.*Safari/"),
+    )
+]
+SYSTEMS: Sequence[Tuple[str, Pattern]] = [
+    (name, re.compile(pattern)) for name, pattern in (
+        ("windows", r"Windows"),
+        ("android", r"Android"),
+        ("ios", r"iPhone|iPad|iPod"),
+        ("chromeos", r"CrOS"),
+        ("macos", r"Macintosh|Mac OS X"),
+        ("linux", r"Linux|X11"),
+    )
+]
+TABLET = re.compile(r"iPad|Tablet|Android(?!.*Mobile)")
+MOBILE = re.compile(r"Mobi|iPhone|iPod")
+# Longer strings are cut before lookup so a client cannot grow the cache with huge keys.
+MAX_LENGTH = 512
+# Distinct bot names counted; made-up names past this are counted as "other".
+MAX_BOT_NAMES = 1000
+
+
+class Agent(NamedTuple):
+    bot: Optional[str]
+    browser: str
+    os: str
+    device: str
+
+
+UNKNOWN = Agent(None, "", "", "")
+
+
+def first_match(rules: Sequence[Tuple[str, Pattern]], user_agent: str) -> str:
+    for name, pattern in rules:
+        if pattern.search(user_agent):
+            return name
+    return "other"
+
+
+def bot_name(user_agent: str) -> Optional[str]:
+    lowered = user_agent.lower()
+    if "android" in lowered:
+        lowered = DEVICE_MODEL.sub(r"\1", lowered)
+    for hit in BOT_WORD.finditer(lowered):
+        start, end = hit.span()
+        if lowered[start - 1:start].isalnum() and (lowered[end:end + 1].isalnum() or lowered[end:end + 1] == "_"):
+            continue
+        return next((word.group(0) for word in WORD.finditer(lowered) if word.start() <= start < word.end()),
+                    hit.group(0))
+    names = BOT_NAMES.intersection(WORD.findall(lowered))
+    return min(names) if names else None
+
+
+def parse(user_agent: str) -> Agent:
+    """Bot name, or browser family, OS and device class of a User-Agent string."""
+    if not user_agent:
+        return UNKNOWN
+    bot = bot_name(user_agent)
+    if bot is not None:
+        return Agent(bot, "", "", "bot")
+    device = "tablet" if TABLET.search(user_agent) else "mobile" if MOBILE.search(user_agent) else "desktop"
+    return Agent(None, first_match(BROWSERS, user_agent), first_match(SYSTEMS, user_agent), device)
+
+
+class UserAgentClassifier:
+    """parse() behind a bounded LRU keyed on the raw string.
+
+    A handful of browser builds send most of the traffic, so almost every
+    lookup is a dict hit; only misses run the regexes, and their cost is
+    timed. Bot hits are counted here per bot name and never written.
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Agent]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.parse_ns = 0
+        self.bots: Counter = Counter()
+
+    def classify(self, user_agent: str) -> Agent:
+        key = user_agent[:MAX_LENGTH]
+        agent = self._cache.get(key)
+        if agent is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            started = time.perf_counter_ns()
+            agent = parse(key)
+            self.parse_ns += time.perf_counter_ns() - started
+            self._cache[key] = agent
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if agent.bot is not None:
+            self.bots[agent.bot if agent.bot in self.bots or len(self.bots) < MAX_BOT_NAMES else "other"] += 1
+        return agent
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cache_entries": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "parse_us_avg": round(self.parse_ns / self.misses / 1000, 2) if self.misses else None,
+            "bot_hits": sum(self.bots.values()),
+            "bots": dict(self.bots.most_common(20)),
+        }
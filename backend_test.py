@@ -1,11 +1,14 @@
 import requests
+import os
 import sys
 import json
 from datetime import datetime, timedelta
+from pathlib import Path
 
 class LearnSphereAPITester:
-    def __init__(self, base_url="https://lesson-master-8.preview.emergentagent.com/api"):
+    def __init__(self, base_url, http=requests):
         self.base_url = base_url
+        self.http = http
         self.tests_run = 0
         self.tests_passed = 0
         self.test_results = []
@@ -21,13 +24,13 @@ class LearnSphereAPITester:
         
         try:
             if method == 'GET':
-                response = requests.get(url, headers=headers, timeout=10)
+                response = self.http.get(url, headers=headers, timeout=10)
             elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=10)
+                response = self.http.post(url, json=data, headers=headers, timeout=10)
             elif method == 'DELETE':
-                response = requests.delete(url, headers=headers, timeout=10)
+                response = self.http.delete(url, headers=headers, timeout=10)
             elif method == 'PATCH':
-                response = requests.patch(url, json=data, headers=headers, timeout=10)
+                response = self.http.patch(url, json=data, headers=headers, timeout=10)
 
             success = response.status_code == expected_status
             response_data = {}
@@ -95,7 +98,7 @@ class LearnSphereAPITester:
             "Visitor Track (Visit)",
             "POST",
             "/visitors/track",
-            200,
+            202,
             data={
                 "session_id": session_id,
                 "event_type": "visit",
@@ -103,7 +106,7 @@ class LearnSphereAPITester:
                 "user_agent": "Test Agent 1.0",
                 "referrer": "https://google.com"
             },
-            test_response_content=lambda r: r.get("status") == "tracked"
+            test_response_content=lambda r: r.get("status") == "accepted"
         )
         
         # Test leave tracking
@@ -111,7 +114,7 @@ class LearnSphereAPITester:
             "Visitor Track (Leave)",
             "POST",
             "/visitors/track",
-            200,
+            202,
             data={
                 "session_id": session_id,
                 "event_type": "leave",
@@ -119,7 +122,7 @@ class LearnSphereAPITester:
                 "user_agent": "Test Agent 1.0",
                 "referrer": ""
             },
-            test_response_content=lambda r: r.get("status") == "tracked"
+            test_response_content=lambda r: r.get("status") == "accepted"
         )
         
         return visit_success and leave_success
@@ -165,9 +168,9 @@ class LearnSphereAPITester:
             "/demo-bookings",
             200,
             test_response_content=lambda r: (
-                isinstance(r, list) and
-                len(r) > 0 and
-                any(b["id"] == booking_id for b in r)
+                isinstance(r.get("items"), list) and
+                len(r["items"]) > 0 and
+                any(b["id"] == booking_id for b in r["items"])
             )
         )
         
@@ -244,7 +247,7 @@ class LearnSphereAPITester:
             "GET",
             "/subject-queries",
             200,
-            test_response_content=lambda r: isinstance(r, list)
+            test_response_content=lambda r: isinstance(r.get("items"), list)
         )
         
         return create_success and get_success
@@ -276,7 +279,7 @@ class LearnSphereAPITester:
             "GET",
             "/contact-messages",
             200,
-            test_response_content=lambda r: isinstance(r, list)
+            test_response_content=lambda r: isinstance(r.get("items"), list)
         )
         
         return create_success and get_success
@@ -294,12 +297,29 @@ class LearnSphereAPITester:
             )
         )
 
+def local_client():
+    """Runs the app in-process against a throwaway embedded database."""
+    os.environ.setdefault("DB_BACKEND", "sqlite")
+    os.environ.setdefault("SQLITE_PATH", ":memory:")
+    os.environ.setdefault("RESEND_API_KEY", "")
+    sys.path.insert(0, str(Path(__file__).parent / "backend"))
+    from fastapi.testclient import TestClient
+    import server
+    return TestClient(server.app)
+
 def main():
     print("🚀 Starting LearnSphere Backend API Tests")
     print("=" * 50)
-    
-    tester = LearnSphereAPITester()
-    
+
+    # Pass a deployed API base (or set BACKEND_URL) to test a live server;
+    # with neither, the app is started in-process on SQLite.
+    base_url = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("BACKEND_URL")
+    if base_url:
+        return run_all(LearnSphereAPITester(base_url.rstrip("/")))
+    with local_client() as client:
+        return run_all(LearnSphereAPITester("/api", http=client))
+
+def run_all(tester):
     # Run all tests
     print("\n📍 Testing Basic Connectivity...")
     tester.test_root_endpoint()
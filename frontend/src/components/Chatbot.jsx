@@ -1,31 +1,12 @@
 import { useState, useRef, useEffect } from "react";
+import axios from "axios";
 import { MessageCircle, X, Send, Bot, User } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 
-const faqData = [
-  { keywords: ["hello", "hi", "hey", "start"], answer: "Hello! Welcome to LearnSphere. How can I help you today? You can ask about our subjects, tutors, pricing, scheduling, or anything else!" },
-  { keywords: ["subject", "course", "teach", "offer", "what do you"], answer: "We offer 25+ subjects including Mathematics, Physics, Chemistry, Biology, English, Computer Science, History, and Music. Visit our Subjects page to explore all options and find detailed descriptions." },
-  { keywords: ["tutor", "teacher", "instructor", "faculty"], answer: "Our tutors are handpicked experts with advanced degrees and minimum 5 years of teaching experience. Only the top 5% of applicants are selected. Visit the Teachers page to browse profiles and find your perfect match." },
-  { keywords: ["price", "cost", "fee", "payment", "pay", "how much"], answer: "We offer flexible pricing plans. Your first demo session is completely FREE! Contact us at +91-7009201851 for detailed pricing based on your subject and grade level." },
-  { keywords: ["book", "demo", "trial", "free", "start", "sign up", "register"], answer: "Booking a free demo is easy! Click the 'Book a Free Demo' button on any page, fill in your details, and we'll schedule a personalized session for you. No credit card required!" },
-  { keywords: ["schedule", "time", "when", "available", "reschedule", "cancel"], answer: "Sessions are flexible! Browse your tutor's real-time availability and pick a slot that works for you. You can reschedule or cancel up to 4 hours before your session at no extra cost." },
-  { keywords: ["material", "notes", "resource", "download", "study"], answer: "After every session, your tutor uploads personalized notes, practice worksheets, and supplementary materials to your dashboard. You can access and download them anytime!" },
-  { keywords: ["refund", "money back", "not satisfied", "guarantee"], answer: "If you're not satisfied with your first paid session, we offer a full refund or a free replacement session with a different tutor. Your satisfaction is our top priority." },
-  { keywords: ["contact", "phone", "call", "reach", "email", "whatsapp"], answer: "Reach us at:\nPhone: +91-7009201851 / +91-9878035355\nEmail: tutorviaa@gmail.com\nOr chat on WhatsApp for quick responses!" },
-  { keywords: ["how", "work", "process", "steps"], answer: "It's simple: 1) Browse tutors & subjects, 2) Book a session, 3) Attend your live 1-on-1 lesson, 4) Access study materials, 5) Track your progress. Visit the How It Works page for details!" },
-  { keywords: ["age", "grade", "level", "class", "kid", "child", "parent"], answer: "We cater to all levels: Grade 1-12, college, and competitive exam prep (JEE, NEET, SAT, GRE). Parents can book sessions for their children and track their progress." },
-];
+const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
-const getResponse = (input) => {
-  const lower = input.toLowerCase();
-  for (const faq of faqData) {
-    if (faq.keywords.some((kw) => lower.includes(kw))) {
-      return faq.answer;
-    }
-  }
-  return "I'm not sure about that, but I'd love to help! You can reach our team directly at +91-7009201851 or +91-9878035355 for personalized assistance. You can also ask me about subjects, tutors, pricing, scheduling, or bookings.";
-};
+const OFFLINE_REPLY = "Sorry, I couldn't reach our help desk just now. You can call us at +91-7009201851 or +91-9878035355, or try again in a moment.";
 
 export const Chatbot = () => {
   const [open, setOpen] = useState(false);
@@ -33,20 +14,32 @@ export const Chatbot = () => {
     { role: "bot", text: "Hi there! I'm the LearnSphere assistant. How can I help you today?" },
   ]);
   const [input, setInput] = useState("");
+  const [sending, setSending] = useState(false);
   const scrollRef = useRef(null);
 
   useEffect(() => {
     scrollRef.current?.scrollTo({ top: scrollRef.current.scrollHeight, behavior: "smooth" });
   }, [messages]);
 
-  const handleSend = () => {
-    if (!input.trim()) return;
-    const userMsg = input.trim();
+  const handleSend = async () => {
+    if (!input.trim() || sending) return;
+    const userMsg = input.trim().slice(0, 1000);
     setMessages((prev) => [...prev, { role: "user", text: userMsg }]);
     setInput("");
-    setTimeout(() => {
-      setMessages((prev) => [...prev, { role: "bot", text: getResponse(userMsg) }]);
-    }, 500);
+    setSending(true);
+    let reply = OFFLINE_REPLY;
+    try {
+      const res = await axios.post(`${API}/chat`, {
+        message: userMsg,
+        session_id: sessionStorage.getItem("visitor_session") || "",
+      });
+      reply = res.data.answer;
+    } catch {
+      // Keep the offline reply.
+    } finally {
+      setMessages((prev) => [...prev, { role: "bot", text: reply }]);
+      setSending(false);
+    }
   };
 
   return (
@@ -104,7 +97,7 @@ export const Chatbot = () => {
                 placeholder="Type your question..."
                 className="flex-1 bg-[#F9F8F6] border-[#E2E0D6] text-sm h-9"
               />
-              <Button data-testid="chatbot-send-btn" type="submit" size="icon" className="bg-[#2F5D62] hover:bg-[#23464A] h-9 w-9 shrink-0">
+              <Button data-testid="chatbot-send-btn" type="submit" size="icon" disabled={sending} className="bg-[#2F5D62] hover:bg-[#23464A] h-9 w-9 shrink-0">
                 <Send className="w-4 h-4" />
               </Button>
             </form>
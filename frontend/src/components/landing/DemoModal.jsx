@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { useForm } from "react-hook-form";
 import { zodResolver } from "@hookform/resolvers/zod";
 import { z } from "zod";
@@ -30,12 +30,18 @@ const demoSchema = z.object({
 const gradeOptions = ["Grade 1-5", "Grade 6-8", "Grade 9-10", "Grade 11-12", "College", "Competitive Exams", "Other"];
 const subjectOptions = ["Mathematics", "Physics", "Chemistry", "Biology", "English", "Computer Science", "History", "Music", "Other"];
 
-export const DemoModal = ({ open, onOpenChange, defaultSubject = "" }) => {
+export const DemoModal = ({ open, onOpenChange, defaultSubject = "", tutor = "" }) => {
   const [submitted, setSubmitted] = useState(false);
   const [loading, setLoading] = useState(false);
   const [selectedDate, setSelectedDate] = useState(null);
   const [calendarOpen, setCalendarOpen] = useState(false);
   const [bookingName, setBookingName] = useState("");
+  // Open times with this tutor on the chosen day (GET /api/slots); booking one reserves it
+  const [slots, setSlots] = useState([]);
+  const [selectedSlot, setSelectedSlot] = useState(null);
+  const [slotsVersion, setSlotsVersion] = useState(0);
+  // One key per filled-in form, so double-clicks and retries create a single booking
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
 
   const { register, handleSubmit, setValue, formState: { errors }, reset } = useForm({
     resolver: zodResolver(demoSchema),
@@ -47,24 +53,48 @@ export const DemoModal = ({ open, onOpenChange, defaultSubject = "" }) => {
     if (defaultSubject) setValue("subject_interest", defaultSubject);
   }, [defaultSubject]);
 
+  useEffect(() => {
+    if (!open || !tutor || !selectedDate) { setSlots([]); return; }
+    let cancelled = false;
+    const start = new Date(selectedDate);
+    start.setHours(0, 0, 0, 0);
+    const end = new Date(start);
+    end.setDate(end.getDate() + 1);
+    axios.get(`${API}/slots`, { params: { tutor, start: start.toISOString(), end: end.toISOString(), limit: 24 } })
+      .then((res) => { if (!cancelled) setSlots(res.data.items); })
+      .catch(() => { if (!cancelled) setSlots([]); });
+    return () => { cancelled = true; };
+  }, [open, tutor, selectedDate, slotsVersion]);
+
   const onSubmit = async (data) => {
     setLoading(true);
+    const body = selectedSlot ? { ...data, tutor: selectedSlot.tutor, slot_start: selectedSlot.start } : data;
     try {
-      await axios.post(`${API}/demo-bookings`, data);
+      await axios.post(`${API}/demo-bookings`, body, {
+        headers: { "Idempotency-Key": idempotencyKey, "X-Session-Id": sessionStorage.getItem("visitor_session") || "" },
+      });
+      setIdempotencyKey(crypto.randomUUID());
       setBookingName(data.name);
       setSubmitted(true);
       toast.success("Demo booked successfully! We'll reach out shortly.");
       reset();
       setSelectedDate(null);
-    } catch {
-      toast.error("Something went wrong. Please try again.");
+      setSelectedSlot(null);
+    } catch (err) {
+      if (err.response?.status === 409) {
+        toast.error("That time was just booked. Please pick another one.");
+        setSelectedSlot(null);
+        setSlotsVersion((v) => v + 1);
+      } else {
+        toast.error("Something went wrong. Please try again.");
+      }
     } finally {
       setLoading(false);
     }
   };
 
   const handleClose = (val) => {
-    if (!val) { setSubmitted(false); reset(); setSelectedDate(null); setBookingName(""); }
+    if (!val) { setSubmitted(false); reset(); setSelectedDate(null); setSelectedSlot(null); setBookingName(""); }
     onOpenChange(val);
   };
 
@@ -161,12 +191,31 @@ export const DemoModal = ({ open, onOpenChange, defaultSubject = "" }) => {
                     data-testid="demo-calendar"
                     mode="single"
                     selected={selectedDate}
-                    onSelect={(date) => { setSelectedDate(date); setValue("preferred_date", date ? format(date, "yyyy-MM-dd") : "", { shouldValidate: true }); setCalendarOpen(false); }}
+                    onSelect={(date) => { setSelectedDate(date); setSelectedSlot(null); setValue("preferred_date", date ? format(date, "yyyy-MM-dd") : "", { shouldValidate: true }); setCalendarOpen(false); }}
                     disabled={(date) => date < new Date()}
                     initialFocus
                   />
                 </PopoverContent>
               </Popover>
+              {tutor && selectedDate && (
+                <div className="flex flex-wrap gap-2 pt-1" data-testid="demo-slots">
+                  {slots.length === 0 ? (
+                    <p className="text-xs text-[#6B7280]">No open times that day. We'll call you to arrange one.</p>
+                  ) : slots.map((slot) => (
+                    <Button
+                      key={slot.start}
+                      type="button"
+                      size="sm"
+                      variant="outline"
+                      data-testid="demo-slot-btn"
+                      onClick={() => setSelectedSlot(selectedSlot?.start === slot.start ? null : slot)}
+                      className={`rounded-full border-[#E2E0D6] ${selectedSlot?.start === slot.start ? "bg-[#2F5D62] text-white hover:bg-[#23464A] hover:text-white" : "bg-white text-[#2C3333]"}`}
+                    >
+                      {format(new Date(slot.start), "p")}
+                    </Button>
+                  ))}
+                </div>
+              )}
               {errors.preferred_date && <p className="text-xs text-red-500">{errors.preferred_date.message}</p>}
             </div>
 
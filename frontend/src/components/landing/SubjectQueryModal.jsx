@@ -14,6 +14,8 @@ export const SubjectQueryModal = ({ open, onOpenChange, subject = "" }) => {
   const [loading, setLoading] = useState(false);
   const [submitted, setSubmitted] = useState(false);
   const [form, setForm] = useState({ name: "", email: "", phone: "", query_type: "general", message: "" });
+  // One key per filled-in form, so double-clicks and retries create a single query
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -23,7 +25,8 @@ export const SubjectQueryModal = ({ open, onOpenChange, subject = "" }) => {
     }
     setLoading(true);
     try {
-      await axios.post(`${API}/subject-queries`, { ...form, subject });
+      await axios.post(`${API}/subject-queries`, { ...form, subject }, { headers: { "Idempotency-Key": idempotencyKey } });
+      setIdempotencyKey(crypto.randomUUID());
       setSubmitted(true);
       toast.success("Query submitted! We'll get back to you shortly.");
       setForm({ name: "", email: "", phone: "", query_type: "general", message: "" });
@@ -1,17 +1,51 @@
 import { useState, useEffect } from "react";
 import axios from "axios";
-import { ArrowLeft, Users, CalendarDays, Eye, Clock, Trash2, Loader2 } from "lucide-react";
+import { ArrowLeft, Users, CalendarDays, Eye, Clock, Trash2, Loader2, Search } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
+import { Checkbox } from "@/components/ui/checkbox";
+import { Input } from "@/components/ui/input";
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table";
 import { toast } from "sonner";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const LEAD_TABLES = {
+  demo_bookings: "Booking",
+  subject_queries: "Query",
+  contact_messages: "Contact",
+};
 
 export default function AdminPage() {
   const [stats, setStats] = useState(null);
   const [bookings, setBookings] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [selected, setSelected] = useState(new Set());
+  const [bulkBusy, setBulkBusy] = useState(false);
+  const [query, setQuery] = useState("");
+  const [results, setResults] = useState(null);
+
+  useEffect(() => {
+    const q = query.trim();
+    if (q.length < 2) {
+      setResults(null);
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const res = await axios.get(`${API}/admin/search`, { params: { q } });
+        if (!cancelled) setResults(res.data);
+      } catch {
+        if (!cancelled) setResults({ total: 0, items: [] });
+      }
+    }, 200);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [query]);
 
   const fetchData = async () => {
     try {
@@ -20,7 +54,8 @@ export default function AdminPage() {
         axios.get(`${API}/demo-bookings`),
       ]);
       setStats(statsRes.data);
-      setBookings(bookingsRes.data);
+      setBookings(bookingsRes.data.items);
+      setNextCursor(bookingsRes.data.next_cursor);
     } catch {
       toast.error("Failed to load admin data");
     } finally {
@@ -28,18 +63,95 @@ export default function AdminPage() {
     }
   };
 
-  useEffect(() => { fetchData(); }, []);
+  useEffect(() => {
+    // Subscribe before the first load so no change between the two is missed.
+    // The browser reconnects on its own and resumes from the last event id.
+    const source = new EventSource(`${API}/admin/events`);
+    source.addEventListener("booking_created", (e) => {
+      const booking = JSON.parse(e.data);
+      setBookings((prev) => (prev.some((b) => b.id === booking.id) ? prev : [booking, ...prev]));
+    });
+    source.addEventListener("booking_deleted", (e) => {
+      const { id } = JSON.parse(e.data);
+      setBookings((prev) => prev.filter((b) => b.id !== id));
+    });
+    source.addEventListener("booking_status", (e) => {
+      const { id, status } = JSON.parse(e.data);
+      setBookings((prev) => prev.map((b) => (b.id === id ? { ...b, status } : b)));
+    });
+    source.addEventListener("bookings_deleted", (e) => {
+      const ids = new Set(JSON.parse(e.data).ids);
+      setBookings((prev) => prev.filter((b) => !ids.has(b.id)));
+    });
+    source.addEventListener("bookings_status", (e) => {
+      const { ids, status } = JSON.parse(e.data);
+      const changed = new Set(ids);
+      setBookings((prev) => prev.map((b) => (changed.has(b.id) ? { ...b, status } : b)));
+    });
+    source.addEventListener("counters", (e) => {
+      const changed = JSON.parse(e.data);
+      setStats((prev) => (prev ? { ...prev, ...changed } : prev));
+    });
+    source.addEventListener("reset", () => fetchData());
+    fetchData();
+    return () => source.close();
+  }, []);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await axios.get(`${API}/demo-bookings`, { params: { cursor: nextCursor } });
+      setBookings((prev) => [...prev, ...res.data.items]);
+      setNextCursor(res.data.next_cursor);
+    } catch {
+      toast.error("Failed to load more bookings");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const handleDelete = async (id) => {
     try {
       await axios.delete(`${API}/demo-bookings/${id}`);
       toast.success("Booking deleted");
-      fetchData();
+      setBookings((prev) => prev.filter((b) => b.id !== id));
     } catch {
       toast.error("Failed to delete booking");
     }
   };
 
+  const toggleSelected = (id) => {
+    setSelected((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) next.delete(id); else next.add(id);
+      return next;
+    });
+  };
+
+  const allSelected = bookings.length > 0 && bookings.every((b) => selected.has(b.id));
+  const toggleAll = () => setSelected(allSelected ? new Set() : new Set(bookings.map((b) => b.id)));
+
+  // One request for the whole selection; the table follows from the events stream.
+  const handleBulk = async (action, status) => {
+    setBulkBusy(true);
+    try {
+      const res = await axios.post(`${API}/admin/demo-bookings/bulk`, { ids: [...selected], action, status });
+      const { counts } = res.data;
+      const done = (counts.deleted || 0) + (counts.updated || 0) + (counts.unchanged || 0);
+      const failed = (counts.error || 0) + (counts.conflict || 0);
+      if (failed) {
+        toast.error(`${done} bookings updated, ${failed} failed`);
+      } else {
+        toast.success(action === "delete" ? `${done} bookings deleted` : `${done} bookings marked ${status}`);
+      }
+      setSelected(new Set(res.data.results.filter((r) => r.result === "error" || r.result === "conflict").map((r) => r.id)));
+    } catch {
+      toast.error("Bulk update failed");
+    } finally {
+      setBulkBusy(false);
+    }
+  };
+
   const statCards = stats ? [
     { label: "Total Bookings", value: stats.total_bookings, icon: CalendarDays, color: "bg-[#2F5D62]" },
     { label: "Pending", value: stats.pending_bookings, icon: Clock, color: "bg-[#DF7861]" },
@@ -105,11 +217,76 @@ export default function AdminPage() {
           ))}
         </div>
 
+        {/* Lead Search */}
+        <div className="bg-white rounded-2xl border border-[#E2E0D6]/50 shadow-[0_2px_10px_rgb(0,0,0,0.02)] p-5 mb-8" data-testid="admin-lead-search">
+          <div className="relative">
+            <Search className="w-4 h-4 text-[#6B7280] absolute left-3 top-1/2 -translate-y-1/2" />
+            <Input
+              data-testid="admin-search-input"
+              value={query}
+              onChange={(e) => setQuery(e.target.value)}
+              placeholder="Search leads by name, email, phone or message"
+              className="pl-9 border-[#E2E0D6]"
+            />
+          </div>
+          {results && (
+            <div className="mt-4" data-testid="admin-search-results">
+              <p className="text-xs text-[#6B7280] mb-2">
+                {results.total} {results.total === 1 ? "match" : "matches"}
+              </p>
+              {results.items.map((lead) => (
+                <div key={`${lead.table}-${lead.id}`} className="flex flex-wrap items-center gap-x-4 gap-y-1 py-2 border-t border-[#E2E0D6]/50 text-sm">
+                  <Badge variant="outline" className="border-[#E2E0D6] text-[#6B7280]">{LEAD_TABLES[lead.table]}</Badge>
+                  <span className="font-medium text-[#2C3333]">{lead.name}</span>
+                  <span className="text-[#6B7280]">{lead.email}</span>
+                  {lead.phone && <span className="text-[#6B7280]">{lead.phone}</span>}
+                  {lead.subject && <span className="text-[#6B7280]">{lead.subject}</span>}
+                  <span className="text-xs text-[#6B7280] ml-auto">{new Date(lead.created_at).toLocaleDateString()}</span>
+                </div>
+              ))}
+            </div>
+          )}
+        </div>
+
         {/* Bookings Table */}
         <div className="bg-white rounded-2xl border border-[#E2E0D6]/50 shadow-[0_2px_10px_rgb(0,0,0,0.02)] overflow-hidden" data-testid="admin-bookings-table">
           <div className="p-5 border-b border-[#E2E0D6]/50">
             <h2 className="font-heading font-semibold text-[#2C3333] text-lg">Demo Bookings</h2>
-            <p className="text-sm text-[#6B7280]">{bookings.length} total bookings</p>
+            <p className="text-sm text-[#6B7280]">{stats ? stats.total_bookings : bookings.length} total bookings</p>
+            {selected.size > 0 && (
+              <div className="mt-3 flex flex-wrap items-center gap-2" data-testid="admin-bulk-actions">
+                <span className="text-sm text-[#2C3333] mr-2">{selected.size} selected</span>
+                <Button
+                  data-testid="bulk-confirm-btn"
+                  size="sm"
+                  disabled={bulkBusy}
+                  onClick={() => handleBulk("set_status", "confirmed")}
+                  className="bg-[#2F5D62] hover:bg-[#23464A] text-white"
+                >
+                  Mark confirmed
+                </Button>
+                <Button
+                  data-testid="bulk-pending-btn"
+                  variant="outline"
+                  size="sm"
+                  disabled={bulkBusy}
+                  onClick={() => handleBulk("set_status", "pending")}
+                  className="border-[#E2E0D6] text-[#2C3333]"
+                >
+                  Mark pending
+                </Button>
+                <Button
+                  data-testid="bulk-delete-btn"
+                  variant="outline"
+                  size="sm"
+                  disabled={bulkBusy}
+                  onClick={() => handleBulk("delete")}
+                  className="border-red-200 text-red-500 hover:bg-red-50"
+                >
+                  {bulkBusy ? <Loader2 className="w-4 h-4 animate-spin" /> : "Delete"}
+                </Button>
+              </div>
+            )}
           </div>
 
           {bookings.length === 0 ? (
@@ -122,6 +299,9 @@ export default function AdminPage() {
               <Table>
                 <TableHeader>
                   <TableRow className="bg-[#F9F8F6]/50">
+                    <TableHead className="w-10">
+                      <Checkbox data-testid="select-all-bookings" checked={allSelected} onCheckedChange={toggleAll} />
+                    </TableHead>
                     <TableHead className="font-heading text-[#2C3333]">Name</TableHead>
                     <TableHead className="font-heading text-[#2C3333]">Email</TableHead>
                     <TableHead className="font-heading text-[#2C3333]">Phone</TableHead>
@@ -136,6 +316,13 @@ export default function AdminPage() {
                 <TableBody>
                   {bookings.map((b) => (
                     <TableRow key={b.id} data-testid={`booking-row-${b.id}`}>
+                      <TableCell>
+                        <Checkbox
+                          data-testid={`select-booking-${b.id}`}
+                          checked={selected.has(b.id)}
+                          onCheckedChange={() => toggleSelected(b.id)}
+                        />
+                      </TableCell>
                       <TableCell className="font-medium text-[#2C3333]">{b.name}</TableCell>
                       <TableCell className="text-[#6B7280]">{b.email}</TableCell>
                       <TableCell className="text-[#6B7280]">{b.phone}</TableCell>
@@ -165,6 +352,20 @@ export default function AdminPage() {
                   ))}
                 </TableBody>
               </Table>
+              {nextCursor && (
+                <div className="p-4 flex justify-center border-t border-[#E2E0D6]/50">
+                  <Button
+                    data-testid="admin-load-more-btn"
+                    variant="outline"
+                    size="sm"
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="border-[#E2E0D6] text-[#2C3333]"
+                  >
+                    {loadingMore ? <Loader2 className="w-4 h-4 animate-spin" /> : "Load more"}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -135,7 +135,7 @@ export default function TeacherDetailPage() {
         </div>
       </div>
       <Footer />
-      <DemoModal open={demoOpen} onOpenChange={setDemoOpen} defaultSubject={teacher.subject} />
+      <DemoModal open={demoOpen} onOpenChange={setDemoOpen} defaultSubject={teacher.subject} tutor={teacher.slug} />
     </div>
   );
 }
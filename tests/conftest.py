@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+os.environ.setdefault('RESEND_API_KEY', '')
+# Tests post far more forms from one client than the default limits allow;
+# test_ratelimit.py builds its own limiter.
+os.environ.setdefault('RATE_LIMIT_STORE', 'off')
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+
+from analytics import AnalyticsEngine, EventColumns, compute_rollup
+from sqlite_repository import SQLiteRepository
+
+T0 = datetime(2026, 3, 2, 10, 0, tzinfo=timezone.utc).timestamp()
+
+
+def event(session, kind, seconds, page="/", referrer=""):
+    stamp = datetime.fromtimestamp(T0 + seconds, timezone.utc).isoformat()
+    return {"id": f"{session}-{kind}-{seconds}", "session_id": session, "event_type": kind, "page": page,
+            "user_agent": "", "referrer": referrer, "timestamp": stamp}
+
+
+EVENTS = [
+    event("a", "visit", 0, referrer="https://www.google.com/search?q=tutor"),
+    event("a", "leave", 95),
+    event("a", "booking", 100),
+    event("b", "visit", 600),
+    event("b", "leave", 610),
+    # Same session id after a long gap starts a second session an hour later.
+    event("b", "visit", 600 + 3600, page="/pricing"),
+    event("b", "leave", 600 + 3660, page="/pricing"),
+]
+
+
+def test_rollup_sessionizes_and_pairs_visits():
+    columns = EventColumns()
+    columns.extend(EVENTS)
+    rollup = compute_rollup(columns, T0, T0 + 7200, session_timeout=1800, engaged_seconds=30)
+
+    first = rollup[(int(T0), "funnel", "all")]
+    assert (first["visits"], first["sessions"], first["engaged"], first["bookings"]) == (2, 2, 1, 1)
+    assert first["dwell_seconds"] == 105 and first["dwell_count"] == 2
+    assert rollup[(int(T0), "referrer", "www.google.com")]["bookings"] == 1
+    assert rollup[(int(T0), "referrer", "(direct)")]["sessions"] == 1
+    later = rollup[(int(T0) + 3600, "page", "/pricing")]
+    assert (later["visits"], later["sessions"], later["dwell_seconds"]) == (1, 1, 60)
+
+
+def test_roll_up_stores_final_hours_and_serves_the_rest_live():
+    async def run():
+        repo = SQLiteRepository()
+        engine = AnalyticsEngine(repo, session_timeout=1800)
+        await repo.insert('visitor_events', EVENTS[:5])
+        engine.events_flushed(EVENTS[5:])
+        # The first hour is final, the second is still open.
+        processed = await engine.roll_up(now=T0 + 3600 + 1800 + 1)
+        stored = await repo.select('visitor_rollups', where=[('dimension', 'eq', 'funnel')],
+                                   order=[('granularity', False)])
+        hourly = await engine.query('funnel', 'hour', T0, T0 + 7200)
+        daily = await engine.funnel('day', T0, T0 + 7200)
+        again = await engine.recompute(T0, T0 + 3600)
+        await repo.aclose()
+        return processed, stored, hourly, daily, again
+
+    processed, stored, hourly, daily, again = asyncio.run(run())
+    assert processed == 5 and again == 5
+    assert [(r["granularity"], r["sessions"]) for r in stored] == [("day", 2), ("hour", 2)]
+    assert [(b["sessions"], b["bookings"]) for b in hourly] == [(2, 1), (1, 0)]
+    assert [stage["sessions"] for stage in daily["stages"]] == [3, 2, 1]
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from breaker import CircuitBreaker, CircuitOpen, GuardedRepository
+from repository import Repository, RepositoryError
+
+
+class Flaky(Repository):
+    def __init__(self):
+        self.delay = 0.0
+        self.error = None
+        self.calls = 0
+
+    async def count(self, table, where=()):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return 1
+
+
+def test_deadlines_open_the_circuit_and_a_probe_closes_it():
+    inner = Flaky()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+    repo = GuardedRepository(inner, breaker, deadline=0.05)
+
+    async def run():
+        inner.delay = 1.0
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await repo.count('demo_bookings')
+        started = time.perf_counter()
+        with pytest.raises(CircuitOpen):
+            await repo.count('demo_bookings')
+        rejected_in = time.perf_counter() - started
+        await asyncio.sleep(0.2)
+        inner.delay = 0.0
+        probe = await repo.count('demo_bookings')
+        return rejected_in, probe
+
+    rejected_in, probe = asyncio.run(run())
+    # Three calls timed out; the fourth never reached the database.
+    assert inner.calls == 4 and rejected_in < 0.01
+    assert probe == 1 and breaker.state == "closed"
+    assert breaker.stats()["opened"] == 1 and breaker.stats()["rejected"] == 1
+
+
+def test_client_errors_do_not_count_as_outages():
+    inner = Flaky()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    repo = GuardedRepository(inner, breaker, deadline=1)
+
+    async def run():
+        inner.error = RepositoryError("POST demo_bookings failed with 409", 409)
+        for _ in range(3):
+            with pytest.raises(RepositoryError):
+                await repo.count('demo_bookings')
+        state_after_conflicts = breaker.state
+        inner.error = RepositoryError("GET demo_bookings failed with 503", 503)
+        for _ in range(2):
+            with pytest.raises(RepositoryError):
+                await repo.count('demo_bookings')
+        return state_after_conflicts
+
+    assert asyncio.run(run()) == "closed"
+    assert breaker.state == "open"
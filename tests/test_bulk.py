@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from bulk import bulk_set
+from events import EventBus
+from sqlite_repository import SQLiteRepository
+from stats import StatsStore
+
+
+@pytest.fixture
+def db(monkeypatch):
+    repo = SQLiteRepository()
+    rows = [{"id": f"b{i}", "name": "N", "email": f"s{i}@x", "status": "confirmed" if i % 3 == 0 else "pending",
+             "created_at": f"2026-01-01T00:00:{i:02d}"} for i in range(10)]
+    asyncio.run(repo.insert('demo_bookings', rows))
+    monkeypatch.setattr(server, "repo", repo)
+    monkeypatch.setattr(server, "stats", StatsStore(repo))
+    monkeypatch.setattr(server, "bus", EventBus())
+    asyncio.run(server.stats.recount())
+    server.stats.listeners.append(lambda changed: server.bus.publish('counters', changed))
+    return repo
+
+
+def bulk(body):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await client.post("/api/admin/demo-bookings/bulk", json=body)
+    return asyncio.run(run())
+
+
+def results(response):
+    return {r["id"]: r["result"] for r in response.json()["results"]}
+
+
+def test_dry_run_reports_without_writing(db):
+    response = bulk({"ids": ["b1", "b3", "missing"], "action": "delete", "dry_run": True})
+    assert results(response) == {"b1": "would_delete", "b3": "would_delete", "missing": "not_found"}
+    assert asyncio.run(db.count('demo_bookings')) == 10
+    assert server.bus.published == 0
+
+
+def test_delete_in_chunks(db, monkeypatch):
+    monkeypatch.setattr(server, "BULK_CHUNK_SIZE", 2)
+    response = bulk({"ids": ["b0", "b1", "b2", "b1", "missing"], "action": "delete"})
+    body = response.json()
+    assert results(response) == {"b0": "deleted", "b1": "deleted", "b2": "deleted", "missing": "not_found"}
+    assert body["statements"] == 2
+    assert asyncio.run(db.count('demo_bookings')) == 7
+    assert server.stats.counters["total_bookings"] == 7
+    assert server.stats.counters["pending_bookings"] == 4
+    # One event for the batch, not one per row.
+    assert [m[1:] for _, m in server.bus._history] == [
+        ('counters', {"total_bookings": 7, "pending_bookings": 4}),
+        ('bookings_deleted', {"ids": ["b0", "b1", "b2"]}),
+    ]
+
+
+def test_set_status_groups_updates_by_previous_status(db):
+    response = bulk({"ids": ["b0", "b1", "b2", "b3", "missing"], "action": "set_status", "status": "completed"})
+    body = response.json()
+    assert results(response) == {"b0": "updated", "b1": "updated", "b2": "updated", "b3": "updated",
+                                 "missing": "not_found"}
+    assert {r["id"]: r["previous"] for r in body["results"]}["b3"] == "confirmed"
+    # One select, then one guarded update per previous status.
+    assert body["statements"] == 3
+    assert server.stats.counters["pending_bookings"] == 4
+    assert results(bulk({"ids": ["b1"], "action": "set_status", "status": "completed"})) == {"b1": "unchanged"}
+    assert bulk({"ids": ["b1"], "action": "set_status"}).status_code == 400
+
+
+def test_rows_changed_concurrently_are_not_overwritten(db):
+    class Racing(SQLiteRepository):
+        async def select(self, *args, **kwargs):
+            rows = await super().select(*args, **kwargs)
+            await super().update('demo_bookings', {"status": "cancelled"}, [('id', 'eq', 'b1')])
+            return rows
+
+    async def run():
+        repo = Racing()
+        await repo.insert('demo_bookings', await db.select('demo_bookings'))
+        outcome = await bulk_set(repo, 'demo_bookings', ["b1", "b2"], 'status', 'confirmed')
+        return outcome.counts(), await repo.select('demo_bookings', 'status', [('id', 'eq', 'b1')])
+
+    counts, [b1] = asyncio.run(run())
+    assert counts == {"conflict": 1, "updated": 1}
+    assert b1["status"] == "cancelled"
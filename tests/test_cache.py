@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from cache import MemoryBackend, ResponseCache, SQLiteBackend
+from idempotency import Deduplicator
+from repository import Repository
+
+
+class BookingsRepository(Repository):
+    def __init__(self):
+        self.rows = [{"id": f"b{i}", "created_at": f"2026-01-{i + 1:02d}", "status": "pending",
+                      "name": "N", "email": "e@x"} for i in range(6)]
+        self.selects = 0
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        self.selects += 1
+        rows = sorted(self.rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        if after is not None:
+            rows = [r for r in rows if (r["created_at"], r["id"]) < tuple(after)]
+        for column, _, value in where:
+            rows = [r for r in rows if r[column] == value]
+        return rows[:limit]
+
+    async def insert(self, table, rows):
+        self.rows.append(dict(rows, created_at="2026-02-01"))
+
+    async def update(self, table, values, where):
+        matched = [r for r in self.rows if r["id"] == where[0][2]]
+        for row in matched:
+            row.update(values)
+        return matched
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def app(monkeypatch, tmp_path, request):
+    backend = MemoryBackend(100, 60) if request.param == "memory" else SQLiteBackend(
+        str(tmp_path / "cache.sqlite3"), 100, 60)
+    repo = BookingsRepository()
+    monkeypatch.setattr(server, "repo", repo)
+    monkeypatch.setattr(server, "responses", ResponseCache(backend))
+    monkeypatch.setattr(server, "dedup", Deduplicator())
+    return repo
+
+
+def call(steps):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return [await client.request(method, url, **kwargs) for method, url, kwargs in steps]
+    return asyncio.run(run())
+
+
+def test_repeat_reads_hit_cache_and_honour_etag(app):
+    first, second = call([("GET", "/api/demo-bookings?limit=2", {})] * 2)
+    assert app.selects == 1
+    assert first.content == second.content
+    etag = first.headers["etag"]
+    (revalidated,) = call([("GET", "/api/demo-bookings?limit=2", {"headers": {"If-None-Match": etag}})])
+    assert revalidated.status_code == 304
+
+
+def test_writes_invalidate_only_affected_pages(app):
+    page1, = call([("GET", "/api/demo-bookings?limit=2", {})])
+    cursor = page1.json()["next_cursor"]
+    steps = [
+        ("GET", f"/api/demo-bookings?limit=2&cursor={cursor}", {}),
+        ("GET", "/api/demo-bookings?limit=2&status=pending", {}),
+        # A new booking only lands on first pages.
+        ("POST", "/api/demo-bookings", {"json": {"name": "New", "email": "new@x"}}),
+        ("GET", "/api/demo-bookings?limit=2", {}),
+        ("GET", f"/api/demo-bookings?limit=2&cursor={cursor}", {}),
+    ]
+    responses = call(steps)
+    assert responses[3].json()["items"][0]["name"] == "New"
+    assert app.selects == 4
+
+    # A status change drops the pages holding that id and status-filtered pages.
+    target = responses[4].json()["items"][0]["id"]
+    call([
+        ("PATCH", f"/api/demo-bookings/{target}/status?status=confirmed", {}),
+        ("GET", f"/api/demo-bookings?limit=2&cursor={cursor}", {}),
+        ("GET", "/api/demo-bookings?limit=2", {}),
+        ("GET", "/api/demo-bookings?limit=2&status=pending", {}),
+    ])
+    # select for the old status + re-reads of the cursor page and the status page
+    assert app.selects == 4 + 3
+
+
+def test_large_pages_are_compressed_once_per_etag(app, monkeypatch):
+    monkeypatch.setattr(server.responses, "compress_min_bytes", 200)
+    url = "/api/demo-bookings?limit=6"
+    gzipped, again, plain = call([
+        ("GET", url, {"headers": {"Accept-Encoding": "gzip"}}),
+        ("GET", url, {"headers": {"Accept-Encoding": "br;q=0, gzip;q=0.5"}}),
+        ("GET", url, {"headers": {"Accept-Encoding": "identity"}}),
+    ])
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in plain.headers
+    assert gzipped.json() == plain.json() and len(plain.json()["items"]) == 6
+    assert gzipped.headers["etag"] == again.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert server.responses.compressed == 2 and len(server.responses._encoded) == 1
+    # Either representation's ETag revalidates.
+    for etag in (gzipped.headers["etag"], plain.headers["etag"]):
+        (revalidated,) = call([("GET", url, {"headers": {"If-None-Match": etag, "Accept-Encoding": "gzip"}})])
+        assert revalidated.status_code == 304
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from chat import FAQ_PATH, ChatBot, FAQIndex, tokenize
+from ingest import EventIngestor
+from sqlite_repository import SQLiteRepository
+
+
+@pytest.mark.parametrize("question, faq_id", [
+    ("How much does it cost?", "pricing"),
+    ("How does it work?", "how_it_works"),
+    ("Can I get my money back", "refunds"),
+    ("Do you teach physics", "subjects"),
+    ("my kid is in grade 5", "levels"),
+    ("What is the capital of France", None),
+])
+def test_best_entry_wins_regardless_of_order(question, faq_id):
+    assert ChatBot().match(question)["faq_id"] == faq_id
+
+
+def test_repeat_questions_are_served_from_cache():
+    bot = ChatBot()
+    first = bot.match("How much is a session?")
+    again = bot.match("how much is a session")
+    assert again is first
+    assert (bot.hits, bot.misses) == (1, 1)
+
+
+def test_lookup_only_touches_matching_postings():
+    entries = [{"id": f"e{i}", "keywords": [f"topic{i}"], "answer": f"About topic{i}."} for i in range(5000)]
+    index = FAQIndex(entries + [{"id": "pricing", "keywords": ["how much"], "answer": "Ask us."}])
+    touched = [doc_id for token in tokenize("how much") if token in index.postings for doc_id in index.postings[token][0]]
+    assert set(touched) == {5000}
+    assert index.entries[index.search(tokenize("how much is it"))[0][1]]["id"] == "pricing"
+
+
+def test_unanswered_questions_are_written_in_batches():
+    async def run():
+        repo = SQLiteRepository()
+        ingestor = EventIngestor(repo, table='chat_unanswered', batch_size=3, flush_interval=10)
+        bot = ChatBot(unanswered=ingestor)
+        await ingestor.start()
+        for i in range(4):
+            await bot.answer(f"do you sell {['bicycles', 'kites', 'rockets', 'skateboards'][i]}", session_id="s1")
+        await bot.answer("how much")
+        await asyncio.sleep(0.05)
+        written = await repo.count('chat_unanswered')
+        await ingestor.stop()
+        total = await repo.count('chat_unanswered')
+        await repo.aclose()
+        return written, total, ingestor.stats()["batches"]
+
+    assert asyncio.run(run()) == (3, 4, 2)
+
+
+def test_reload_swaps_index_and_keeps_old_one_on_error(tmp_path):
+    path = tmp_path / "faq.json"
+    path.write_text(FAQ_PATH.read_text())
+    bot = ChatBot(path)
+    bot.match("how much")
+    entries = [{"id": id, "keywords": [keyword], "answer": "No."}
+               for id, keyword in [("bikes", "bicycle"), ("boats", "boat"), ("cars", "car")]]
+    path.write_text(json.dumps({"fallback": "?", "entries": entries}))
+    assert bot.reload() == 3
+    assert bot.match("bicycles")["faq_id"] == "bikes"
+    assert len(bot.cache) == 1
+    path.write_text("{broken")
+    with pytest.raises(ValueError):
+        bot.reload()
+    assert bot.match("bicycle")["faq_id"] == "bikes"
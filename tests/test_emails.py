@@ -0,0 +1,37 @@
+import pytest
+
+from emails import EmailTemplate, Notifications
+
+
+def test_template_is_split_once_and_escapes_fields():
+    template = EmailTemplate('<p>$name costs $$5 for ${item}</p>')
+    assert template.fields == {"name", "item"}
+    assert template.render({"name": "<b>Al</b>", "item": "a&b"}) == "<p>&lt;b&gt;Al&lt;/b&gt; costs $5 for a&amp;b</p>"
+    with pytest.raises(KeyError):
+        template.render({"name": "x"})
+
+
+def test_booking_email_has_escaped_html_and_plain_text():
+    notifications = Notifications("from@test", "to@test", "910000000000")
+    message = notifications.render('booking', {
+        "name": 'Eve "<script>"', "email": "eve@example.com", "phone": "1", "grade_level": "9",
+        "subject_interest": "Maths", "preferred_date": "", "message": "",
+    })
+    assert "<script>" not in message["html"]
+    assert "&lt;script&gt;" in message["html"]
+    assert "Message:        N/A" in message["text"]
+    assert 'Eve "<script>"' in message["text"]
+    assert "wa.me/910000000000?text=Hi%20Eve%20%22%3Cscript%3E%22" in message["text"]
+    assert message["subject"] == 'New Demo Booking: Eve "<script>" - Maths'
+    assert message["to"] == ["to@test"]
+
+
+def test_digest_lists_every_lead():
+    notifications = Notifications("from@test", "to@test", "910000000000")
+    message = notifications.render_digest([
+        ('booking', {"name": "A", "email": "a@x", "phone": "", "subject_interest": "Physics"}),
+        ('query', {"name": "B&C", "email": "b@x", "phone": "", "subject": "Chemistry"}),
+    ])
+    assert message["subject"] == "2 new leads"
+    assert "B&amp;C" in message["html"] and "Physics" in message["html"]
+    assert "- [Query] Chemistry: B&C <b@x>" in message["text"]
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from events import EventBus
+from stats import StatsStore
+
+
+def parse(chunk: bytes):
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n") if not line.startswith(":"))
+    return fields.get("id"), fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+def test_stream_resumes_after_last_event_id():
+    async def run():
+        bus = EventBus()
+        first = bus.publish('booking_created', {"id": "b1"})
+        bus.publish('booking_status', {"id": "b1", "status": "confirmed"})
+        stream = bus.stream(first)
+        assert (await stream.__anext__()).startswith(b"retry:")
+        replayed = parse(await stream.__anext__())
+        bus.publish('booking_deleted', {"id": "b1"})
+        live = parse(await stream.__anext__())
+        await stream.aclose()
+        return replayed, live, bus.stats()
+
+    replayed, live, stats = asyncio.run(run())
+    assert replayed[1:] == ('booking_status', {"id": "b1", "status": "confirmed"})
+    assert live[1:] == ('booking_deleted', {"id": "b1"})
+    assert stats["subscribers"] == 0
+
+
+def test_stale_resume_point_asks_for_reset():
+    async def run():
+        bus = EventBus(history=2)
+        old = bus.publish('counters', {"total_bookings": 1})
+        for i in range(3):
+            bus.publish('counters', {"total_bookings": 2 + i})
+        events = []
+        for last_id in (old, "otherprocess-1"):
+            stream = bus.stream(last_id)
+            await stream.__anext__()
+            events.append(parse(await stream.__anext__())[1])
+            await stream.aclose()
+        return events
+
+    assert asyncio.run(run()) == ["reset", "reset"]
+
+
+def test_heartbeat_and_slow_subscriber_is_dropped():
+    async def run():
+        bus = EventBus()
+        bus.queue_size = 2
+        stream = bus.stream(heartbeat=0.01)
+        await stream.__anext__()
+        heartbeat = await stream.__anext__()
+        for i in range(3):
+            bus.publish('counters', {"total_visits": i})
+        rest = [chunk async for chunk in stream]
+        return heartbeat, rest, bus.stats()
+
+    heartbeat, rest, stats = asyncio.run(run())
+    assert heartbeat == b": heartbeat\n\n"
+    assert rest == []
+    assert stats["overflows"] == 1 and stats["subscribers"] == 0
+
+
+def test_stats_changes_reach_listeners_once_per_change():
+    store = StatsStore(repo=None)
+    changes = []
+    store.listeners.append(changes.append)
+    store.booking_created('pending')
+    store.events_flushed([{"event_type": "visit"}] * 3 + [{"event_type": "leave"}])
+    assert changes == [{"total_bookings": 1, "pending_bookings": 1}, {"total_visits": 3, "total_leaves": 1}]
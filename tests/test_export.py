@@ -0,0 +1,68 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+
+import httpx
+
+import server
+from repository import Repository
+
+
+class AscendingRepository(Repository):
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda r: (r["created_at"], r["id"]))
+        self.calls = 0
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        self.calls += 1
+        rows = self.rows
+        for column, op, value in where:
+            assert op == 'gt'
+            rows = [r for r in rows if r[column] > value]
+        if after is not None:
+            rows = [r for r in rows if (r["created_at"], r["id"]) > tuple(after)]
+        return [{k: r[k] for k in columns.split(",")} for r in rows[:limit]]
+
+
+ROWS = [{"id": f"c{i:04d}", "name": f"N{i}", "email": f"n{i}@x.com", "phone": "", "message": "hi, there",
+         "created_at": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}+00:00"} for i in range(2500)]
+
+
+def export(monkeypatch, params):
+    repo = AscendingRepository(ROWS)
+    monkeypatch.setattr(server, "repo", repo)
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await client.get("/api/admin/export/contact_messages", params=params)
+
+    return asyncio.run(run()), repo
+
+
+def test_ndjson_export_pages_through_every_row(monkeypatch):
+    response, repo = export(monkeypatch, {"format": "ndjson"})
+    lines = response.content.decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [r["id"] for r in ROWS]
+    assert repo.calls == 3
+    assert "attachment" in response.headers["content-disposition"]
+
+
+def test_gzip_csv_export_since_timestamp(monkeypatch):
+    since = ROWS[2399]["created_at"]
+    response, _ = export(monkeypatch, {"format": "csv", "gzip": "true", "since": since})
+    assert response.headers["content-type"] == "application/gzip"
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert [r["id"] for r in rows] == [r["id"] for r in ROWS[2400:]]
+    assert rows[0]["message"] == "hi, there"
+
+
+def test_unknown_table_is_rejected(monkeypatch):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await client.get("/api/admin/export/visitor_events")
+
+    assert asyncio.run(run()).status_code == 404
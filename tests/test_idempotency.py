@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+
+import server
+from idempotency import Deduplicator
+from repository import Repository
+
+
+class SlowInsertRepository(Repository):
+    def __init__(self):
+        self.inserted = []
+
+    async def insert(self, table, rows):
+        await asyncio.sleep(0.05)
+        self.inserted.append((table, rows))
+
+
+BOOKING = {"name": "Asha", "email": "Asha@Example.com", "subject_interest": "Physics"}
+
+
+def post_all(monkeypatch, requests):
+    repo = SlowInsertRepository()
+    monkeypatch.setattr(server, "repo", repo)
+    monkeypatch.setattr(server, "dedup", Deduplicator())
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await asyncio.gather(*[client.post(path, json=body, headers=headers)
+                                          for path, body, headers in requests])
+
+    return asyncio.run(run()), repo
+
+
+def test_same_idempotency_key_returns_first_response(monkeypatch):
+    key = {"Idempotency-Key": "k1"}
+    responses, repo = post_all(monkeypatch, [("/api/demo-bookings", BOOKING, key)] * 3)
+    assert len(repo.inserted) == 1
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert server.dedup.stats()["collapsed_in_flight"] == 2
+
+
+def test_reused_key_with_different_body_is_rejected(monkeypatch):
+    responses, repo = post_all(monkeypatch, [
+        ("/api/demo-bookings", BOOKING, {"Idempotency-Key": "k2"}),
+    ])
+    assert responses[0].status_code == 200
+
+    async def reuse():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await client.post("/api/demo-bookings", json={**BOOKING, "name": "Other"},
+                                     headers={"Idempotency-Key": "k2"})
+
+    assert asyncio.run(reuse()).status_code == 422
+    assert len(repo.inserted) == 1
+
+
+def test_keyless_duplicates_fold_on_email_and_subject(monkeypatch):
+    query = {"name": "Ravi", "email": "ravi@example.com", "subject": "Maths", "message": "hi"}
+    responses, repo = post_all(monkeypatch, [
+        ("/api/subject-queries", query, {}),
+        ("/api/subject-queries", {**query, "email": " RAVI@example.com"}, {}),
+        ("/api/subject-queries", {**query, "subject": "Physics"}, {}),
+    ])
+    assert [table for table, _ in repo.inserted] == ['subject_queries', 'subject_queries']
+    assert responses[0].json()["id"] == responses[1].json()["id"]
+    assert responses[2].json()["id"] != responses[0].json()["id"]
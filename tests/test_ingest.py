@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from ingest import EventIngestor, IngestQueueFull
+from repository import Repository
+
+
+class RecordingRepository(Repository):
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    async def insert(self, table, rows):
+        await asyncio.sleep(self.delay)
+        self.batches.append(list(rows))
+
+
+def event(i):
+    return {"id": str(i), "session_id": "s", "event_type": "visit"}
+
+
+def test_flushes_by_size_and_by_time():
+    async def run():
+        repo = RecordingRepository()
+        ingestor = EventIngestor(repo, batch_size=10, flush_interval=0.05)
+        await ingestor.start()
+        for i in range(23):
+            await ingestor.submit(event(i))
+        await asyncio.sleep(0.2)
+        await ingestor.stop()
+        return repo, ingestor
+
+    repo, ingestor = asyncio.run(run())
+    assert [len(b) for b in repo.batches] == [10, 10, 3]
+    assert ingestor.stats()["flushed"] == 23
+    assert ingestor.stats()["batches"] == 3
+
+
+def test_rejects_when_memory_cap_is_reached():
+    async def run():
+        ingestor = EventIngestor(RecordingRepository(), max_pending=5, put_timeout=0.01)
+        for i in range(5):
+            await ingestor.submit(event(i))
+        with pytest.raises(IngestQueueFull):
+            await ingestor.submit(event(5))
+        return ingestor
+
+    assert asyncio.run(run()).stats()["rejected"] == 1
+
+
+def test_stop_flushes_everything_including_in_flight_batch():
+    async def run():
+        repo = RecordingRepository(delay=0.05)
+        ingestor = EventIngestor(repo, batch_size=4, flush_interval=10)
+        await ingestor.start()
+        for i in range(10):
+            await ingestor.submit(event(i))
+        await asyncio.sleep(0.01)
+        await ingestor.stop()
+        return repo
+
+    repo = asyncio.run(run())
+    assert sorted(int(e["id"]) for b in repo.batches for e in b) == list(range(10))
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import APIRouter, FastAPI
+
+from metrics import (Histogram, LoopLagMonitor, Metrics, MetricsMiddleware, SlowRequestProfiler, TimedRepository,
+                     TimedRoute)
+from repository import Repository
+
+DB_DELAY = 0.05
+CPU_TIME = 0.03
+
+
+class SlowRepository(Repository):
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        await asyncio.sleep(DB_DELAY)
+        return [{"id": "b1"}]
+
+
+def busy_work(seconds):
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        sum(range(100))
+
+
+def make_app(metrics, profiler=None):
+    app = FastAPI()
+    router = APIRouter(prefix="/api", route_class=TimedRoute)
+    repo = TimedRepository(SlowRepository(), metrics)
+
+    @router.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        rows = await repo.select('demo_bookings', where=[('id', 'eq', item_id)])
+        busy_work(CPU_TIME)
+        return rows[0]
+
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware, metrics=metrics, routes=app.routes, profiler=profiler)
+    return app
+
+
+def get_all(app, paths):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return [(await client.get(path)).status_code for path in paths]
+    return asyncio.run(run())
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("op_seconds", "Op latency.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "read")
+    assert histogram.render() == [
+        "# HELP op_seconds Op latency.",
+        "# TYPE op_seconds histogram",
+        'op_seconds_bucket{op="read",le="0.1"} 1',
+        'op_seconds_bucket{op="read",le="1.0"} 3',
+        'op_seconds_bucket{op="read",le="+Inf"} 4',
+        'op_seconds_sum{op="read"} 4.250000',
+        'op_seconds_count{op="read"} 4',
+    ]
+
+
+def test_request_time_is_split_into_phases():
+    metrics = Metrics()
+    assert get_all(make_app(metrics), ["/api/items/b1", "/api/missing"]) == [200, 404]
+    route = "/api/items/{item_id}"
+    assert metrics.requests.count("GET", route, "200") == 1
+    assert metrics.requests.count("GET", "unmatched", "404") == 1
+    assert DB_DELAY <= metrics.phases.sum(route, "db") < DB_DELAY + 0.04
+    assert CPU_TIME <= metrics.phases.sum(route, "handler") < CPU_TIME + 0.04
+    assert metrics.db.count("demo_bookings", "select") == 1
+    assert metrics.in_flight == 0
+    text = metrics.render()
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}",status="200"}} 1' in text
+
+
+def test_slow_requests_are_profiled_to_folded_stacks(tmp_path):
+    metrics = Metrics()
+    profiler = SlowRequestProfiler(threshold=DB_DELAY, directory=str(tmp_path), interval=0.002)
+    app = make_app(metrics, profiler)
+
+    async def run():
+        profiler.start()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            await client.get("/api/items/b1")
+        profiler.stop()
+
+    asyncio.run(run())
+    [dump] = tmp_path.glob("*.folded")
+    stacks = dump.read_text().splitlines()
+    assert any("get_item (test_metrics.py" in line and "busy_work" in line for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert metrics.slow_profiles.values[("/api/items/{item_id}",)] == 1
+
+
+def test_blocked_event_loop_shows_as_lag():
+    metrics = Metrics()
+
+    async def run():
+        monitor = LoopLagMonitor(metrics, interval=0.01)
+        await monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert metrics.max_loop_lag >= 0.08
@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+import sqlite3
+
+from migrations import MIGRATIONS, migrate_sqlite, postgres_script
+from pagination import fetch_page
+from sqlite_repository import SQLiteRepository
+
+# The same instants written four different ways; as text they sort in none of these orders.
+WRITTEN = {
+    "a": "2026-01-02T09:30:00+00:00",
+    "b": "2026-01-02T10:00:00Z",
+    "c": "2026-01-02 10:15:00",
+    "d": "2026-01-02T16:00:00.250000+05:30",
+}
+
+
+def test_sqlite_timestamps_are_normalized_once(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+
+    async def run():
+        old = SQLiteRepository(path, migrations=())
+        await old.insert('demo_bookings', [{"id": key, "name": key, "email": f"{key}@x.in", "created_at": value}
+                                           for key, value in WRITTEN.items()])
+        await old.aclose()
+        migrated = SQLiteRepository(path)
+        page = await fetch_page(migrated, 'demo_bookings', 'id,created_at', limit=10)
+        versions = await migrated.select('schema_migrations', 'version', order=[('version', False)])
+        await migrated.aclose()
+        return page["items"], versions
+
+    items, versions = asyncio.run(run())
+    # Newest first, now that every value is UTC with the same suffix.
+    assert [(row["id"], row["created_at"]) for row in items] == [
+        ("d", "2026-01-02T10:30:00.250000+00:00"),
+        ("c", "2026-01-02T10:15:00+00:00"),
+        ("b", "2026-01-02T10:00:00+00:00"),
+        ("a", "2026-01-02T09:30:00+00:00"),
+    ]
+    assert [row["version"] for row in versions] == [migration.version for migration in MIGRATIONS]
+    db = sqlite3.connect(path, isolation_level=None)
+    assert migrate_sqlite(db) == []
+    db.close()
+
+
+def _migrate_when_released(path, barrier, results):
+    db = sqlite3.connect(path, isolation_level=None, timeout=30)
+    barrier.wait()
+    try:
+        results.put([migration.version for migration in migrate_sqlite(db)])
+    except Exception as e:
+        results.put(repr(e))
+    finally:
+        db.close()
+
+
+def test_workers_starting_together_apply_each_migration_once(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    asyncio.run(SQLiteRepository(path, migrations=()).aclose())
+    context = multiprocessing.get_context("fork")
+    barrier, results = context.Barrier(4), context.Queue()
+    workers = [context.Process(target=_migrate_when_released, args=(path, barrier, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    applied = sorted(version for outcome in outcomes for version in outcome)
+    assert all(isinstance(outcome, list) for outcome in outcomes), outcomes
+    assert applied == [migration.version for migration in MIGRATIONS]
+
+
+def test_list_and_counter_queries_use_the_new_indexes(tmp_path):
+    path = str(tmp_path / "plans.sqlite3")
+    asyncio.run(SQLiteRepository(path).aclose())
+    db = sqlite3.connect(path)
+
+    def plan(sql, *params):
+        return " ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+    assert "demo_bookings_created_at_id" in plan(
+        'SELECT * FROM demo_bookings ORDER BY created_at DESC, id DESC LIMIT 51')
+    assert "demo_bookings_status_created_at_id" in plan(
+        'SELECT * FROM demo_bookings WHERE status = ? ORDER BY created_at DESC, id DESC LIMIT 51', 'confirmed')
+    assert "COVERING INDEX demo_bookings_status_created_at_id" in plan(
+        "SELECT COUNT(*) FROM demo_bookings WHERE status = 'pending'")
+    assert "email_outbox_pending" in plan("SELECT * FROM email_outbox WHERE status = 'pending' ORDER BY created_at")
+    assert "visitor_events_event_type_timestamp" in plan(
+        'SELECT COUNT(*) FROM visitor_events WHERE event_type = ?', 'visit')
+    db.close()
+
+
+def test_postgres_script_covers_only_pending_versions():
+    everything = postgres_script()
+    assert "ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'UTC'" in everything
+    assert everything.startswith("BEGIN;") and everything.endswith("COMMIT;\n")
+    rest = postgres_script(applied=[1])
+    assert "TIMESTAMPTZ USING" not in rest
+    assert "CREATE INDEX IF NOT EXISTS email_outbox_pending" in rest
+    assert "VALUES (2, 'performance_indexes') ON CONFLICT (version) DO NOTHING;" in rest
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from emails import Notifications
+from outbox import Outbox, ResendSender, TokenBucket
+from repository import Repository
+
+
+class TableRepository(Repository):
+    def __init__(self):
+        self.rows = {}
+
+    async def insert(self, table, rows):
+        for row in rows if isinstance(rows, list) else [rows]:
+            self.rows[row["id"]] = dict(row)
+
+    def _match(self, where):
+        tests = {'eq': lambda a, b: a == b, 'lt': lambda a, b: a < b, 'in': lambda a, b: a in b}
+        return [r for r in self.rows.values() if all(tests[op](r.get(c), v) for c, op, v in where)]
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        return [dict(r) for r in self._match(where)]
+
+    async def update(self, table, values, where):
+        matched = self._match(where)
+        for row in matched:
+            row.update(values)
+        return [dict(r) for r in matched]
+
+
+def fake_resend(responses, received):
+    """A local stand-in for api.resend.com that answers with the given status codes in order."""
+    async def handler(request: httpx.Request):
+        received.append((time.monotonic(), request))
+        return httpx.Response(responses.pop(0) if responses else 200, json={"id": "email"})
+    return httpx.MockTransport(handler)
+
+
+def make_outbox(repo, responses, received, **kwargs):
+    sender = ResendSender("re_test", transport=fake_resend(responses, received))
+    renderer = Notifications("from@test", "to@test", "910000000000")
+    options = dict(rate=1000, burst=1000, retry_base=0.01)
+    options.update(kwargs)
+    return Outbox(repo, sender, renderer, **options)
+
+
+def lead(name):
+    return {"name": name, "email": f"{name}@example.com", "phone": "", "subject_interest": "Physics"}
+
+
+def test_retries_with_backoff_then_sends():
+    async def run():
+        repo, received = TableRepository(), []
+        outbox = make_outbox(repo, [500, 429], received)
+        await outbox.start()
+        job = await outbox.enqueue('booking', lead("hi"))
+        await asyncio.sleep(0.2)
+        await outbox.stop()
+        return repo.rows[job.id], outbox.stats(), received
+
+    row, stats, received = asyncio.run(run())
+    assert len(received) == 3
+    assert row["status"] == "sent"
+    assert row["attempts"] == 3
+    assert stats["sent"] == 1 and stats["retried"] == 2 and stats["dead"] == 0
+
+
+def test_dead_letters_after_max_attempts_and_on_permanent_errors():
+    async def run():
+        repo, received = TableRepository(), []
+        outbox = make_outbox(repo, [503, 503, 422], received, max_attempts=2)
+        await outbox.start()
+        flaky = await outbox.enqueue('booking', lead("a"))
+        await asyncio.sleep(0.2)
+        rejected = await outbox.enqueue('query', lead("b"))
+        await asyncio.sleep(0.05)
+        await outbox.stop()
+        return repo.rows, outbox.stats(), flaky, rejected
+
+    rows, stats, flaky, rejected = asyncio.run(run())
+    assert rows[flaky.id]["status"] == "dead" and rows[flaky.id]["attempts"] == 2
+    assert rows[rejected.id]["status"] == "dead" and rows[rejected.id]["attempts"] == 1
+    assert [d["id"] for d in stats["dead_letters"]] == [flaky.id, rejected.id]
+
+
+def test_pending_jobs_survive_restart():
+    async def run():
+        repo, received = TableRepository(), []
+        # Claimed by a worker that crashed before sending it.
+        first = make_outbox(repo, [], received)
+        job = await first.enqueue('booking', lead("crash"))
+        second = make_outbox(repo, [], received, claim_timeout=0.03)
+        await second.start()
+        await asyncio.sleep(0.01)
+        claimed_while_fresh = len(received)
+        await asyncio.sleep(0.05)
+        await second.stop()
+        return repo.rows[job.id], claimed_while_fresh, received
+
+    row, claimed_while_fresh, received = asyncio.run(run())
+    assert claimed_while_fresh == 0
+    assert row["status"] == "sent"
+    assert len(received) == 1
+
+
+def test_workers_resuming_the_same_table_send_each_job_once():
+    async def run():
+        repo, received = TableRepository(), []
+        # Released on shutdown while the sender was rejecting everything.
+        stopping = make_outbox(repo, [503] * 10, received, retry_base=10)
+        await stopping.start()
+        jobs = [await stopping.enqueue('booking', lead(f"s{i}")) for i in range(10)]
+        await asyncio.sleep(0.05)
+        await stopping.stop(drain_timeout=0)
+        released = [row["status"] for row in repo.rows.values()]
+        received.clear()
+        workers = [make_outbox(repo, [], received) for _ in range(4)]
+        await asyncio.gather(*[worker.start() for worker in workers])
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*[worker.stop() for worker in workers])
+        return released, repo.rows, jobs, received
+
+    released, rows, jobs, received = asyncio.run(run())
+    assert released == ["pending"] * 10
+    assert all(rows[job.id]["status"] == "sent" for job in jobs)
+    assert len(received) == 10 and len({request.read() for _, request in received}) == 10
+
+
+def test_backlog_is_folded_into_digest_emails():
+    async def run():
+        repo, received = TableRepository(), []
+        outbox = make_outbox(repo, [], received, workers=1, digest_threshold=5, digest_max=10)
+        await outbox.start()
+        jobs = [await outbox.enqueue('booking', lead(f"s{i}")) for i in range(12)]
+        await asyncio.sleep(0.05)
+        await outbox.stop()
+        return repo.rows, jobs, received, outbox.stats()
+
+    rows, jobs, received, stats = asyncio.run(run())
+    assert all(rows[job.id]["status"] == "sent" for job in jobs)
+    assert len(received) == 3
+    assert json.loads(received[0][1].read())["subject"] == "10 new leads"
+    assert stats["digests"] == 1 and stats["sent"] == 12
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 5 / 50 * 0.9
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from pagination import InvalidPageRequest, decode_cursor, encode_cursor, fetch_page, projection
+from repository import Repository
+
+
+class ListRepository(Repository):
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def select(self, table, columns="*", where=(), order=(), limit=None, after=None):
+        keys = [c for c, _ in order]
+        rows = sorted(self.rows, key=lambda r: [r[k] for k in keys], reverse=True)
+        if after is not None:
+            rows = [r for r in rows if [r[k] for k in keys] < list(after)]
+        for column, op, value in where:
+            assert op == 'eq'
+            rows = [r for r in rows if r[column] == value]
+        return rows[:limit]
+
+
+ROWS = [{"id": f"{i:03d}", "created_at": f"2026-01-{1 + i // 4:02d}", "status": "pending" if i % 2 else "done"}
+        for i in range(30)]
+
+
+def test_pages_cover_every_row_once():
+    repo = ListRepository(ROWS)
+    seen, cursor = [], None
+    while True:
+        page = asyncio.run(fetch_page(repo, 'demo_bookings', limit=7, cursor=cursor))
+        seen.extend(r["id"] for r in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(r["id"] for r in ROWS)
+    assert len(seen) == len(set(seen))
+
+
+def test_cursor_round_trip_and_validation():
+    cursor = encode_cursor({"created_at": "2026-01-01T00:00:00+00:00", "id": "abc"})
+    assert decode_cursor(cursor) == ["2026-01-01T00:00:00+00:00", "abc"]
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor("not-a-cursor")
+
+
+def test_projection_always_keeps_cursor_columns():
+    assert projection("name,email", ["id", "name", "email", "created_at"]) == "created_at,id,name,email"
+    assert projection(None, ["id"]) == "*"
+    with pytest.raises(InvalidPageRequest):
+        projection("password", ["id", "created_at"])
@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from ratelimit import Limit, MemoryBuckets, RateLimiter, RateLimitMiddleware, Rule, SQLiteBuckets
+
+
+class Event(BaseModel):
+    session_id: str
+
+
+def make_app(buckets, calls):
+    app = FastAPI()
+
+    @app.post("/api/visitors/track")
+    async def track(event: Event):
+        calls.append(event.session_id)
+        return {"status": "accepted"}
+
+    limiter = RateLimiter(buckets, {('POST', '/api/visitors/track'): Rule('track', Limit(1, 5), Limit(1, 2))})
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return app, limiter
+
+
+def post_all(app, bodies, headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=app, client=("203.0.113.9", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return [(await client.post("/api/visitors/track", json=body, headers=headers)) for body in bodies]
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    return MemoryBuckets(max_keys=100, shards=4) if request.param == "memory" else SQLiteBuckets(
+        str(tmp_path / "buckets.sqlite3"))
+
+
+def test_session_and_ip_buckets_shed_before_the_handler(buckets):
+    calls = []
+    app, limiter = make_app(buckets, calls)
+    responses = post_all(app, [{"session_id": "a"}] * 3 + [{"session_id": "b"}] * 3)
+    assert [r.status_code for r in responses] == [200, 200, 429, 200, 200, 429]
+    assert responses[2].headers["retry-after"] == "1"
+    assert calls == ["a", "a", "b", "b"]
+    # Session buckets are per session, but the IP bucket (burst 5) is shared.
+    assert post_all(app, [{"session_id": "c"}] * 2)[1].status_code == 429
+    assert limiter.stats()["shed"] == {"track": 3}
+
+
+def test_shed_requests_skip_validation(buckets):
+    calls = []
+    app, limiter = make_app(buckets, calls)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return [(await client.post("/api/visitors/track", content=body, headers={"X-Session-Id": "a"})).status_code
+                    for body in (b'{"session_id": "a"}', b"{not json", b"{not json")]
+
+    # Within the limit a malformed body fails validation; over it, it is rejected unread.
+    assert asyncio.run(run()) == [200, 422, 429]
+
+
+def test_memory_buckets_stay_bounded():
+    buckets = MemoryBuckets(max_keys=8, shards=2)
+    for i in range(100):
+        asyncio.run(buckets.take([(f"ip:{i}", Limit(1, 1))]))
+    assert len(buckets) <= 8
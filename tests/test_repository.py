@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import httpx
+
+import server
+from repository import PostgrestRepository, filter_params, order_param, parse_content_range
+
+UPSTREAM_DELAY = 0.2
+
+
+def slow_postgrest(calls):
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        await asyncio.sleep(UPSTREAM_DELAY)
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"content-range": "*/7"})
+        return httpx.Response(200, json=[])
+    return httpx.MockTransport(handler)
+
+
+def test_filter_and_order_encoding():
+    params = filter_params([('status', 'eq', 'pending'), ('id', 'in', ['a', 'b,c'])])
+    assert params == [('status', 'eq.pending'), ('id', 'in.(a,"b,c")')]
+    assert order_param([('created_at', True), ('id', False)]) == "created_at.desc,id.asc"
+    assert parse_content_range("0-24/3573") == 3573
+    assert parse_content_range("*/0") == 0
+
+
+def test_repository_sends_postgrest_requests():
+    calls = []
+
+    async def run():
+        repo = PostgrestRepository("http://supabase.test", "key", transport=slow_postgrest(calls))
+        await repo.select('demo_bookings', where=[('status', 'eq', 'pending')], order=[('created_at', True)], limit=5)
+        total = await repo.count('visitor_events', [('event_type', 'eq', 'visit')])
+        await repo.aclose()
+        return total
+
+    assert asyncio.run(run()) == 7
+    select, count = calls
+    assert select.url.path == "/rest/v1/demo_bookings"
+    assert select.url.params["status"] == "eq.pending"
+    assert select.url.params["order"] == "created_at.desc"
+    assert select.url.params["limit"] == "5"
+    assert count.headers["prefer"] == "count=exact"
+    assert count.headers["apikey"] == "key"
+
+
+def test_concurrent_requests_do_not_serialize(monkeypatch):
+    # Load test: N concurrent requests against an upstream that takes UPSTREAM_DELAY
+    # each. With a blocking client they would take N * UPSTREAM_DELAY in total.
+    concurrency = 20
+    calls = []
+
+    async def run():
+        repo = PostgrestRepository("http://supabase.test", "key", pool_size=concurrency,
+                                   transport=slow_postgrest(calls))
+        monkeypatch.setattr(server, "repo", repo)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[client.get("/api/demo-bookings") for _ in range(concurrency)])
+            elapsed = time.perf_counter() - started
+        await repo.aclose()
+        return responses, elapsed
+
+    responses, elapsed = asyncio.run(run())
+    assert all(r.status_code == 200 for r in responses)
+    assert len(calls) == concurrency
+    assert elapsed < UPSTREAM_DELAY * concurrency / 4
+
+
+def test_warm_opens_connections_up_to_the_pool_size():
+    calls = []
+
+    async def run():
+        repo = PostgrestRepository("http://supabase.test", "key", pool_size=3, transport=slow_postgrest(calls))
+        started = time.perf_counter()
+        await repo.warm(5)
+        elapsed = time.perf_counter() - started
+        await repo.aclose()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    # Concurrent, so each request needs a connection of its own.
+    assert len(calls) == 3 and elapsed < UPSTREAM_DELAY * 2
+    assert {call.method for call in calls} == {"HEAD"}
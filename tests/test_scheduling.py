@@ -0,0 +1,127 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import server
+from scheduling import Scheduler, SlotUnavailable
+from sqlite_repository import SQLiteRepository
+
+PROFILES = [
+    {"slug": "asha", "name": "Asha", "subjects": ["Mathematics"], "timezone": "UTC",
+     "weekly": {"mon": [["09:00", "12:00"]]}},
+    {"slug": "ravi", "name": "Ravi", "subjects": ["mathematics", "physics"], "timezone": "UTC",
+     "weekly": {"mon": [["10:30", "12:30"]]}},
+]
+
+
+def scheduler(tmp_path, repo=None):
+    path = tmp_path / "tutors.json"
+    path.write_text(json.dumps(PROFILES))
+    return Scheduler(repo, path, slot_minutes=60, min_notice=0)
+
+
+def next_monday() -> datetime:
+    day = datetime.now(timezone.utc).date() + timedelta(days=1)
+    while day.weekday() != 0:
+        day += timedelta(days=1)
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def starts(slots):
+    return [(slot["tutor"], slot["start"][11:16]) for slot in slots]
+
+
+def test_free_slots_merge_tutors_and_skip_claims(tmp_path):
+    schedule = scheduler(tmp_path, SQLiteRepository())
+    monday = next_monday().timestamp()
+    week = (monday, monday + 86400)
+    assert starts(schedule.free_slots("Mathematics", start=week[0], end=week[1])) == [
+        ("asha", "09:00"), ("asha", "10:00"), ("ravi", "10:30"), ("asha", "11:00"), ("ravi", "11:30")]
+    assert starts(schedule.free_slots("Physics", start=week[0], end=week[1], limit=1)) == [("ravi", "10:30")]
+
+    async def run():
+        await schedule.claim("asha", monday + 10 * 3600, "b1")
+        with pytest.raises(SlotUnavailable):
+            await schedule.claim("asha", monday + 10 * 3600, "b2")
+        with pytest.raises(ValueError):
+            await schedule.claim("ravi", monday + 10 * 3600, "b3")  # not on Ravi's grid
+        taken = starts(schedule.free_slots(tutor="asha", start=week[0], end=week[1]))
+        await schedule.cancel(["b1"])
+        return taken, starts(schedule.free_slots(tutor="asha", start=week[0], end=week[1]))
+
+    taken, freed = asyncio.run(run())
+    assert taken == [("asha", "09:00"), ("asha", "11:00")]
+    assert freed == [("asha", "09:00"), ("asha", "10:00"), ("asha", "11:00")]
+
+
+def test_database_settles_claims_from_two_workers(tmp_path):
+    repo = SQLiteRepository()
+    first, second = scheduler(tmp_path, repo), scheduler(tmp_path, repo)
+    slot = next_monday().timestamp() + 9 * 3600
+
+    async def run():
+        await first.claim("asha", slot, "b1")
+        # The second worker has not seen the claim yet, so the insert is what stops it.
+        with pytest.raises(SlotUnavailable):
+            await second.claim("asha", slot, "b2")
+        fresh = scheduler(tmp_path, repo)
+        loaded = await fresh.load()
+        return loaded, fresh.tutors["asha"].conflicts(int(slot), int(slot) + 3600)
+
+    loaded, conflicts = asyncio.run(run())
+    assert second.tutors["asha"].conflicts(int(slot), int(slot) + 3600)
+    assert (loaded, conflicts) == (1, True)
+    assert second.stats()["conflicts"] == 1
+
+
+def test_booking_a_slot_claims_it_until_the_booking_is_deleted(monkeypatch):
+    repo = SQLiteRepository()
+    monkeypatch.setattr(server, "repo", repo)
+    schedule = Scheduler(repo, min_notice=0)
+    monkeypatch.setattr(server, "scheduler", schedule)
+    booking = {"name": "Zoya Khan", "email": "zoya@x.in", "subject_interest": "Mathematics"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            offered = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 2})).json()["items"]
+            slot = {"tutor": offered[0]["tutor"], "slot_start": offered[0]["start"]}
+            created = await client.post("/api/demo-bookings", json={**booking, **slot})
+            again = await client.post("/api/demo-bookings", json={**booking, "email": "other@x.in", **slot})
+            after = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 1})).json()["items"]
+            await client.delete(f"/api/demo-bookings/{created.json()['id']}")
+            freed = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 1})).json()["items"]
+            half = await client.post("/api/demo-bookings", json={**booking, "tutor": slot["tutor"]})
+            return offered, created.json(), again.status_code, after, freed, half.status_code
+
+    offered, created, again, after, freed, half = asyncio.run(run())
+    assert offered[0]["tutor"] == "dr-priya-sharma" and offered[0]["start"] > datetime.now(timezone.utc).isoformat()
+    assert created["preferred_date"] == offered[0]["start"] and created["slot"] == offered[0]
+    assert again == 409
+    assert after == offered[1:]
+    assert freed == offered[:1]
+    assert half == 400
+
+
+def test_two_slots_booked_from_the_same_email_are_both_claimed(monkeypatch):
+    repo = SQLiteRepository()
+    monkeypatch.setattr(server, "repo", repo)
+    monkeypatch.setattr(server, "scheduler", Scheduler(repo, min_notice=0))
+    booking = {"name": "Kabir Rao", "email": "kabir@x.in", "subject_interest": "Physics"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            offered = (await client.get("/api/slots", params={"subject": "Physics", "limit": 2})).json()["items"]
+            created = [(await client.post("/api/demo-bookings", json={
+                **booking, "tutor": slot["tutor"], "slot_start": slot["start"]})).json() for slot in offered]
+        claims = await repo.select('tutor_slots', 'booking_id')
+        return offered, created, claims
+
+    offered, created, claims = asyncio.run(run())
+    assert [booking["slot"] for booking in created] == offered
+    assert created[0]["id"] != created[1]["id"]
+    assert sorted(row["booking_id"] for row in claims) == sorted(booking["id"] for booking in created)
@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from search import LeadIndex
+from sqlite_repository import SQLiteRepository
+
+LEADS = [
+    ('demo_bookings', {"id": "b1", "name": "Asha Verma", "email": "asha.verma@gmail.com", "phone": "+91 98765 43210",
+                       "subject_interest": "Mathematics", "message": "Needs help with algebra",
+                       "created_at": "2026-01-01T10:00:00+00:00"}),
+    ('subject_queries', {"id": "q1", "name": "Rohan Das", "email": "rohan@example.com", "phone": "",
+                         "subject": "Physics", "message": "Can Asha's tutor also teach optics?",
+                         "created_at": "2026-01-02T10:00:00+00:00"}),
+    ('contact_messages', {"id": "c1", "name": "Meera Iyer", "email": "meera@school.in", "phone": "0120-555-0199",
+                          "message": "Algebra group classes for grade 8?", "created_at": "2026-01-03T10:00:00+00:00"}),
+]
+
+
+def index():
+    leads = LeadIndex(None)
+    for table, row in LEADS:
+        leads.add(table, row)
+    return leads
+
+
+def ids(result):
+    return [item["id"] for item in result["items"]]
+
+
+def test_matches_fragments_of_any_field_and_ranks_field_hits_first():
+    leads = index()
+    # Name and email outrank a mention in someone else's message.
+    assert ids(leads.search("asha")) == ["b1", "q1"]
+    assert ids(leads.search("verma@gmail")) == ["b1"]
+    assert ids(leads.search("876543")) == ["b1"]
+    assert ids(leads.search("555 0199")) == ["c1"]
+    # Every word has to match; two letters match word prefixes.
+    assert ids(leads.search("algebra me")) == ["c1"]
+    assert ids(leads.search("algebra")) == ["c1", "b1"]
+    assert leads.search("nobody")["total"] == 0
+    with pytest.raises(ValueError):
+        leads.search("a !")
+
+
+def test_removed_leads_are_not_found_and_compaction_keeps_results():
+    leads = index()
+    assert leads.search("algebra")["total"] == 2
+    assert leads.remove('contact_messages', "c1") and not leads.remove('contact_messages', "c1")
+    assert ids(leads.search("algebra")) == ["b1"]
+    leads._compact()
+    assert ids(leads.search("algebra")) == ["b1"] and len(leads) == 2
+
+
+def test_build_replays_writes_made_while_reading_and_catches_up():
+    class SlowRepository(SQLiteRepository):
+        async def select(self, *args, **kwargs):
+            await asyncio.sleep(0)
+            return await super().select(*args, **kwargs)
+
+    async def run():
+        repo = SlowRepository()
+        for table, row in LEADS:
+            await repo.insert(table, row)
+        leads = LeadIndex(repo)
+        build = asyncio.create_task(leads.build(chunk_size=1))
+        await asyncio.sleep(0)
+        leads.add('demo_bookings', {"id": "b2", "name": "Kabir Singh", "email": "kabir@x.in",
+                                    "created_at": "2026-01-04T10:00:00+00:00"})
+        await repo.delete('contact_messages', [('id', 'eq', "c1")])
+        leads.remove('contact_messages', "c1")
+        await build
+        built = (ids(leads.search("kabir")), leads.search("meera")["total"], len(leads))
+        # A row another worker wrote is picked up by the next catch-up.
+        await repo.insert('subject_queries', {"id": "q2", "name": "Kabir Khan", "email": "kk@x.in", "subject": "Art",
+                                              "created_at": "2026-01-05T10:00:00+00:00"})
+        added = await leads.catch_up()
+        return built, added, ids(leads.search("kabir"))
+
+    built, added, found = asyncio.run(run())
+    assert built == (["b2"], 0, 3)
+    assert added == 1 and found == ["q2", "b2"]
+
+
+def test_search_endpoint_follows_creates_and_deletes(monkeypatch):
+    repo = SQLiteRepository()
+    monkeypatch.setattr(server, "repo", repo)
+    monkeypatch.setattr(server, "leads", LeadIndex(repo))
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            created = (await client.post("/api/demo-bookings", json={"name": "Zoya Khan", "email": "zoya@x.in"})).json()
+            found = (await client.get("/api/admin/search", params={"q": "zoya"})).json()
+            await client.delete(f"/api/demo-bookings/{created['id']}")
+            gone = (await client.get("/api/admin/search", params={"q": "zoya"})).json()
+            short = await client.get("/api/admin/search", params={"q": "z"})
+            return created, found, gone, short.status_code
+
+    created, found, gone, short = asyncio.run(run())
+    assert ids(found) == [created["id"]] and found["items"][0]["table"] == "demo_bookings"
+    assert gone["total"] == 0
+    assert short == 400
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+import server
+from breaker import CircuitBreaker, GuardedRepository
+from outbox import ResendSender
+from repository import Repository, RepositoryError
+from spool import Spool
+from sqlite_repository import SQLiteRepository
+
+
+def lead(i: int) -> dict:
+    return {"id": f"q{i:03d}", "name": f"Lead {i}", "email": f"lead{i}@example.com", "subject": "Physics",
+            "created_at": f"2026-03-01T10:{i % 60:02d}:00+00:00"}
+
+
+def test_concurrent_appends_share_fsyncs_and_replay_skips_stored_rows(tmp_path):
+    async def run():
+        spool = Spool(tmp_path)
+        await asyncio.gather(*[spool.append('subject_queries', lead(i)) for i in range(50)])
+        repo = SQLiteRepository()
+        # This one timed out on the way in but reached the database anyway.
+        await repo.insert('subject_queries', lead(7))
+        spool.repo = repo
+        written = await spool.replay()
+        stored = await repo.count('subject_queries')
+        await repo.aclose()
+        return spool, written, stored
+
+    spool, written, stored = asyncio.run(run())
+    assert spool.spooled == 50 and spool.fsyncs < 50
+    assert written == 49 and spool.already_stored == 1 and stored == 50
+    assert spool.files() == []
+
+
+def test_replay_skips_files_in_use_and_torn_lines(tmp_path):
+    # Left by a worker that died in the middle of its second write.
+    (tmp_path / "1-1.spool").write_text(json.dumps({"table": "subject_queries", "row": lead(1)}) + '\n{"table":"subj')
+
+    async def run():
+        live, replayer = Spool(tmp_path), Spool(tmp_path)
+        await live.append('subject_queries', lead(2))
+        replayer.repo = SQLiteRepository()
+        written = await replayer.replay()
+        ids = [row["id"] for row in await replayer.repo.select('subject_queries', 'id')]
+        await replayer.repo.aclose()
+        left = [path.name for path in replayer.files()]
+        live_file = live._path.name
+        await live.stop()
+        return written, ids, left, live_file
+
+    written, ids, left, live_file = asyncio.run(run())
+    # The live worker's open file is left alone; the dead worker's is replayed and removed.
+    assert written == 1 and ids == ["q001"]
+    assert left == [live_file]
+
+
+def test_a_refused_row_is_quarantined_and_the_rest_still_drain(tmp_path):
+    bad = {"id": "q900", "name": "Bad", "nickname": "not a column"}
+    (tmp_path / "1-1.spool").write_text("".join(json.dumps({"table": "subject_queries", "row": row}) + "\n"
+                                                for row in [bad, lead(1), lead(2)]))
+    (tmp_path / "1-2.spool").write_text(json.dumps({"table": "subject_queries", "row": lead(3)}) + "\n")
+
+    async def run():
+        spool = Spool(tmp_path)
+        spool.repo = SQLiteRepository()
+        written = await spool.replay()
+        ids = [row["id"] for row in await spool.repo.select('subject_queries', 'id', order=[('id', False)])]
+        await spool.repo.aclose()
+        return spool, written, ids
+
+    spool, written, ids = asyncio.run(run())
+    assert written == 3 and ids == ["q001", "q002", "q003"]
+    assert spool.files() == [] and spool.quarantined == 1
+    quarantined = [json.loads(line) for line in (tmp_path / "1-1.quarantine").read_text().splitlines()]
+    assert quarantined == [{"table": "subject_queries", "row": bad}]
+
+
+def test_lead_is_not_spooled_when_the_database_rejects_it(monkeypatch, tmp_path):
+    class Rejects(Repository):
+        async def insert(self, table, rows):
+            raise RepositoryError("POST subject_queries failed with 400", 400)
+
+    spool = Spool(tmp_path)
+    monkeypatch.setattr(server, "spool", spool)
+    monkeypatch.setattr(server, "repo", GuardedRepository(Rejects(), CircuitBreaker(), deadline=1))
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await client.post("/api/subject-queries", json={
+                "name": "Asha", "email": "asha@example.com", "subject": "Chemistry", "message": "Organic"})
+
+    assert asyncio.run(run()).status_code == 500
+    assert spool.files() == []
+
+
+def test_lead_is_spooled_when_the_database_is_down(monkeypatch, tmp_path):
+    class Down(Repository):
+        async def insert(self, table, rows):
+            raise httpx.ConnectError("connection refused")
+
+    spool = Spool(tmp_path)
+    monkeypatch.setattr(server, "spool", spool)
+    monkeypatch.setattr(server, "repo", GuardedRepository(Down(), CircuitBreaker(), deadline=1))
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            response = await client.post("/api/subject-queries", json={
+                "name": "Asha", "email": "asha@example.com", "subject": "Chemistry", "message": "Organic"})
+        spool.repo = SQLiteRepository()
+        await spool.replay()
+        rows = await spool.repo.select('subject_queries', 'id,name')
+        await spool.repo.aclose()
+        return response, rows
+
+    response, rows = asyncio.run(run())
+    assert response.status_code == 200
+    assert rows == [{"id": response.json()["id"], "name": "Asha"}]
+
+
+class Hangs(SQLiteRepository):
+    """Writes to the tables in hang never return; the rest of the database works.
+
+    Writes to the tables in land reach the database before they hang.
+    """
+    hang = set()
+    land = set()
+
+    async def insert(self, table, rows):
+        if table in self.land:
+            await super().insert(table, rows)
+        if table in self.hang:
+            await asyncio.sleep(60)
+        return await super().insert(table, rows)
+
+
+def hanging_database(monkeypatch, tmp_path, received):
+    """Installs a Hangs database behind a 0.2s deadline, with email on and a fresh spool."""
+    async def resend(request):
+        received.append(request)
+        return httpx.Response(200, json={"id": "email"})
+
+    spool = Spool(tmp_path)
+    monkeypatch.setattr(server, "spool", spool)
+    monkeypatch.setattr(server, "breaker", CircuitBreaker())
+    monkeypatch.setattr(server, "DB_DEADLINE", 0.2)
+    monkeypatch.setattr(server, "repo", server.repo)
+    monkeypatch.setattr(server.outbox, "sender", ResendSender("re_test", transport=httpx.MockTransport(resend)))
+    for component in server.guarded_components + (server.stats, server.analytics, server.archiver, server.leads):
+        monkeypatch.setattr(component, "repo", component.repo)
+    database = Hangs()
+    server.use_repository(database)
+    return database, spool
+
+
+async def book(client, slot, email="zoya@x.in"):
+    return await client.post("/api/demo-bookings", json={
+        "name": "Zoya Khan", "email": email, "subject_interest": "Mathematics",
+        "tutor": slot["tutor"], "slot_start": slot["start"]})
+
+
+def test_booking_a_slot_with_email_on_returns_within_the_deadline(monkeypatch, tmp_path):
+    received = []
+    database, spool = hanging_database(monkeypatch, tmp_path, received)
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            offered = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 2})).json()["items"]
+            responses, elapsed = [], []
+            # First only the outbox table hangs, then the bookings table too.
+            for slot, hang in zip(offered, [{'email_outbox'}, {'demo_bookings', 'email_outbox'}]):
+                database.hang = hang
+                started = time.perf_counter()
+                responses.append(await client.post("/api/demo-bookings", headers={"X-Session-Id": "s1"}, json={
+                    "name": "Zoya Khan", "email": f"zoya@{len(hang)}.in", "subject_interest": "Mathematics",
+                    "tutor": slot["tutor"], "slot_start": slot["start"]}))
+                elapsed.append(time.perf_counter() - started)
+        database.hang = set()
+        await spool.replay()
+        bookings = await database.select('demo_bookings', 'id', order=[('id', False)])
+        emails = await database.select('email_outbox', 'kind,status')
+        slots = await database.select('tutor_slots', 'booking_id', order=[('booking_id', False)])
+        await database.aclose()
+        return responses, elapsed, bookings, emails, slots
+
+    responses, elapsed, bookings, emails, slots = asyncio.run(run())
+    # One deadline each: a booking the database did not take has its email row spooled without trying.
+    assert [response.status_code for response in responses] == [200, 200] and max(elapsed) < 0.5
+    ids = sorted(response.json()["id"] for response in responses)
+    assert [row["id"] for row in bookings] == ids and [row["booking_id"] for row in slots] == ids
+    # Not sent from memory: they wait in the table for a worker to claim them.
+    assert emails == [{"kind": "booking", "status": "pending"}] * 2 and received == []
+
+
+def test_a_slot_claim_that_timed_out_but_landed_is_the_bookings_own(monkeypatch, tmp_path):
+    database, spool = hanging_database(monkeypatch, tmp_path, [])
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            offered = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 1})).json()["items"]
+            database.hang = database.land = {'tutor_slots'}
+            response = await book(client, offered[0], email="landed@x.in")
+            database.hang = database.land = set()
+            after = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 1})).json()["items"]
+        bookings = await database.select('demo_bookings', 'id')
+        slots = await database.select('tutor_slots', 'booking_id')
+        await database.aclose()
+        return offered, response, after, bookings, slots
+
+    offered, response, after, bookings, slots = asyncio.run(run())
+    assert response.status_code == 200 and response.json()["slot"] == offered[0]
+    assert bookings == [{"id": response.json()["id"]}] and slots == [{"booking_id": response.json()["id"]}]
+    assert after[0] != offered[0]
+
+
+def test_a_slot_the_database_cannot_claim_fails_the_booking_with_503(monkeypatch, tmp_path):
+    database, spool = hanging_database(monkeypatch, tmp_path, [])
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            offered = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 1})).json()["items"]
+            database.hang = {'tutor_slots'}
+            response = await book(client, offered[0], email="outage@x.in")
+            database.hang = set()
+            after = (await client.get("/api/slots", params={"subject": "Mathematics", "limit": 1})).json()["items"]
+        counts = [await database.count(table) for table in ('demo_bookings', 'tutor_slots')]
+        await database.aclose()
+        return offered, response, after, counts
+
+    offered, response, after, counts = asyncio.run(run())
+    assert response.status_code == 503
+    # Nothing was stored or spooled, and the slot is offered again.
+    assert counts == [0, 0] and spool.files() == []
+    assert after == offered
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from pagination import fetch_page
+from sqlite_repository import SQLiteRepository
+
+BOOKINGS = [{"id": f"{i:03d}", "name": f"Lead {i}", "email": f"lead{i}@example.com",
+             "status": "pending" if i % 3 else "confirmed", "created_at": f"2026-01-{1 + i // 4:02d}"}
+            for i in range(20)]
+
+
+def run(steps):
+    async def go():
+        repo = SQLiteRepository()
+        try:
+            return await steps(repo)
+        finally:
+            await repo.aclose()
+    return asyncio.run(go())
+
+
+def test_filters_count_and_returning():
+    async def steps(repo):
+        await repo.insert('demo_bookings', BOOKINGS)
+        pending = await repo.count('demo_bookings', [('status', 'eq', 'pending')])
+        picked = await repo.select('demo_bookings', 'id,status', where=[('id', 'in', ['001', '002', '999'])],
+                                   order=[('id', False)])
+        updated = await repo.update('demo_bookings', {"status": "cancelled"}, [('id', 'eq', '001')])
+        deleted = await repo.delete('demo_bookings', [('status', 'eq', 'confirmed')])
+        return pending, picked, updated, deleted, await repo.count('demo_bookings')
+
+    pending, picked, updated, deleted, remaining = run(steps)
+    assert pending == 13
+    assert picked == [{"id": "001", "status": "pending"}, {"id": "002", "status": "pending"}]
+    assert updated[0]["status"] == "cancelled" and updated[0]["name"] == "Lead 1"
+    assert len(deleted) == 7
+    assert remaining == 13
+
+
+def test_keyset_pages_match_repository_contract():
+    async def steps(repo):
+        await repo.insert('demo_bookings', BOOKINGS)
+        seen, cursor = [], None
+        while True:
+            page = await fetch_page(repo, 'demo_bookings', limit=6, cursor=cursor)
+            seen.extend(row["id"] for row in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return seen
+
+    seen = run(steps)
+    assert seen == sorted((b["id"] for b in BOOKINGS), key=lambda i: (BOOKINGS[int(i)]["created_at"], i),
+                          reverse=True)
+
+
+def test_json_columns_round_trip():
+    async def steps(repo):
+        await repo.insert('email_outbox', {"id": "j1", "kind": "booking", "payload": {"name": "Ana", "tags": [1, 2]}})
+        return await repo.select('email_outbox', where=[('status', 'eq', 'pending')])
+
+    rows = run(steps)
+    assert rows[0]["payload"] == {"name": "Ana", "tags": [1, 2]}
+    assert rows[0]["attempts"] == 0
+
+
+def test_unknown_columns_are_rejected():
+    async def steps(repo):
+        await repo.select('demo_bookings', 'id; DROP TABLE demo_bookings')
+
+    with pytest.raises(ValueError):
+        run(steps)
@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+
+import server
+from outbox import ResendSender
+from sqlite_repository import SQLiteRepository
+
+
+def test_lifespan_reports_startup_phases(monkeypatch):
+    monkeypatch.setattr(server, "startup", server.StartupReport(budget=60))
+    server.use_repository(SQLiteRepository())
+
+    async def run():
+        async with server.lifespan(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                return (await client.get("/api/admin/startup")).json()
+
+    report = asyncio.run(run())
+    assert [phase["name"] for phase in report["phases"]] == ["schema check", "warm connections", "background tasks"]
+    assert report["schema"] == {"applied": [1, 2], "pending": []}
+    assert report["ready_seconds"] > 0 and report["over_budget"] is False
+
+
+def test_resend_client_is_created_on_first_use():
+    sent = []
+    transport = httpx.MockTransport(lambda request: sent.append(request) or httpx.Response(200, json={}))
+
+    async def run():
+        sender = ResendSender("re_key", base_url="http://resend.test", transport=transport)
+        before = sender._client
+        await sender.warm()
+        await sender.send({"to": "a@x.in"})
+        await sender.aclose()
+        await sender.aclose()
+        return before
+
+    assert asyncio.run(run()) is None
+    assert [request.method for request in sent] == ["HEAD", "POST"]
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from repository import Repository
+from stats import COUNTER_QUERIES, StatsStore
+
+
+class CountingRepository(Repository):
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.value = 3
+
+    async def count(self, table, where=()):
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+def test_recount_runs_queries_concurrently():
+    store = StatsStore(CountingRepository(delay=0.1))
+    started = time.perf_counter()
+    counters = asyncio.run(store.recount())
+    assert time.perf_counter() - started < 0.1 * len(COUNTER_QUERIES) / 2
+    assert set(counters.values()) == {3}
+    snapshot = store.snapshot()
+    assert snapshot["verified_at"] is not None
+    assert 0 <= snapshot["stale_seconds"] < 1
+
+
+def test_incremental_updates():
+    store = StatsStore(CountingRepository())
+    store.booking_created()
+    store.booking_created()
+    store.booking_status_changed('pending', 'confirmed')
+    store.booking_deleted('confirmed')
+    store.events_flushed([{"event_type": "visit"}, {"event_type": "leave"}, {"event_type": "visit"}])
+    snapshot = store.snapshot()
+    assert snapshot["total_bookings"] == 1
+    assert snapshot["pending_bookings"] == 1
+    assert snapshot["total_visits"] == 2
+    assert snapshot["total_leaves"] == 1
+    assert snapshot["stale_seconds"] is None
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+
+import server
+from ingest import EventIngestor
+from useragent import UserAgentClassifier, parse
+
+CHROME_WINDOWS = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/124.0.0.0 Safari/537.36")
+AGENTS = {
+    CHROME_WINDOWS: (None, "chrome", "windows", "desktop"),
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 "
+    "Safari/537.36 Edg/124.0.0.0": (None, "edge", "windows", "desktop"),
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/17.4 Mobile/15E148 Safari/604.1": (None, "safari", "ios", "mobile"),
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36": (None, "samsung", "android", "mobile"),
+    "Mozilla/5.0 (Linux; Android 13; SM-X200) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/123.0.0.0 Safari/537.36": (None, "chrome", "android", "tablet"),
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14.4; rv:125.0) Gecko/20100101 Firefox/125.0":
+        (None, "firefox", "macos", "desktop"),
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)": ("googlebot", "", "", "bot"),
+    "Mozilla/5.0 (Linux; Android 6.0.1; Nexus 5X Build/MMB29P) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Mobile Safari/537.36 (compatible; Googlebot/2.1)": ("googlebot", "", "", "bot"),
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)":
+        ("facebookexternalhit", "", "", "bot"),
+    "Mozilla/5.0+(compatible; UptimeRobot/2.0; http://www.uptimerobot.com/)": ("uptimerobot", "", "", "bot"),
+    "python-requests/2.31.0": ("python-requests", "", "", "bot"),
+    # Phones whose model name contains "bot" are still people.
+    "Mozilla/5.0 (Linux; Android 10; CUBOT_X30) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 "
+    "Mobile Safari/537.36": (None, "chrome", "android", "mobile"),
+    "Mozilla/5.0 (Linux; Android 11; CUBOT P40 Build/RP1A.200720.011) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Mobile Safari/537.36": (None, "chrome", "android", "mobile"),
+    "Mozilla/5.0 (Linux; Android 5.0) AppleWebKit/537.36 (KHTML, like Gecko) Mobile Safari/537.36 "
+    "(compatible; Bytespider; spider-feedback@bytedance.com)": ("bytespider", "", "", "bot"),
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36 Chrome-Lighthouse": ("chrome-lighthouse", "", "", "bot"),
+    "KidsLearn/3.2 (robotics-club; cubot_x30)": (None, "other", "other", "desktop"),
+    "Test Agent 1.0": (None, "other", "other", "desktop"),
+    "": (None, "", "", ""),
+}
+
+
+def test_parses_browsers_devices_and_bots():
+    for user_agent, expected in AGENTS.items():
+        assert tuple(parse(user_agent)) == expected, user_agent
+
+
+def test_cache_counts_hits_and_bots():
+    classifier = UserAgentClassifier(cache_size=2)
+    for user_agent in (CHROME_WINDOWS, CHROME_WINDOWS, "curl/8.4.0", "curl/8.4.0", "Test Agent 1.0", CHROME_WINDOWS):
+        classifier.classify(user_agent)
+    stats = classifier.stats()
+    # The third distinct string pushed Chrome out of the two-entry cache.
+    assert (stats["cache_hits"], stats["cache_misses"], stats["cache_entries"]) == (2, 4, 2)
+    assert stats["bots"] == {"curl": 2} and stats["bot_hits"] == 2
+
+
+def test_bots_are_not_stored_and_browsers_are_stored_as_dimensions(monkeypatch):
+    stored = []
+
+    class Capture:
+        async def insert(self, table, rows):
+            stored.extend(rows)
+
+    monkeypatch.setattr(server, "ingestor", EventIngestor(Capture(), batch_size=10, flush_interval=60))
+    monkeypatch.setattr(server, "user_agents", UserAgentClassifier())
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        await server.ingestor.start()
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            bodies = [{"session_id": "s1", "event_type": "visit", "user_agent": CHROME_WINDOWS},
+                      {"session_id": "s2", "event_type": "visit", "user_agent": "Googlebot/2.1"}]
+            answers = [(await client.post("/api/visitors/track", json=body)).json()["status"] for body in bodies]
+            await server.ingestor.stop()
+            return answers, (await client.get("/api/admin/tracking")).json()
+
+    answers, tracking = asyncio.run(run())
+    assert answers == ["accepted", "ignored"]
+    assert len(stored) == 1 and "user_agent" not in stored[0]
+    assert (stored[0]["browser"], stored[0]["os"], stored[0]["device"]) == ("chrome", "windows", "desktop")
+    assert tracking["user_agents"]["bots"] == {"googlebot": 1}